@@ -1,12 +1,33 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from math import ceil
+import multiprocessing
+from typing import Callable, List, Tuple
 import optuna
 import optunahub
+from pydantic import BaseModel
 from optuna.trial import Trial
 from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
 from StratDaemon.utils.constants import OPTUNA_DB_URL
-from StratDaemon.utils.funcs import create_db_uid
-from tests.back_tester import conduct_back_test
+from StratDaemon.utils.dataset_cache import DATASET_CACHE
+from StratDaemon.portfolio.metrics import MINIMIZED_METRICS, PerformanceMetrics
+from StratDaemon.utils.result_cache import RESULT_CACHE, BacktestResult
+from StratDaemon.utils.funcs import Parameters, create_db_uid
+from StratDaemon.utils.shared_data import SharedFrames, SharedFramesSpec
+from tests.back_tester import (
+    conduct_cached_back_test,
+    get_dataset_key,
+    load_data_dfs,
+)
+from tests.param_sweep import sweep
+
+# Keeps the shared market data attached for the lifetime of a worker process
+SHARED_FRAMES: SharedFrames | None = None
+# Trials whose portfolio falls below this fraction of the buy power are pruned
+PRUNE_VALUE_FLOOR = 0.5
+# Final portfolio value, or any of the `PerformanceMetrics` fields
+OBJECTIVE_METRIC = "value"
 
 
 class Objective(object):
@@ -18,13 +39,23 @@ class Objective(object):
         buy_power: int,
         max_amount_per_order: int,
         max_holding_per_currency: int,
+        value_floor: float = PRUNE_VALUE_FLOOR,
+        metric: str = OBJECTIVE_METRIC,
     ):
+        assert (
+            metric == OBJECTIVE_METRIC or metric in PerformanceMetrics.model_fields
+        ), f"Unknown metric {metric}"
         self.start_dt = start_dt
         self.end_dt = end_dt
         self.currency_codes = currency_codes
         self.buy_power = buy_power
         self.max_amount_per_order = max_amount_per_order
         self.max_holding_per_currency = max_holding_per_currency
+        self.value_floor = value_floor * buy_power
+        self.metric = metric
+        self.direction = "minimize" if metric in MINIMIZED_METRICS else "maximize"
+        # Score of trials that failed
+        self.worst_score = float("inf" if self.direction == "minimize" else "-inf")
 
     # The constraints are to satisfy `c1 <= 0`
     @staticmethod
@@ -38,14 +69,30 @@ class Objective(object):
         )
         return [vol_window - span + indicator_length]
 
-    def _get_result(self, trial: Trial) -> Tuple[float, int]:
-        portfolio_hist, num_buy_trades, num_sell_trades = conduct_back_test(
-            start_dt=self.start_dt,
-            end_dt=self.end_dt,
-            strat_def=FibVolRsiStrategy,
-            buy_power=self.buy_power,
-            max_amount_per_order=self.max_amount_per_order,
-            max_holding_per_currency=self.max_holding_per_currency,
+    def _report_progress(
+        self, trial: Trial, num_ticks: int, total_ticks: int, value: float
+    ) -> None:
+        if len(trial.study.directions) > 1 or self.metric != OBJECTIVE_METRIC:
+            # Optuna cannot report intermediate values of multi-objective
+            # trials, and trials scored on another metric only see the value
+            # while running, so those are only pruned on the value floor
+            should_prune = value < self.value_floor
+        else:
+            trial.report(value, num_ticks)
+            should_prune = trial.should_prune() or value < self.value_floor
+
+        if should_prune:
+            trial.set_user_attr(
+                "bar_evals_saved",
+                (total_ticks - num_ticks) * len(self.currency_codes),
+            )
+            raise optuna.TrialPruned(
+                f"Portfolio value {round(value, 2)} after {num_ticks} ticks"
+            )
+
+    @staticmethod
+    def suggest_params(trial: Trial) -> Parameters:
+        return Parameters(
             p_diff=trial.suggest_float("p_diff", 0.01, 0.11, step=0.01),
             vol_window=trial.suggest_int("vol_window", 10, 21),
             indicator_length=trial.suggest_int("indicator_length", 10, 21),
@@ -55,7 +102,6 @@ class Objective(object):
                 "rsi_percent_incr_threshold", 0.01, 0.41, step=0.01
             ),
             rsi_trend_span=trial.suggest_int("rsi_trend_span", 5, 30, step=5),
-            crypto_currency_codes=self.currency_codes,
             span=trial.suggest_int("span", 30, 65, step=5),
             wait_time=trial.suggest_int("wait_time", 5, 65, step=5),
             trailing_stop_loss=trial.suggest_float(
@@ -65,14 +111,229 @@ class Objective(object):
                 "trailing_take_profit", 0.05, 0.50, step=0.05
             ),
         )
-        return portfolio_hist[-1].value, num_buy_trades + num_sell_trades
 
-    def __call__(self, trial: optuna.trial.Trial) -> float:
+    def format_result(
+        self, trial: Trial, result: Tuple[float, int]
+    ) -> float | Tuple[float, int]:
+        return result if len(trial.study.directions) > 1 else result[0]
+
+    def _get_result(self, trial: Trial) -> Tuple[float, int]:
+        result = conduct_cached_back_test(
+            start_dt=self.start_dt,
+            end_dt=self.end_dt,
+            strat_def=FibVolRsiStrategy,
+            buy_power=self.buy_power,
+            max_amount_per_order=self.max_amount_per_order,
+            max_holding_per_currency=self.max_holding_per_currency,
+            params=self.suggest_params(trial),
+            crypto_currency_codes=self.currency_codes,
+            progress_callback=lambda num_ticks, total_ticks, value: self._report_progress(
+                trial, num_ticks, total_ticks, value
+            ),
+        )
+        return self.get_score(result), result.num_trades
+
+    def get_score(self, result: BacktestResult) -> float:
+        if self.metric == OBJECTIVE_METRIC:
+            return result.value
+        return getattr(result.metrics, self.metric)
+
+    def __call__(self, trial: optuna.trial.Trial) -> float | Tuple[float, int]:
         try:
-            return self._get_result(trial)
+            result = self._get_result(trial)
+        except optuna.TrialPruned:
+            raise
         except Exception as e:
             print(f"Error: {e}")
-            return float("-inf"), float("inf")
+            result = self.worst_score, float("inf")
+        return self.format_result(trial, result)
+
+    def get_end_dt(self, fidelity: float) -> datetime:
+        # Lower fidelities backtest a leading slice of the period
+        if fidelity >= 1:
+            return self.end_dt
+        num_minutes = (self.end_dt - self.start_dt).total_seconds() // 60
+        return self.start_dt + timedelta(minutes=int(num_minutes * fidelity))
+
+    def count_bar_evals(self, trial: Trial, fidelity: float) -> int:
+        num_minutes = (self.get_end_dt(fidelity) - self.start_dt).total_seconds() // 60
+        span, wait_time = trial.params["span"], trial.params["wait_time"]
+        num_ticks = max(0, int((num_minutes - span) // wait_time) + 1)
+        return num_ticks * len(self.currency_codes)
+
+    def evaluate_batch(
+        self, trials: List[Trial], fidelity: float = 1.0
+    ) -> List[Tuple[float, int]]:
+        # Batched counterpart of calling the objective on each trial, without
+        # pruning. Trials with invalid intervals fail like they do one by one.
+        params_list = [self.suggest_params(trial) for trial in trials]
+        is_valid = [self.constraints(trial)[0] <= 0 for trial in trials]
+        results_df = sweep(
+            FibVolRsiStrategy,
+            [params for params, valid in zip(params_list, is_valid) if valid],
+            self.currency_codes,
+            self.buy_power,
+            self.max_amount_per_order,
+            self.max_holding_per_currency,
+            self.start_dt,
+            self.get_end_dt(fidelity),
+        )
+
+        results = []
+        rows = results_df.itertuples()
+        for valid in is_valid:
+            result = self.worst_score, float("inf")
+            if valid:
+                row = next(rows)
+                result = getattr(row, self.metric), row.num_trades
+            results.append(result)
+        return results
+
+
+class FidelityConfig(BaseModel):
+    # Fractions of the tuning period trials are scored on, ending with the full
+    # period. Only the best `promote_fraction` of a bracket moves up a level.
+    levels: List[float] = [0.25, 1.0]
+    promote_fraction: float = 1 / 3
+    bracket_size: int = 27
+
+
+# Builds the sampler of a study from its objective and a seed. Each worker
+# builds its own, so it has to be a module-level function.
+SamplerFactory = Callable[["Objective", int], optuna.samplers.BaseSampler]
+
+
+def create_sampler(objective: Objective, seed: int = 42) -> optuna.samplers.BaseSampler:
+    module = optunahub.load_module(package="samplers/auto_sampler")
+
+    # https://medium.com/optuna/autosampler-automatic-selection-of-optimization-algorithms-in-optuna-1443875fd8f9
+    # These are soft constraints, so the sampler will try to avoid these values, but it is not guaranteed.
+    return module.AutoSampler(constraints_func=objective.constraints, seed=seed)
+
+
+def run_trials_multi_fidelity(
+    study: optuna.Study, objective: Objective, trials: int, fidelity: FidelityConfig
+) -> None:
+    # Successive halving over brackets of trials: trials that are not promoted
+    # are told as pruned, with the fidelity and value they were dropped at
+    assert fidelity.levels[-1] == 1, "The last fidelity level must be the full period"
+
+    for num_done in range(0, trials, fidelity.bracket_size):
+        bracket = [
+            study.ask() for _ in range(min(fidelity.bracket_size, trials - num_done))
+        ]
+        for level in fidelity.levels:
+            results = objective.evaluate_batch(bracket, level)
+            for trial, result in zip(bracket, results):
+                trial.set_user_attr("fidelity", level)
+                trial.set_user_attr("fidelity_value", result[0])
+            if level == fidelity.levels[-1]:
+                break
+
+            # Best score first, fewer trades breaking ties
+            sign = -1 if objective.direction == "maximize" else 1
+            ranked = sorted(
+                zip(bracket, results), key=lambda item: (sign * item[1][0], item[1][1])
+            )
+            num_promoted = max(1, ceil(len(bracket) * fidelity.promote_fraction))
+            for trial, _ in ranked[num_promoted:]:
+                trial.set_user_attr(
+                    "bar_evals_saved",
+                    objective.count_bar_evals(trial, 1)
+                    - objective.count_bar_evals(trial, level),
+                )
+                study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+            bracket = [trial for trial, _ in ranked[:num_promoted]]
+
+        for trial, result in zip(bracket, results):
+            study.tell(trial, objective.format_result(trial, result))
+
+
+def run_trials(
+    study: optuna.Study,
+    objective: Objective,
+    trials: int,
+    batch_size: int,
+    fidelity: FidelityConfig | None = None,
+) -> None:
+    if fidelity is not None:
+        run_trials_multi_fidelity(study, objective, trials, fidelity)
+    elif batch_size <= 1:
+        study.optimize(objective, n_trials=trials)
+    else:
+        for num_done in range(0, trials, batch_size):
+            batch = [study.ask() for _ in range(min(batch_size, trials - num_done))]
+            for trial, result in zip(batch, objective.evaluate_batch(batch)):
+                study.tell(trial, objective.format_result(trial, result))
+
+
+def attach_shared_data(currency_codes: List[str], spec: SharedFramesSpec) -> None:
+    global SHARED_FRAMES
+    SHARED_FRAMES = SharedFrames.attach(spec)
+    DATASET_CACHE.get_or_load(get_dataset_key(currency_codes), SHARED_FRAMES.get_dfs)
+
+
+def optimize_in_worker(
+    objective: Objective,
+    study_name: str,
+    storage: str,
+    pruner: optuna.pruners.BasePruner | None,
+    trials: int,
+    batch_size: int,
+    fidelity: FidelityConfig | None,
+    seed: int,
+    sampler_factory: SamplerFactory = create_sampler,
+) -> None:
+    study = optuna.load_study(
+        study_name=study_name,
+        storage=storage,
+        sampler=sampler_factory(objective, seed),
+        pruner=pruner,
+    )
+    run_trials(study, objective, trials, batch_size, fidelity)
+
+
+def optimize_in_workers(
+    objective: Objective,
+    study_name: str,
+    storage: str,
+    pruner: optuna.pruners.BasePruner | None,
+    trials: int,
+    batch_size: int,
+    fidelity: FidelityConfig | None,
+    n_workers: int,
+    sampler_factory: SamplerFactory = create_sampler,
+) -> None:
+    # Workers share the study through its storage and the aligned market data
+    # through shared memory, so each one only gets the block name
+    shared_frames = SharedFrames.create(load_data_dfs(objective.currency_codes))
+    try:
+        with ProcessPoolExecutor(
+            n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=attach_shared_data,
+            initargs=(objective.currency_codes, shared_frames.spec),
+        ) as pool:
+            futures = [
+                pool.submit(
+                    optimize_in_worker,
+                    objective,
+                    study_name,
+                    storage,
+                    pruner,
+                    trials // n_workers + (i < trials % n_workers),
+                    batch_size,
+                    fidelity,
+                    42 + i,
+                    sampler_factory,
+                )
+                for i in range(min(n_workers, trials))
+            ]
+            for future in futures:
+                future.result()
+    finally:
+        shared_frames.close()
+        shared_frames.unlink()
 
 
 def test_optuna(
@@ -84,6 +345,15 @@ def test_optuna(
     max_holding_per_currency: int,
     trials: int = 1_000,
     debug: bool = False,
+    n_workers: int = 1,
+    storage: str = OPTUNA_DB_URL,
+    pruner: optuna.pruners.BasePruner | None = None,
+    value_floor: float = PRUNE_VALUE_FLOOR,
+    single_objective: bool = False,
+    batch_size: int = 1,
+    fidelity: FidelityConfig | None = None,
+    metric: str = OBJECTIVE_METRIC,
+    sampler_factory: SamplerFactory = create_sampler,
 ):
     objective = Objective(
         start_dt,
@@ -92,27 +362,63 @@ def test_optuna(
         buy_power,
         max_amount_per_order,
         max_holding_per_currency,
+        value_floor,
+        metric,
     )
-    module = optunahub.load_module(package="samplers/auto_sampler")
 
-    # https://medium.com/optuna/autosampler-automatic-selection-of-optimization-algorithms-in-optuna-1443875fd8f9
-    # These are soft constraints, so the sampler will try to avoid these values, but it is not guaranteed.
-    sampler = module.AutoSampler(constraints_func=objective.constraints, seed=42)
+    # Only single-objective studies consult `pruner`, multi-objective ones are
+    # pruned on the value floor alone
+    metric_names = [
+        "portfolio_value" if metric == OBJECTIVE_METRIC else metric,
+        "num_trades",
+    ]
+    directions = [objective.direction, "minimize"]
+    if single_objective:
+        metric_names, directions = metric_names[:1], directions[:1]
 
     db_uid = create_db_uid(start_dt, end_dt)
     study = optuna.create_study(
-        directions=["maximize", "minimize"],
-        sampler=sampler,
-        storage=OPTUNA_DB_URL,
-        study_name=f"fib_vol_rsi_{db_uid}",
+        directions=directions,
+        sampler=sampler_factory(objective, 42),
+        pruner=pruner,
+        storage=storage,
+        study_name=(
+            f"fib_vol_rsi_{'' if metric == OBJECTIVE_METRIC else f'{metric}_'}"
+            f"{'value_' if single_objective else ''}{db_uid}"
+        ),
         load_if_exists=True,
     )
-    study.set_metric_names(["portfolio_value", "num_trades"])
-    study.optimize(objective, n_trials=trials)
+    study.set_metric_names(metric_names)
+    if n_workers > 1:
+        optimize_in_workers(
+            objective,
+            study.study_name,
+            storage,
+            pruner,
+            trials,
+            batch_size,
+            fidelity,
+            n_workers,
+            sampler_factory,
+        )
+    else:
+        run_trials(study, objective, trials, batch_size, fidelity)
+
+    pruned_trials = study.get_trials(states=[optuna.trial.TrialState.PRUNED])
+    print(
+        f"Pruned {len(pruned_trials)} of {len(study.trials)} trials, saving "
+        f"{sum(t.user_attrs.get('bar_evals_saved', 0) for t in pruned_trials)} "
+        "bar evaluations"
+    )
+    if fidelity is not None:
+        num_scored = Counter(t.user_attrs.get("fidelity") for t in study.trials)
+        print(f"Trials scored per fidelity: {dict(sorted(num_scored.items()))}")
 
     if debug:
         for t in study.best_trials[:5]:
             print(t.params, t.values)
+        print(f"Dataset cache: {DATASET_CACHE.get_stats()}")
+        print(f"Result cache: {RESULT_CACHE.get_stats()}")
 
 
 if __name__ == "__main__":
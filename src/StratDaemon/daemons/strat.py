@@ -9,6 +9,12 @@ class StratDaemon(BaseDaemon):
         self.strat = strat
         super().__init__(self.task, poll_interval)
 
+    async def start(self) -> None:
+        try:
+            await super().start()
+        finally:
+            self.strat.close()
+
     async def task(self):
         print_dt(
             f"Executing strategy {self.strat.name} with {"paper" if self.strat.paper_trade else "live"} trading"
@@ -1,26 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+from typing import List, Tuple
+import numpy as np
 import pandas as pd
 from StratDaemon.integration.broker.base import BaseBroker
-from StratDaemon.integration.db.alpaca import AlpacaMarketstoreDB
+from StratDaemon.integration.broker.utils import RateLimiter
+from StratDaemon.integration.db.alpaca import (
+    AlpacaMarketstoreDB,
+    as_utc,
+    to_epoch,
+    to_records,
+)
+from StratDaemon.integration.db.coverage import Interval
+from StratDaemon.integration.db.bar_store import (
+    AGGREGATE_TIMEFRAMES,
+    INTERVAL_TIMEFRAMES,
+    BarStore,
+    aggregate_values,
+    to_df,
+    to_step,
+    to_values,
+)
 from StratDaemon.models.crypto import CryptoHistorical, CryptoOrder
 from pandera.typing import DataFrame, Series
 from alpaca.data.historical import CryptoHistoricalDataClient
 from alpaca.data.requests import CryptoBarsRequest
 from alpaca.data.timeframe import TimeFrame
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from StratDaemon.utils.constants import (
+    ALPACA_MAX_CONCURRENCY,
+    ALPACA_MAX_REQUESTS_PER_SECOND,
+    ALPACA_WRITE_BATCH_SIZE,
+    BAR_COLUMNS,
+)
 
 DATA_BEGIN_DATE = "2024-01-01"
+TIMEFRAME = "minute"
 
 
 class AlpacaBroker(BaseBroker):
-    def __init__(self):
+    def __init__(
+        self,
+        bar_store: BarStore | None = None,
+        client: CryptoHistoricalDataClient | None = None,
+        db: AlpacaMarketstoreDB | None = None,
+        max_concurrency: int = ALPACA_MAX_CONCURRENCY,
+        max_requests_per_second: float = ALPACA_MAX_REQUESTS_PER_SECOND,
+        write_batch_size: int = ALPACA_WRITE_BATCH_SIZE,
+    ):
         super().__init__()
-        self.client = CryptoHistoricalDataClient()
-        self.db = AlpacaMarketstoreDB()
+        self.client = client or CryptoHistoricalDataClient()
+        self.db = db or AlpacaMarketstoreDB()
+        self.bar_store = bar_store
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(max_requests_per_second)
+        self.write_batch_size = write_batch_size
 
     def authenticate(self):
         pass
 
-    def perform_alpaca_req(self, start_dt: datetime, end_dt: datetime, symbol: str):
+    def perform_alpaca_req(
+        self, start_dt: datetime, end_dt: datetime, symbol: str
+    ) -> np.ndarray:
         start_req = start_dt.strftime("%Y-%m-%d")
         end_req = end_dt.strftime("%Y-%m-%d")
         print(f"Getting data from {start_req} to {end_req}")
@@ -35,15 +76,60 @@ class AlpacaBroker(BaseBroker):
             start=start_req,
             end=end_req,
         )
+        self.rate_limiter.wait()
         bars = self.client.get_crypto_bars(request_params)
         data = bars.data[symbol]
 
         assert len(data) > 0, "No data returned from Alpaca"
         print(f"Received {len(data)} data points from Alpaca")
-        df = pd.DataFrame([d.model_dump() for d in data])
+        return to_records(data)
 
+    def ingest(self, symbol: str, dt_pairs: List[Tuple[datetime, datetime]]) -> float:
+        # Ranges download concurrently while this thread batches their bars
+        # into large writes; returns the throughput in bars per second
         currency_code = symbol.split("/")[0]
-        self.db.update_ticker_data(currency_code, df)
+        start_time = time.perf_counter()
+        num_bars = num_written = 0
+        batch: List[np.ndarray] = []
+        intervals: List[Interval] = []
+
+        with ThreadPoolExecutor(self.max_concurrency) as executor:
+            results = executor.map(
+                lambda dt_pair: self.perform_alpaca_req(*dt_pair, symbol), dt_pairs
+            )
+            for (start, _), records in zip(dt_pairs, results):
+                # Minutes without trades before the first bar count as ingested
+                start_epoch = to_epoch(datetime(start.year, start.month, start.day))
+                batch.append(records)
+                intervals.append((start_epoch, int(records["Epoch"].max())))
+                num_bars += len(records)
+
+                if num_bars - num_written >= self.write_batch_size:
+                    self.write_bars(currency_code, batch, intervals)
+                    batch, intervals = [], []
+                    num_written = num_bars
+
+        self.write_bars(currency_code, batch, intervals)
+        return num_bars / (time.perf_counter() - start_time)
+
+    def write_bars(
+        self,
+        currency_code: str,
+        batch: List[np.ndarray],
+        intervals: List[Interval],
+    ) -> None:
+        if len(batch) == 0:
+            return
+
+        data = np.concatenate(batch)
+        self.db.write_ticker_data(currency_code, data, intervals)
+        if self.bar_store is not None and self.bar_store.has_data(
+            currency_code, TIMEFRAME
+        ):
+            df = pd.DataFrame({"timestamp": pd.to_datetime(data["Epoch"], unit="s")})
+            for col in BAR_COLUMNS:
+                df[col] = data[col]
+            self.bar_store.append(currency_code, TIMEFRAME, df)
 
     def get_crypto_historical(
         self,
@@ -51,25 +137,85 @@ class AlpacaBroker(BaseBroker):
         interval: str,
         pull_from_api: bool = False,
         is_backtest: bool = False,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+        warmup_bars: int = 0,
     ) -> DataFrame[CryptoHistorical]:
         symbol = f"{currency_code}/USD"
+        timeframe = INTERVAL_TIMEFRAMES[interval]
 
-        start_dt, end_dt = (
-            datetime.strptime(DATA_BEGIN_DATE, "%Y-%m-%d").replace(tzinfo=timezone.utc),
-            datetime.now(tz=timezone.utc).replace(second=0, microsecond=0),
-        )
+        begin_dt = as_utc(datetime.strptime(DATA_BEGIN_DATE, "%Y-%m-%d"))
+        now_dt = datetime.now(tz=timezone.utc).replace(second=0, microsecond=0)
+        start_dt = self.get_warmup_start_dt(interval, start_dt, warmup_bars)
+        start_dt = begin_dt if start_dt is None else as_utc(start_dt)
+        end_dt = now_dt if end_dt is None else as_utc(end_dt)
 
         if pull_from_api:
             dt_pairs = self.db.check_data_availability(currency_code, start_dt, end_dt)
             print(f"For {currency_code}, missing data for {len(dt_pairs)} date pairs")
-            for start, end in dt_pairs:
-                self.perform_alpaca_req(start, end, symbol)
+            if len(dt_pairs) > 0:
+                bars_per_sec = self.ingest(symbol, dt_pairs)
+                print(f"Ingested {currency_code} at {bars_per_sec:,.0f} bars/sec")
+
+        if self.bar_store is not None:
+            # Bars ingested through this broker are mirrored into the bar
+            # store, and any marketstore has past the store's last bar, such
+            # as bars pulled by brokers without a store, are copied over
+            # before reading, so it is read instead of marketstore
+            self.sync_bar_store(currency_code, begin_dt, now_dt)
+            return CryptoHistorical.validate(
+                self.bar_store.read(
+                    currency_code,
+                    timeframe,
+                    start_dt.replace(tzinfo=None),
+                    end_dt.replace(tzinfo=None),
+                )
+            )
+
+        if timeframe == TIMEFRAME:
+            return CryptoHistorical.validate(
+                self.get_ticker_data(currency_code, start_dt, end_dt)
+            )
+
+        # Whole buckets starting within the range, aggregated like the bar
+        # store's
+        delta = AGGREGATE_TIMEFRAMES[timeframe]
+        df = self.get_ticker_data(
+            currency_code,
+            pd.Timestamp(start_dt).ceil(delta).to_pydatetime(),
+            (pd.Timestamp(end_dt).floor(delta) + delta).to_pydatetime()
+            - timedelta(minutes=1),
+        )
+        return CryptoHistorical.validate(
+            to_df(aggregate_values(to_values(df), to_step(delta)))
+        )
+
+    def sync_bar_store(
+        self, currency_code: str, begin_dt: datetime, now_dt: datetime
+    ) -> None:
+        time_range = self.bar_store.get_time_range(currency_code, TIMEFRAME)
+        start_dt = (
+            begin_dt
+            if time_range is None
+            else as_utc(time_range[1] + timedelta(minutes=1))
+        )
+        if start_dt <= now_dt:
+            self.bar_store.append(
+                currency_code,
+                TIMEFRAME,
+                self.get_ticker_data(currency_code, start_dt, now_dt),
+            )
 
+    def get_ticker_data(
+        self, currency_code: str, start_dt: datetime, end_dt: datetime
+    ) -> pd.DataFrame:
+        # Only the requested range is queried, and writes keep the bucket
+        # sorted and unique, so the bars need no sorting or deduplicating
         df = self.db.get_ticker_data(currency_code, start_dt, end_dt)
+        if df.empty:
+            return df
         df["timestamp"] = df["timestamp"].dt.tz_localize(None)
-        df = df.sort_values("timestamp").reset_index(drop=True)
-        df = df.drop_duplicates(subset=["timestamp"], keep="first")
-        return CryptoHistorical.validate(df)
+        return df
 
     def buy_crypto_market(
         self, currency_code: str, amount: float, cur_df: Series[CryptoHistorical] | None
@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta
 from typing import List
 from StratDaemon.models.crypto import (
     CryptoAsset,
@@ -6,6 +7,12 @@ from StratDaemon.models.crypto import (
 )
 from pandera.typing import DataFrame, Series
 
+INTERVAL_DELTAS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
 
 class BaseBroker:
     def __init__(self) -> None:
@@ -18,10 +25,24 @@ class BaseBroker:
         raise NotImplementedError
 
     def get_crypto_historical(
-        self, currency_code: str, interval: str, span: str
+        self,
+        currency_code: str,
+        interval: str,
+        span: str,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+        warmup_bars: int = 0,
     ) -> DataFrame[CryptoHistorical]:
+        # Bars in [start_dt, end_dt] plus `warmup_bars` bars before start_dt
         raise NotImplementedError
 
+    def get_warmup_start_dt(
+        self, interval: str, start_dt: datetime | None, warmup_bars: int
+    ) -> datetime | None:
+        if start_dt is None:
+            return None
+        return start_dt - warmup_bars * INTERVAL_DELTAS[interval]
+
     def buy_crypto_limit(
         self, currency_code: str, amount: float, limit_price: float
     ) -> CryptoOrder:
@@ -1,25 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
 from typing import List
 import warnings
 import pandas as pd
-from StratDaemon.integration.broker.base import BaseBroker
-from StratDaemon.integration.broker.utils import BrokerException, ExceptionType
+from StratDaemon.integration.broker.base import INTERVAL_DELTAS, BaseBroker
+from StratDaemon.integration.db.bar_store import BarStore, SegmentedBarStore
+from StratDaemon.integration.broker.utils import (
+    BrokerException,
+    ExceptionType,
+    RateLimiter,
+)
 from StratDaemon.models.crypto import CryptoHistorical, CryptoOrder
 from pandera.typing import DataFrame, Series
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
-from StratDaemon.utils.constants import CRYPTO_COMPARE_API_KEY
+from StratDaemon.utils.constants import (
+    BAR_STORE_PATH,
+    CRYPTO_COMPARE_API_KEY,
+    CRYPTO_COMPARE_DATA_SOURCE,
+    CRYPTO_COMPARE_MAX_CONCURRENCY,
+    CRYPTO_COMPARE_MAX_REQUESTS_PER_SECOND,
+)
+from StratDaemon.utils.dataset_cache import DATASET_CACHE
 
 LOCAL_DATA_PATH_SUFFIX = "historical_data.json"
+MIGRATED_SUFFIX = ".migrated"
 
 
 class CryptoCompareBroker(BaseBroker):
-    def __init__(self):
+    def __init__(
+        self,
+        bar_store: BarStore | None = None,
+        max_concurrency: int = CRYPTO_COMPARE_MAX_CONCURRENCY,
+        max_requests_per_second: float = CRYPTO_COMPARE_MAX_REQUESTS_PER_SECOND,
+    ):
         super().__init__()
+        self.bar_store = bar_store or SegmentedBarStore(
+            os.path.join(BAR_STORE_PATH, CRYPTO_COMPARE_DATA_SOURCE)
+        )
         self.hist_base_url = "https://min-api.cryptocompare.com/data/histo"
         self.latest_base_url = "https://min-api.cryptocompare.com/data/price"
         self.max_limit = 2000
         self.save_data_interval = 10
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(max_requests_per_second)
+
+        # Keep-alive connections shared by the fetching threads
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=self.max_concurrency))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=self.max_concurrency))
 
     def authenticate(self):
         pass
@@ -41,9 +71,10 @@ class CryptoCompareBroker(BaseBroker):
         if to_timestamp is not None:
             req_args["toTs"] = int(to_timestamp.timestamp())
 
+        self.rate_limiter.wait()
         try:
             with warnings.catch_warnings(action="ignore"):
-                response = requests.get(
+                response = self.session.get(
                     self.formulate_url(self.hist_base_url, interval, req_args),
                     timeout=10,
                     verify=False,  # FIXME: This is insecure, but it's a possible fix to "Temporary failure in name resolution" issue
@@ -78,7 +109,9 @@ class CryptoCompareBroker(BaseBroker):
             "tsyms": "USD",
             "api_key": CRYPTO_COMPARE_API_KEY,
         }
-        response = requests.get(self.formulate_url(self.latest_base_url, "", req_args))
+        response = self.session.get(
+            self.formulate_url(self.latest_base_url, "", req_args)
+        )
         response.raise_for_status()
         return response.json()["USD"]
 
@@ -88,58 +121,116 @@ class CryptoCompareBroker(BaseBroker):
         interval: str,
         pull_from_api: bool = False,
         is_backtest: bool = False,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+        warmup_bars: int = 0,
     ) -> DataFrame[CryptoHistorical]:
-        local_data_path = f"{currency_code}_{LOCAL_DATA_PATH_SUFFIX}"
-
-        df = (
-            pd.read_json(local_data_path)
-            if os.path.exists(local_data_path)
-            else pd.DataFrame()
-        )
+        self.migrate_local_data(currency_code, interval)
 
         if pull_from_api is True:
-            crypto_hist = []
-            to_timestamp = None
-            save_data_interval = self.save_data_interval
-
-            while data := self.make_crypto_historical_req(
-                currency_code, interval, to_timestamp
-            ):
-                if all([d["volume"] == 0 for d in data]):
-                    break
-
-                crypto_hist.extend(data)
+            time_range = self.bar_store.get_time_range(currency_code, interval)
+            data = self.make_crypto_historical_req(currency_code, interval, None)
+            if data and not all([d["volume"] == 0 for d in data]):
+                self.save_data(currency_code, interval, data)
 
-                if to_timestamp is None and not df.empty:
-                    # FIXME: might miss out on data in between if not run every day
-                    to_timestamp = df["timestamp"].min()
-                else:
-                    to_timestamp = data[0]["timestamp"]
+                if is_backtest is True:
+                    # The latest page fixes the end of every older page, so
+                    # the gap since the last pull and the history before the
+                    # stored bars are fetched concurrently
+                    if time_range is None:
+                        self.fetch_pages(currency_code, interval, data[0]["timestamp"])
+                    else:
+                        self.fetch_pages(
+                            currency_code,
+                            interval,
+                            data[0]["timestamp"],
+                            stop_dt=time_range[1],
+                        )
+                        self.fetch_pages(currency_code, interval, time_range[0])
+                    self.bar_store.compact(currency_code, interval)
 
-                save_data_interval -= 1
+        df = self.bar_store.read(
+            currency_code,
+            interval,
+            self.get_warmup_start_dt(interval, start_dt, warmup_bars),
+            end_dt,
+        )
+        return self.clean_data(CryptoHistorical.validate(df))
 
-                if save_data_interval <= 0:
-                    df = self.combine_df_and_save(df, crypto_hist, local_data_path)
-                    save_data_interval = self.save_data_interval
+    def fetch_pages(
+        self,
+        currency_code: str,
+        interval: str,
+        to_timestamp: datetime,
+        stop_dt: datetime | None = None,
+    ) -> None:
+        # Walks back from `to_timestamp` in batches of concurrent page requests
+        # until the page covering `stop_dt` or the start of the history
+        page_delta = INTERVAL_DELTAS[interval] * self.max_limit
+        crypto_hist = []
+        num_pages = 0
 
-                if is_backtest is False:
+        with ThreadPoolExecutor(self.max_concurrency) as executor:
+            while True:
+                to_timestamps = [
+                    to_timestamp - i * page_delta for i in range(self.max_concurrency)
+                ]
+                if stop_dt is not None:
+                    to_timestamps = [t for t in to_timestamps if t > stop_dt]
+                if len(to_timestamps) == 0:
                     break
 
-            df = self.combine_df_and_save(df, crypto_hist, local_data_path)
+                pages = executor.map(
+                    lambda t: self.make_crypto_historical_req(
+                        currency_code, interval, t
+                    ),
+                    to_timestamps,
+                )
+                is_done = False
+                for data in pages:
+                    if not data or all([d["volume"] == 0 for d in data]):
+                        is_done = True
+                        break
+                    crypto_hist.extend(data)
+                    num_pages += 1
 
-        df = df.sort_values("timestamp", ascending=True)
-        return self.clean_data(CryptoHistorical.validate(df))
+                if num_pages >= self.save_data_interval or is_done:
+                    self.save_data(currency_code, interval, crypto_hist)
+                    crypto_hist = []
+                    num_pages = 0
+                if is_done:
+                    break
+                to_timestamp = to_timestamps[-1] - page_delta
+
+        self.save_data(currency_code, interval, crypto_hist)
 
-    def combine_df_and_save(
+    def save_data(
         self,
-        df: DataFrame[CryptoHistorical],
+        currency_code: str,
+        interval: str,
         crypto_hist: List[CryptoHistorical],
-        local_data_path: str,
-    ) -> DataFrame[CryptoHistorical]:
+    ) -> None:
+        # Only the pages fetched since the last save are written
+        if len(crypto_hist) == 0:
+            return
+
         print("Saving data...")
-        df = pd.concat([df, pd.DataFrame(crypto_hist)], ignore_index=True)
-        df.to_json(local_data_path)
-        return df
+        self.bar_store.append(currency_code, interval, pd.DataFrame(crypto_hist))
+        DATASET_CACHE.invalidate(currency_code, CRYPTO_COMPARE_DATA_SOURCE)
+
+    def migrate_local_data(self, currency_code: str, interval: str) -> None:
+        # One-shot import of the legacy whole-file JSON cache into the bar store
+        local_data_path = f"{currency_code}_{LOCAL_DATA_PATH_SUFFIX}"
+        if not os.path.exists(local_data_path):
+            return
+
+        print(f"Migrating {local_data_path} to the bar store...")
+        df = pd.read_json(local_data_path)
+        if not df.empty:
+            self.bar_store.append(currency_code, interval, df)
+            self.bar_store.compact(currency_code, interval)
+            DATASET_CACHE.invalidate(currency_code, CRYPTO_COMPARE_DATA_SOURCE)
+        os.replace(local_data_path, f"{local_data_path}{MIGRATED_SUFFIX}")
 
     def formulate_url(self, base_url, interval, req_args):
         return f"{base_url}{interval}?{'&'.join([f'{k}={v}' for k, v in req_args.items()])}"
@@ -173,6 +264,5 @@ class CryptoCompareBroker(BaseBroker):
     def clean_data(
         self, df: DataFrame[CryptoHistorical]
     ) -> DataFrame[CryptoHistorical]:
-        df = df[df["volume"] != 0]
-        df = df.drop_duplicates(subset=["timestamp"])
-        return df
+        # The bar store keeps bars sorted and unique, so only empty ones go
+        return df[df["volume"] != 0]
@@ -1,19 +1,22 @@
 import glob
 import os
-import os
+from datetime import datetime
 from typing import List
 import pandas as pd
 from StratDaemon.integration.broker.base import BaseBroker
+from StratDaemon.integration.db.bar_store import BarStore
 from StratDaemon.models.crypto import CryptoHistorical, CryptoOrder
 from pandera.typing import DataFrame, Series
 
 LOCAL_DATA_PATH = "kraken"
+TIMEFRAME = "minute"  # Kraken's `{code}USD_1.csv` files hold one-minute bars
 
 
 class KrakenBroker(BaseBroker):
-    def __init__(self):
+    def __init__(self, bar_store: BarStore | None = None):
         super().__init__()
         self.local_data_path = LOCAL_DATA_PATH
+        self.bar_store = bar_store
 
     def authenticate(self):
         pass
@@ -24,10 +27,38 @@ class KrakenBroker(BaseBroker):
         interval: str,
         pull_from_api: bool = False,
         is_backtest: bool = False,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+        warmup_bars: int = 0,
     ) -> DataFrame[CryptoHistorical]:
+        start_dt = self.get_warmup_start_dt(TIMEFRAME, start_dt, warmup_bars)
         local_data_path = os.path.join(
             self.local_data_path, f"{currency_code}USD_1.csv"
         )
+        if self.bar_store is not None:
+            # The CSV is parsed into the bar store once and served from there,
+            # and only parsed again for the rows added to it since
+            time_range = self.bar_store.get_time_range(currency_code, TIMEFRAME)
+            if time_range is None or (
+                os.path.exists(local_data_path)
+                and get_last_dt(local_data_path) > time_range[1]
+            ):
+                df = self.read_csv(local_data_path)
+                if time_range is not None:
+                    df = df[df["timestamp"] > time_range[1]]
+                self.bar_store.append(currency_code, TIMEFRAME, df)
+            return CryptoHistorical.validate(
+                self.bar_store.read(currency_code, TIMEFRAME, start_dt, end_dt)
+            )
+
+        df = self.read_csv(local_data_path)
+        if start_dt is not None:
+            df = df[df["timestamp"] >= start_dt]
+        if end_dt is not None:
+            df = df[df["timestamp"] <= end_dt]
+        return CryptoHistorical.validate(df)
+
+    def read_csv(self, local_data_path: str) -> pd.DataFrame:
         if not os.path.exists(self.local_data_path):
             raise FileNotFoundError(f"Path does not exist: {self.local_data_path}")
         df = pd.read_csv(
@@ -37,7 +68,7 @@ class KrakenBroker(BaseBroker):
             names=["timestamp", "open", "high", "low", "close", "volume"],
         )
         df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s")
-        return CryptoHistorical.validate(df)
+        return df
 
     def buy_crypto_market(
         self, currency_code: str, amount: float, cur_df: Series[CryptoHistorical] | None
@@ -64,3 +95,17 @@ class KrakenBroker(BaseBroker):
             limit_price=-1,
             timestamp=cur_df.timestamp,
         )
+
+
+def get_last_dt(path: str) -> datetime:
+    # Time of the CSV's last row, read from the end of the file
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        # The last line is whole once another line is read before it
+        lines = [b""]
+        while pos > 0 and len(lines) < 2:
+            pos = max(0, pos - 1024)
+            f.seek(pos)
+            lines = f.read().splitlines()
+    return pd.to_datetime(int(lines[-1].split(b",")[0]), unit="s").to_pydatetime()
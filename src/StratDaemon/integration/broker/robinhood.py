@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 import time
 from typing import Any, Dict, List
 import pandas as pd
@@ -18,6 +18,7 @@ from StratDaemon.models.crypto import (
 from StratDaemon.utils.constants import (
     CRYPTO_COMPARE_HISTORICAL_INTERVAL,
     NUMERICAL_SPAN,
+    RH_HISTORICAL_SPANS,
     ROBINHOOD_EMAIL,
     ROBINHOOD_PASSWORD,
 )
@@ -67,8 +68,16 @@ class RobinhoodBroker(BaseBroker):
 
     @retry_function(max_retries=2, wait_time=2)
     def get_crypto_historical(
-        self, currency_code: str, interval: str, span: str
+        self,
+        currency_code: str,
+        interval: str,
+        span: str,
+        start_dt: datetime | None = None,
     ) -> DataFrame[CryptoHistorical]:
+        # The recent bars, preceded by coarser ones back to `start_dt`. Bars
+        # are timestamped in UTC.
+        if start_dt is not None and start_dt.tzinfo is not None:
+            start_dt = start_dt.astimezone(timezone.utc).replace(tzinfo=None)
         try:
             hist_data = r.get_crypto_historicals(
                 currency_code, interval=interval, span=span
@@ -85,24 +94,51 @@ class RobinhoodBroker(BaseBroker):
                 is_backtest=False,
             )
         else:
-            hist_data_parsed = [
-                {
-                    "open": float(data["open_price"]),
-                    "close": float(data["close_price"]),
-                    "high": float(data["high_price"]),
-                    "low": float(data["low_price"]),
-                    "volume": float(data["volume"]),
-                    "timestamp": self.convert_rh_historical_dt_to_datetime(
-                        data["begins_at"]
-                    ),
-                }
-                for data in hist_data
-            ]
+            hist_data_parsed = self.parse_historicals(hist_data)
             hist_data_parsed.append(self.get_crypto_latest(currency_code))
             df = pd.DataFrame(hist_data_parsed)
         df = self.convert_to_backtest_compatible(df)
+        if start_dt is not None and (df.empty or start_dt < df["timestamp"].iloc[0]):
+            older_df = self.get_crypto_historical_since(currency_code, start_dt)
+            if not df.empty:
+                older_df = older_df[older_df["timestamp"] < df["timestamp"].iloc[0]]
+            df = pd.concat([older_df, df], ignore_index=True)
         return CryptoHistorical.validate(df)
 
+    @retry_function(max_retries=2, wait_time=2)
+    def get_crypto_historical_since(
+        self, currency_code: str, start_dt: datetime
+    ) -> pd.DataFrame:
+        # Bars since `start_dt` over the finest span reaching back to it, or
+        # the longest one
+        now_dt = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        for span, (interval, span_delta) in RH_HISTORICAL_SPANS.items():
+            if now_dt - span_delta <= start_dt:
+                break
+        df = pd.DataFrame(
+            self.parse_historicals(
+                r.get_crypto_historicals(currency_code, interval=interval, span=span)
+            )
+        )
+        return df[df["timestamp"] >= start_dt] if not df.empty else df
+
+    def parse_historicals(
+        self, hist_data: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                "open": float(data["open_price"]),
+                "close": float(data["close_price"]),
+                "high": float(data["high_price"]),
+                "low": float(data["low_price"]),
+                "volume": float(data["volume"]),
+                "timestamp": self.convert_rh_historical_dt_to_datetime(
+                    data["begins_at"]
+                ),
+            }
+            for data in hist_data
+        ]
+
     def convert_to_backtest_compatible(
         self,
         df: DataFrame[CryptoHistorical],
@@ -1,4 +1,5 @@
 from enum import Enum
+from threading import Lock
 import time
 import traceback
 from StratDaemon.integration.notification.sms import SMSNotification
@@ -22,6 +23,22 @@ class BrokerException(Exception):
         return f"{self.exception_type.name}: {self.message}"
 
 
+class RateLimiter:
+    # Spaces calls at least `1 / max_per_second` seconds apart across threads
+    def __init__(self, max_per_second: float) -> None:
+        self.interval = 1 / max_per_second
+        self.next_time = 0.0
+        self.lock = Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
 def retry_function(max_retries: int, wait_time: int):
     def retry_logic(func):
         def wrapper(*args, **kwargs):
@@ -1,45 +1,81 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Tuple
 import warnings
 import numpy as np
 import pandas as pd
 import pymarketstore as pymkts
+from alpaca.data.models import Bar
+from StratDaemon.integration.db.coverage import CoverageIndex, Interval, to_intervals
+from StratDaemon.utils.constants import ALPACA_DATA_SOURCE
+from StratDaemon.utils.dataset_cache import DATASET_CACHE
+
+# Columns of the marketstore OHLCV bucket after `Epoch`
+RECORD_COLUMNS = ["open", "high", "low", "close", "volume", "trade_count", "vwap"]
 
 
 class AlpacaMarketstoreDB:
-    def __init__(self, timeframe: str = "1Min"):
-        self.pym_cli = pymkts.Client(endpoint="http://localhost:5993/rpc")
+    def __init__(
+        self,
+        timeframe: str = "1Min",
+        coverage_index: CoverageIndex | None = None,
+        pym_cli: pymkts.Client | None = None,
+    ):
+        self.pym_cli = pym_cli or pymkts.Client(endpoint="http://localhost:5993/rpc")
         self.set_symbols = set(self.pym_cli.list_symbols())
         self.timeframe = timeframe
+        self.step = int(pd.Timedelta(timeframe).total_seconds())
+        self.coverage_index = coverage_index or CoverageIndex()
+
+    def get_coverage_key(self, ticker: str) -> str:
+        return f"{ticker}/{self.timeframe}"
+
+    def rebuild_coverage(self, ticker: str) -> None:
+        # Runs of consecutive stored epochs, for data ingested before the index
+        epochs = np.array([], dtype=np.int64)
+        if ticker in self.set_symbols:
+            index = (
+                self.pym_cli.sql(
+                    [f"SELECT Epoch FROM `{ticker}/{self.timeframe}/OHLCV`;"]
+                )
+                .first()
+                .df()
+                .index
+            )
+            epochs = index.asi8 // 10**9
+        self.coverage_index.set(
+            self.get_coverage_key(ticker), to_intervals(epochs, self.step), self.step
+        )
 
     def check_data_availability(
         self, ticker: str, start_timestamp: datetime, end_timestamp: datetime
     ) -> List[Tuple[datetime, datetime]]:
-        all_dates: List[pd.Timestamp] = list(
-            self.pym_cli.sql([f"SELECT Epoch FROM `{ticker}/{self.timeframe}/OHLCV`;"])
-            .first()
-            .df()
-            .index
-        )
-        req_dates = pd.date_range(
-            start=start_timestamp, end=end_timestamp, freq=self.timeframe
+        key = self.get_coverage_key(ticker)
+        if not self.coverage_index.has_key(key):
+            self.rebuild_coverage(ticker)
+
+        missing_intervals = self.coverage_index.get_missing(
+            key,
+            -(-to_epoch(start_timestamp) // self.step) * self.step,
+            to_epoch(end_timestamp) // self.step * self.step,
+            self.step,
         )
-        req_dates = [d.to_pydatetime().replace(tzinfo=None) for d in req_dates]
-        all_dates = [d.to_pydatetime().replace(tzinfo=None) for d in all_dates]
-
-        missing_dates = sorted(set(req_dates) - set(all_dates))
         dt_pairs: List[Tuple[datetime, datetime]] = []
 
-        if len(missing_dates) == 0:
+        if len(missing_intervals) == 0:
             return []
 
-        missing_dates = sorted(set(dt.date() for dt in missing_dates))
+        missing_dates = set()
+        for start, end in missing_intervals:
+            start_date, end_date = to_utc_dt(start).date(), to_utc_dt(end).date()
+            missing_dates.update(
+                start_date + timedelta(days=i)
+                for i in range((end_date - start_date).days + 1)
+            )
+        missing_dates = sorted(missing_dates)
         consec_dates = self.get_consec_dts(missing_dates, timedelta(days=1))
         for consec in consec_dates:
-            if len(consec) == 1:
-                dt_pairs.append((consec[0], consec[0] + timedelta(days=1)))
-            else:
-                dt_pairs.append((consec[0], consec[-1]))
+            # Requests end at the start of their end date
+            dt_pairs.append((consec[0], consec[-1] + timedelta(days=1)))
 
         return dt_pairs
 
@@ -55,7 +91,11 @@ class AlpacaMarketstoreDB:
 
         return consec
 
-    def update_ticker_data(self, ticker: str, df: pd.DataFrame):
+    def update_ticker_data(
+        self, ticker: str, df: pd.DataFrame, start_dt: datetime | None = None
+    ):
+        # `start_dt` is where the request for `df` began, so minutes without
+        # trades before its first bar still count as ingested
         df_updated = df.reset_index(drop=True)
         df_updated["timestamp"] = df_updated["timestamp"].apply(
             lambda d: d.value // 10**9
@@ -66,12 +106,33 @@ class AlpacaMarketstoreDB:
         records = df_updated.to_records(index=False)
         data = np.array(records, dtype=records.dtype.descr)
 
-        response = self.pym_cli.write(
-            data, f"{ticker}/{self.timeframe}/OHLCV", isvariablelength=True
+        epochs = df_updated["Epoch"].to_numpy(np.int64)
+        start = (
+            epochs.min() if start_dt is None else min(to_epoch(start_dt), epochs.min())
         )
-        assert (
-            response is not None and response["responses"] is None
-        ), "Error in updating data in database."
+        self.write_ticker_data(ticker, data, [(int(start), int(epochs.max()))])
+
+    def write_ticker_data(
+        self, ticker: str, data: np.ndarray, intervals: List[Interval]
+    ) -> None:
+        # Writes bar records in one call and marks `intervals` as ingested.
+        # Records are sorted and those already ingested are dropped, so the
+        # bucket never holds duplicate epochs and reads need not dedupe
+        data = np.sort(data, order="Epoch", kind="stable")
+        _, first_idx = np.unique(data["Epoch"], return_index=True)
+        data = data[first_idx]
+        data = data[
+            ~self.coverage_index.contains(self.get_coverage_key(ticker), data["Epoch"])
+        ]
+        if len(data) > 0:
+            response = self.pym_cli.write(
+                data, f"{ticker}/{self.timeframe}/OHLCV", isvariablelength=True
+            )
+            assert (
+                response is not None and response["responses"] is None
+            ), "Error in updating data in database."
+        self.coverage_index.add(self.get_coverage_key(ticker), intervals, self.step)
+        DATASET_CACHE.invalidate(ticker, ALPACA_DATA_SOURCE)
 
     def get_ticker_data(
         self, ticker: str, start_timestamp: datetime, end_timestamp: datetime
@@ -80,8 +141,8 @@ class AlpacaMarketstoreDB:
             ticker,
             self.timeframe,
             "OHLCV",
-            int(start_timestamp.timestamp()),
-            int(end_timestamp.timestamp()),
+            to_epoch(start_timestamp),
+            to_epoch(end_timestamp),
         )
 
         try:
@@ -91,4 +152,42 @@ class AlpacaMarketstoreDB:
             return pd.DataFrame()
 
         df.rename(columns={"Epoch": "timestamp"}, inplace=True)
+        epochs = df["timestamp"].to_numpy()
+        if not (epochs[1:] > epochs[:-1]).all():
+            # Only buckets written before writes were deduplicated get here
+            df = df.sort_values("timestamp", kind="stable")
+            df = df.drop_duplicates(subset=["timestamp"], keep="first")
+            df = df.reset_index(drop=True)
         return df
+
+
+def as_utc(dt: datetime) -> datetime:
+    # Naive datetimes are taken as UTC, like the bars' timestamps
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def to_epoch(dt: datetime) -> int:
+    return int(as_utc(dt).timestamp())
+
+
+def to_utc_dt(epoch: int) -> datetime:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None)
+
+
+def to_records(bars: List[Bar]) -> np.ndarray:
+    # Fills each column from the bars directly instead of dumping every bar
+    # to a dict and building a DataFrame from those
+    records = np.empty(
+        len(bars),
+        dtype=[("Epoch", np.int64)] + [(col, np.float64) for col in RECORD_COLUMNS],
+    )
+    records["Epoch"] = np.fromiter(
+        (int(bar.timestamp.timestamp()) for bar in bars),
+        dtype=np.int64,
+        count=len(bars),
+    )
+    for col in RECORD_COLUMNS:
+        records[col] = np.array([getattr(bar, col) for bar in bars], dtype=np.float64)
+    return records
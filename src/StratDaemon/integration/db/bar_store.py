@@ -0,0 +1,421 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Generator, List, Tuple
+import numpy as np
+import pandas as pd
+from pandera.typing import DataFrame
+from StratDaemon.models.crypto import CryptoHistorical
+from StratDaemon.utils.constants import BAR_COLUMNS
+
+PARTITION_SUFFIX = ".npy"
+LOCK_FILE_NAME = ".lock"
+SEGMENT_DIR_NAME = "segments"
+MAX_SEGMENTS = 64  # Segments a symbol may accumulate before being compacted
+BASE_TIMEFRAME = "minute"
+# Timeframes rolled up from the minute bars whenever those are appended, named
+# like marketstore's on-disk aggregates
+AGGREGATE_TIMEFRAMES = {
+    "5Min": timedelta(minutes=5),
+    "15Min": timedelta(minutes=15),
+    "1H": timedelta(hours=1),
+    "1D": timedelta(days=1),
+}
+# Stored timeframe of each broker interval
+INTERVAL_TIMEFRAMES = {"minute": BASE_TIMEFRAME, "hour": "1H", "day": "1D"}
+
+
+class BarStore:
+    def read(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+    ) -> DataFrame[CryptoHistorical]:
+        raise NotImplementedError
+
+    def append(
+        self, symbol: str, timeframe: str, df: DataFrame[CryptoHistorical]
+    ) -> None:
+        raise NotImplementedError
+
+    def has_data(self, symbol: str, timeframe: str) -> bool:
+        raise NotImplementedError
+
+    def get_time_range(
+        self, symbol: str, timeframe: str
+    ) -> Tuple[datetime, datetime] | None:
+        raise NotImplementedError
+
+    def compact(self, symbol: str, timeframe: str) -> None:
+        raise NotImplementedError
+
+
+class ColumnarBarStore(BarStore):
+    """
+    Bars stored under `{root}/{symbol}/{timeframe}/{YYYY-MM}.npy`, one file per
+    month. Each file holds a (6, n) float64 array sorted by time: row 0 is the
+    int64 nanosecond timestamp reinterpreted as float64, followed by one
+    contiguous row per column in `BAR_COLUMNS`. Reads memory-map only the
+    months overlapping the requested range and slice them by binary search.
+
+    Appending minute bars also re-aggregates the `AGGREGATE_TIMEFRAMES`
+    buckets they fall in, so coarser bars are read as stored and a partial
+    trailing bucket is replaced rather than the history recomputed.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def get_partition_dir(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, symbol, timeframe)
+
+    def get_months(self, symbol: str, timeframe: str) -> List[str]:
+        partition_dir = self.get_partition_dir(symbol, timeframe)
+        if not os.path.isdir(partition_dir):
+            return []
+        return sorted(
+            name.removesuffix(PARTITION_SUFFIX)
+            for name in os.listdir(partition_dir)
+            if name.endswith(PARTITION_SUFFIX)
+        )
+
+    def get_partition_path(self, symbol: str, timeframe: str, month: str) -> str:
+        return os.path.join(
+            self.get_partition_dir(symbol, timeframe), f"{month}{PARTITION_SUFFIX}"
+        )
+
+    def has_data(self, symbol: str, timeframe: str) -> bool:
+        return len(self.get_months(symbol, timeframe)) > 0
+
+    def get_time_range(
+        self, symbol: str, timeframe: str
+    ) -> Tuple[datetime, datetime] | None:
+        months = self.get_months(symbol, timeframe)
+        if len(months) == 0:
+            return None
+        first = np.load(
+            self.get_partition_path(symbol, timeframe, months[0]), mmap_mode="r"
+        )
+        last = np.load(
+            self.get_partition_path(symbol, timeframe, months[-1]), mmap_mode="r"
+        )
+        return to_dt(first[0, 0]), to_dt(last[0, -1])
+
+    def read(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+    ) -> DataFrame[CryptoHistorical]:
+        if timeframe in AGGREGATE_TIMEFRAMES and not self.has_data(symbol, timeframe):
+            # Minute bars stored before aggregates were kept
+            self.rebuild_aggregates(symbol)
+        return to_df(self.read_values(symbol, timeframe, start_dt, end_dt))
+
+    def read_values(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+    ) -> np.ndarray:
+        start_month = None if start_dt is None else get_month(np.datetime64(start_dt))
+        end_month = None if end_dt is None else get_month(np.datetime64(end_dt))
+
+        parts: List[np.ndarray] = []
+        for month in self.get_months(symbol, timeframe):
+            if (start_month is not None and month < start_month) or (
+                end_month is not None and month > end_month
+            ):
+                continue
+
+            values = slice_values(
+                np.load(
+                    self.get_partition_path(symbol, timeframe, month), mmap_mode="r"
+                ),
+                start_dt,
+                end_dt,
+            )
+            if values.shape[1] > 0:
+                parts.append(values)
+
+        return (
+            np.concatenate(parts, axis=1)
+            if parts
+            else np.empty((len(BAR_COLUMNS) + 1, 0), dtype=np.float64)
+        )
+
+    def append(
+        self, symbol: str, timeframe: str, df: DataFrame[CryptoHistorical]
+    ) -> None:
+        if df.empty:
+            return
+
+        new_values = to_values(df)
+        os.makedirs(self.get_partition_dir(symbol, timeframe), exist_ok=True)
+        with self.lock(symbol, timeframe):
+            self.write_values(symbol, timeframe, new_values)
+            if timeframe == BASE_TIMEFRAME:
+                self.update_aggregates(symbol, new_values)
+
+    def write_values(self, symbol: str, timeframe: str, new_values: np.ndarray) -> None:
+        self.write_months(symbol, timeframe, new_values)
+
+    def update_aggregates(self, symbol: str, new_values: np.ndarray) -> None:
+        # Re-aggregates the buckets spanned by the appended minute bars from
+        # the stored ones; callers hold the minute lock
+        timestamps = new_values[0].view(np.int64)
+        for timeframe, delta in AGGREGATE_TIMEFRAMES.items():
+            step = to_step(delta)
+            start = timestamps.min() // step * step
+            # Datetimes hold microseconds, so the bucket ends a microsecond early
+            end = (timestamps.max() // step + 1) * step - 1_000
+            values = aggregate_values(
+                self.read_values(
+                    symbol, BASE_TIMEFRAME, to_dt(to_value(start)), to_dt(to_value(end))
+                ),
+                step,
+            )
+            os.makedirs(self.get_partition_dir(symbol, timeframe), exist_ok=True)
+            with self.lock(symbol, timeframe):
+                self.write_values(symbol, timeframe, values)
+
+    def rebuild_aggregates(self, symbol: str) -> None:
+        if not self.has_data(symbol, BASE_TIMEFRAME):
+            return
+        with self.lock(symbol, BASE_TIMEFRAME):
+            self.update_aggregates(symbol, self.read_values(symbol, BASE_TIMEFRAME))
+
+    def write_months(self, symbol: str, timeframe: str, new_values: np.ndarray) -> None:
+        # Merges bars into their month partitions; callers hold the lock
+        months = get_month(new_values[0].view(np.int64).view("datetime64[ns]"))
+        for month in np.unique(months):
+            path = self.get_partition_path(symbol, timeframe, month)
+            values = new_values[:, months == month]
+            if os.path.exists(path):
+                values = np.concatenate([np.load(path), values], axis=1)
+            save_values(path, sort_and_dedupe(values))
+
+    def compact(self, symbol: str, timeframe: str) -> None:
+        # Appends are merged into the partitions directly
+        pass
+
+    @contextmanager
+    def lock(self, symbol: str, timeframe: str) -> Generator[None, None, None]:
+        # Serializes writers of the same symbol and timeframe across processes
+        lock_path = os.path.join(
+            self.get_partition_dir(symbol, timeframe), LOCK_FILE_NAME
+        )
+        with open(lock_path, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SegmentedBarStore(ColumnarBarStore):
+    """
+    A `ColumnarBarStore` whose appends write each batch of bars to a new
+    segment file instead of rewriting month partitions, so ingestion only
+    writes the bars it fetched. Reads merge the overlapping parts of segments
+    over the partitions, later segments winning, and `compact` sorts and
+    dedupes segments into the partitions.
+    """
+
+    def __init__(self, root: str, max_segments: int = MAX_SEGMENTS) -> None:
+        super().__init__(root)
+        self.max_segments = max_segments
+
+    def get_segment_dir(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.get_partition_dir(symbol, timeframe), SEGMENT_DIR_NAME)
+
+    def get_segment_paths(self, symbol: str, timeframe: str) -> List[str]:
+        segment_dir = self.get_segment_dir(symbol, timeframe)
+        if not os.path.isdir(segment_dir):
+            return []
+        return [
+            os.path.join(segment_dir, name)
+            for name in sorted(os.listdir(segment_dir))
+            if name.endswith(PARTITION_SUFFIX)
+        ]
+
+    def has_data(self, symbol: str, timeframe: str) -> bool:
+        return super().has_data(symbol, timeframe) or (
+            len(self.get_segment_paths(symbol, timeframe)) > 0
+        )
+
+    def get_time_range(
+        self, symbol: str, timeframe: str
+    ) -> Tuple[datetime, datetime] | None:
+        time_ranges = [super().get_time_range(symbol, timeframe)]
+        for path in self.get_segment_paths(symbol, timeframe):
+            values = np.load(path, mmap_mode="r")
+            time_ranges.append((to_dt(values[0, 0]), to_dt(values[0, -1])))
+
+        time_ranges = [time_range for time_range in time_ranges if time_range]
+        if len(time_ranges) == 0:
+            return None
+        return min(start for start, _ in time_ranges), max(
+            end for _, end in time_ranges
+        )
+
+    def read_values(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+    ) -> np.ndarray:
+        while True:
+            try:
+                parts = [super().read_values(symbol, timeframe, start_dt, end_dt)]
+                for path in self.get_segment_paths(symbol, timeframe):
+                    parts.append(
+                        slice_values(np.load(path, mmap_mode="r"), start_dt, end_dt)
+                    )
+            except FileNotFoundError:
+                # A concurrent compaction removed a segment after it was
+                # listed, so its bars are in the partitions now
+                continue
+
+            if all(part.shape[1] == 0 for part in parts[1:]):
+                return parts[0]
+            return sort_and_dedupe(np.concatenate(parts, axis=1))
+
+    def write_values(self, symbol: str, timeframe: str, new_values: np.ndarray) -> None:
+        segment_dir = self.get_segment_dir(symbol, timeframe)
+        os.makedirs(segment_dir, exist_ok=True)
+        paths = self.get_segment_paths(symbol, timeframe)
+        seq = (
+            int(os.path.basename(paths[-1]).removesuffix(PARTITION_SUFFIX)) + 1
+            if paths
+            else 0
+        )
+        save_values(
+            os.path.join(segment_dir, f"{seq:08d}{PARTITION_SUFFIX}"),
+            sort_and_dedupe(new_values),
+        )
+        if len(paths) + 1 >= self.max_segments:
+            self.merge_segments(symbol, timeframe)
+
+    def compact(self, symbol: str, timeframe: str) -> None:
+        if len(self.get_segment_paths(symbol, timeframe)) == 0:
+            return
+
+        with self.lock(symbol, timeframe):
+            self.merge_segments(symbol, timeframe)
+
+    def merge_segments(self, symbol: str, timeframe: str) -> None:
+        # Segments are removed only once their bars are in the partitions, so
+        # an interrupted compaction is simply redone by the next one
+        paths = self.get_segment_paths(symbol, timeframe)
+        if len(paths) == 0:
+            return
+
+        self.write_months(
+            symbol, timeframe, np.concatenate([np.load(p) for p in paths], axis=1)
+        )
+        for path in paths:
+            os.remove(path)
+
+
+def to_ns(dt: datetime) -> np.int64:
+    return np.datetime64(dt, "ns").view(np.int64)
+
+
+def to_value(ns: np.int64) -> np.float64:
+    return np.int64(ns).view(np.float64)
+
+
+def to_step(delta: timedelta) -> np.int64:
+    return np.timedelta64(delta, "ns").view(np.int64)
+
+
+def to_dt(value: np.float64) -> datetime:
+    return pd.Timestamp(np.float64(value).view(np.int64)).to_pydatetime()
+
+
+def get_month(timestamps: np.ndarray | np.datetime64) -> np.ndarray | str:
+    return np.datetime_as_string(timestamps.astype("datetime64[M]"), unit="M")
+
+
+def to_values(df: DataFrame[CryptoHistorical]) -> np.ndarray:
+    values = np.empty((len(BAR_COLUMNS) + 1, len(df)), dtype=np.float64)
+    values[0] = (
+        df["timestamp"].to_numpy("datetime64[ns]").view(np.int64).view(np.float64)
+    )
+    values[1:] = df[BAR_COLUMNS].to_numpy(np.float64).T
+    return values
+
+
+def to_df(values: np.ndarray) -> DataFrame[CryptoHistorical]:
+    df = pd.DataFrame({"timestamp": values[0].view(np.int64).view("datetime64[ns]")})
+    for i, col in enumerate(BAR_COLUMNS, start=1):
+        df[col] = values[i]
+    return df
+
+
+def slice_values(
+    values: np.ndarray, start_dt: datetime | None, end_dt: datetime | None
+) -> np.ndarray:
+    # Bars within [start_dt, end_dt] of time-sorted values, found by binary search
+    timestamps = values[0].view(np.int64)
+    lo = (
+        0
+        if start_dt is None
+        else np.searchsorted(timestamps, to_ns(start_dt), side="left")
+    )
+    hi = (
+        len(timestamps)
+        if end_dt is None
+        else np.searchsorted(timestamps, to_ns(end_dt), side="right")
+    )
+    return values[:, lo:hi]
+
+
+def sort_and_dedupe(values: np.ndarray) -> np.ndarray:
+    # A stable sort keeps bars with equal timestamps in write order, so the
+    # last one of each run is the most recently appended
+    timestamps = values[0].view(np.int64)
+    order = np.argsort(timestamps, kind="stable")
+    timestamps = timestamps[order]
+    keep = np.append(timestamps[1:] != timestamps[:-1], True)
+    return np.ascontiguousarray(values[:, order[keep]])
+
+
+def aggregate_values(values: np.ndarray, step: np.int64) -> np.ndarray:
+    # OHLCV of each `step`-nanosecond bucket holding time-sorted bars
+    timestamps = values[0].view(np.int64) // step * step
+    starts = np.flatnonzero(np.append(True, timestamps[1:] != timestamps[:-1]))
+    ends = np.append(starts[1:], len(timestamps)) - 1
+
+    agg_values = np.empty((len(BAR_COLUMNS) + 1, len(starts)), dtype=np.float64)
+    agg_values[0] = timestamps[starts].view(np.float64)
+    if len(starts) == 0:
+        return agg_values
+    for i, col in enumerate(BAR_COLUMNS, start=1):
+        if col == "open":
+            agg_values[i] = values[i, starts]
+        elif col == "high":
+            agg_values[i] = np.maximum.reduceat(values[i], starts)
+        elif col == "low":
+            agg_values[i] = np.minimum.reduceat(values[i], starts)
+        elif col == "close":
+            agg_values[i] = values[i, ends]
+        else:
+            agg_values[i] = np.add.reduceat(values[i], starts)
+    return agg_values
+
+
+def save_values(path: str, values: np.ndarray) -> None:
+    # Readers may hold the old file memory-mapped, so it is replaced rather
+    # than rewritten in place
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, values)
+    os.replace(tmp_path, path)
@@ -0,0 +1,99 @@
+import json
+import os
+from typing import Dict, List, Tuple
+import numpy as np
+from StratDaemon.utils.constants import ALPACA_COVERAGE_INDEX_PATH
+
+# Inclusive (start, end) epoch seconds of a run of bars spaced `step` apart
+Interval = Tuple[int, int]
+
+
+def to_intervals(epochs: np.ndarray, step: int) -> List[Interval]:
+    epochs = np.unique(np.asarray(epochs, dtype=np.int64))
+    if len(epochs) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(epochs) != step)
+    starts = np.concatenate([epochs[:1], epochs[breaks + 1]])
+    ends = np.concatenate([epochs[breaks], epochs[-1:]])
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def merge_intervals(intervals: List[Interval], step: int) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + step:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(
+    start: int, end: int, intervals: List[Interval], step: int
+) -> List[Interval]:
+    # Parts of [start, end] not covered by the merged `intervals`
+    if start > end:
+        return []
+
+    missing: List[Interval] = []
+    cur = start
+    for int_start, int_end in intervals:
+        if int_end < cur:
+            continue
+        if int_start > end:
+            break
+        if int_start > cur:
+            missing.append((cur, int_start - step))
+        cur = int_end + step
+        if cur > end:
+            return missing
+    missing.append((cur, end))
+    return missing
+
+
+class CoverageIndex:
+    """
+    Epoch ranges already ingested per symbol/timeframe key, persisted as JSON
+    so availability checks need neither the stored bars nor a per-minute scan.
+    """
+
+    def __init__(self, path: str = ALPACA_COVERAGE_INDEX_PATH) -> None:
+        self.path = path
+        self.intervals: Dict[str, List[Interval]] = dict()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.intervals = {
+                    key: [tuple(interval) for interval in intervals]
+                    for key, intervals in json.load(f).items()
+                }
+
+    def has_key(self, key: str) -> bool:
+        return key in self.intervals
+
+    def get(self, key: str) -> List[Interval]:
+        return self.intervals.get(key, [])
+
+    def set(self, key: str, intervals: List[Interval], step: int) -> None:
+        self.intervals[key] = merge_intervals(intervals, step)
+        self.save()
+
+    def add(self, key: str, intervals: List[Interval], step: int) -> None:
+        self.set(key, self.get(key) + intervals, step)
+
+    def contains(self, key: str, epochs: np.ndarray) -> np.ndarray:
+        # Whether each sorted epoch lies inside an ingested interval
+        intervals = np.array(self.get(key), dtype=np.int64).reshape(-1, 2)
+        if len(intervals) == 0:
+            return np.zeros(len(epochs), dtype=bool)
+        idx = np.searchsorted(intervals[:, 0], epochs, side="right") - 1
+        return (idx >= 0) & (epochs <= intervals[np.maximum(idx, 0), 1])
+
+    def get_missing(self, key: str, start: int, end: int, step: int) -> List[Interval]:
+        return subtract_intervals(start, end, self.get(key), step)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.intervals, f)
+        os.replace(tmp_path, self.path)
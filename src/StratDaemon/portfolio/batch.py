@@ -0,0 +1,350 @@
+from typing import List
+import numpy as np
+import pandas as pd
+from StratDaemon.models.crypto import CryptoOrder
+from StratDaemon.portfolio.ledger import CLOSED_LOT, LEDGER_CAPACITY, ZERO_AMOUNT
+from StratDaemon.portfolio.metrics import MetricsAccumulator, PerformanceMetrics
+from StratDaemon.portfolio.portfolio_manager import EXIT_SCAN_TICKS
+
+BATCH_MARK_TICKS = 4096  # Ticks marked to market before the metrics take them in
+
+
+class PortfolioBatch:
+    """
+    Portfolios of strategies that only differ in their thresholds, replayed
+    over the same ticks together. Buy power, positions and lots are arrays
+    with a row per portfolio, so a trade is made at once for every portfolio
+    making it at a tick. Each row follows `PortfolioManager` and its
+    `PositionLedger`: lots are kept in the order they were bought, sold first
+    in, first out, and closed once worth nothing.
+    """
+
+    def __init__(
+        self,
+        currency_codes: List[str],
+        buy_power: float,
+        trailing_stop_losses: List[float],
+        trailing_take_profits: List[float],
+        transaction_fee: float,
+        capacity: int = LEDGER_CAPACITY,
+    ) -> None:
+        num_portfolios = len(trailing_stop_losses)
+        self.currency_codes = currency_codes
+        self.transaction_fee = transaction_fee
+        self.trailing_stop_losses = np.asarray(trailing_stop_losses, dtype=float)
+        self.trailing_take_profits = np.asarray(trailing_take_profits, dtype=float)
+        self.buy_power = np.full(num_portfolios, float(buy_power))
+        self.quantities = np.zeros((num_portfolios, len(currency_codes)))
+        self.num_buy_trades = np.zeros(num_portfolios, dtype=np.int64)
+        self.num_sell_trades = np.zeros(num_portfolios, dtype=np.int64)
+
+        self.lot_currencies = np.full((num_portfolios, capacity), CLOSED_LOT)
+        self.lot_quantities = np.zeros((num_portfolios, capacity))
+        self.lot_costs = np.zeros((num_portfolios, capacity))
+        self.lot_asset_prices = np.zeros((num_portfolios, capacity))
+        self.lot_limit_prices = np.zeros((num_portfolios, capacity))
+        self.lot_highs = np.zeros((num_portfolios, capacity))
+        self.lot_ticks = np.zeros((num_portfolios, capacity), dtype=np.int64)
+        self.sizes = np.zeros(num_portfolios, dtype=np.int64)
+
+        # Trades are tallied here and handed to the metrics at the end
+        self.metrics = [MetricsAccumulator() for _ in range(num_portfolios)]
+        self.traded_amounts = np.zeros(num_portfolios)
+        self.fees = np.zeros(num_portfolios)
+        self.num_sells = np.zeros(num_portfolios, dtype=np.int64)
+        self.num_wins = np.zeros(num_portfolios, dtype=np.int64)
+        self.realized_pnls = np.zeros(num_portfolios)
+        self.marked_values = np.empty((num_portfolios, BATCH_MARK_TICKS))
+        self.marked_positions_values = np.empty((num_portfolios, BATCH_MARK_TICKS))
+        self.num_marked = 0
+
+    def get_lot_arrays(self) -> List[np.ndarray]:
+        return [
+            self.lot_currencies,
+            self.lot_quantities,
+            self.lot_costs,
+            self.lot_asset_prices,
+            self.lot_limit_prices,
+            self.lot_highs,
+            self.lot_ticks,
+        ]
+
+    def make_room(self, rows: np.ndarray) -> None:
+        # Closed lots are dropped once a row buying has no room left, and the
+        # arrays doubled if that is not enough
+        capacity = self.lot_currencies.shape[1]
+        if (self.sizes[rows] < capacity).all():
+            return
+        is_open = self.lot_currencies != CLOSED_LOT
+        order = np.argsort(~is_open, axis=1, kind="stable")
+        for values in self.get_lot_arrays():
+            values[:] = np.take_along_axis(values, order, axis=1)
+        self.sizes = is_open.sum(axis=1)
+        if (self.sizes[rows] < capacity).all():
+            return
+        (
+            self.lot_currencies,
+            self.lot_quantities,
+            self.lot_costs,
+            self.lot_asset_prices,
+            self.lot_limit_prices,
+            self.lot_highs,
+            self.lot_ticks,
+        ) = [
+            np.concatenate([values, np.zeros_like(values)], axis=1)
+            for values in self.get_lot_arrays()
+        ]
+        self.lot_currencies[:, capacity:] = CLOSED_LOT
+
+    def raise_highs(self, highs: np.ndarray) -> None:
+        # Raises every open lot's high by its currency's high, which is -inf
+        # for closed lots
+        self.lot_highs = np.maximum(
+            self.lot_highs, np.append(highs, -np.inf)[self.lot_currencies]
+        )
+
+    def get_stopped_lots(self, rows: np.ndarray, prices: np.ndarray) -> np.ndarray:
+        # Lots whose price fell the trailing stop loss below, or rose the
+        # trailing take profit above, their high since they were bought
+        currencies = self.lot_currencies[rows]
+        lot_prices = np.append(prices, np.nan)[currencies]
+        highs = self.lot_highs[rows]
+        return (currencies != CLOSED_LOT) & (
+            (lot_prices < highs * (1 - self.trailing_stop_losses[rows, None]))
+            | (lot_prices > highs * (1 + self.trailing_take_profits[rows, None]))
+        )
+
+    def get_exit_ticks(
+        self,
+        rows: np.ndarray,
+        closes: np.ndarray,
+        seen_closes: np.ndarray,
+        ends: np.ndarray,
+        tick: int,
+    ) -> np.ndarray:
+        # First tick from `tick` on at which a lot of each row is stopped out
+        # as long as its lots stay the same, or `len(ends)`, given closes by
+        # currency, with the highs raised by the bars up to the one before
+        # `tick`'s. As in `PortfolioManager.get_exit_tick`, the oldest lot of
+        # a currency hits the stop loss first and the newest the take profit.
+        exit_ticks = np.full(len(rows), len(ends))
+        currencies = self.lot_currencies[rows]
+        highs = self.lot_highs[rows]
+        is_held = (
+            currencies[:, None, :] == np.arange(len(self.currency_codes))[None, :, None]
+        )
+        oldest_highs = np.where(is_held, highs[:, None, :], -np.inf).max(axis=2)
+        newest_highs = np.where(is_held, highs[:, None, :], np.inf).min(axis=2)
+        is_held = is_held.any(axis=2)
+        stop_factors = (1 - self.trailing_stop_losses[rows])[:, None, None]
+        take_factors = (1 + self.trailing_take_profits[rows])[:, None, None]
+
+        # Scans ticks in blocks that double in size
+        scanned = np.flatnonzero(is_held.any(axis=1))
+        start = ends[tick - 1] + 1 if tick > 0 else 0
+        num_ticks = EXIT_SCAN_TICKS
+        while len(scanned) > 0 and tick < len(ends):
+            stop = min(tick + num_ticks, len(ends))
+            running_highs = np.maximum.accumulate(
+                seen_closes[:, start : ends[stop - 1] + 1], axis=1
+            )
+            tick_highs = running_highs[:, ends[tick:stop] - start][None]
+            tick_closes = closes[:, ends[tick:stop]][None]
+            is_exit = (
+                is_held[scanned, :, None]
+                & (
+                    (
+                        tick_closes
+                        < np.maximum(oldest_highs[scanned, :, None], tick_highs)
+                        * stop_factors[scanned]
+                    )
+                    | (
+                        tick_closes
+                        > np.maximum(newest_highs[scanned, :, None], tick_highs)
+                        * take_factors[scanned]
+                    )
+                )
+            ).any(axis=1)
+            is_found = is_exit.any(axis=1)
+            exit_ticks[scanned[is_found]] = tick + is_exit[is_found].argmax(axis=1)
+            oldest_highs = np.maximum(oldest_highs, running_highs[:, -1])
+            newest_highs = np.maximum(newest_highs, running_highs[:, -1])
+            scanned = scanned[~is_found]
+            start, tick = ends[stop - 1] + 1, stop
+            num_ticks *= 2
+        return exit_ticks
+
+    def buy(
+        self,
+        rows: np.ndarray,
+        currencies: np.ndarray,
+        amounts: np.ndarray,
+        prices: np.ndarray,
+        limit_prices: np.ndarray,
+        tick: int,
+    ) -> None:
+        # As `PortfolioManager.handle_buy_order`, for one order per row
+        is_buying = np.abs(self.buy_power[rows]) > ZERO_AMOUNT
+        rows, currencies = rows[is_buying], currencies[is_buying]
+        amounts, prices = amounts[is_buying], prices[is_buying]
+        if len(rows) == 0:
+            return
+        amounts = np.minimum(amounts, self.buy_power[rows])
+        self.buy_power[rows] -= amounts
+        self.traded_amounts[rows] += amounts
+        self.fees[rows] += amounts * self.transaction_fee
+        amounts = amounts * (1 - self.transaction_fee)
+        quantities = amounts / prices
+
+        self.make_room(rows)
+        lot_idxs = self.sizes[rows]
+        self.lot_currencies[rows, lot_idxs] = currencies
+        self.lot_quantities[rows, lot_idxs] = quantities
+        self.lot_costs[rows, lot_idxs] = amounts
+        self.lot_asset_prices[rows, lot_idxs] = prices
+        self.lot_limit_prices[rows, lot_idxs] = limit_prices[is_buying]
+        self.lot_highs[rows, lot_idxs] = prices
+        self.lot_ticks[rows, lot_idxs] = tick
+        self.sizes[rows] += 1
+        self.quantities[rows, currencies] += quantities
+        self.num_buy_trades[rows] += 1
+
+    def sell(
+        self,
+        rows: np.ndarray,
+        currencies: np.ndarray,
+        amounts: np.ndarray,
+        prices: np.ndarray,
+    ) -> None:
+        # As `PortfolioManager.handle_sell_order` and `PositionLedger.sell`,
+        # for one order per row, given the prices of every currency
+        if len(rows) == 0:
+            return
+        price = prices[currencies][:, None]
+        is_lot = self.lot_currencies[rows] == currencies[:, None]
+        quantities = np.where(is_lot, self.lot_quantities[rows], 0.0)
+        lot_amounts = quantities * price
+        cum_amounts = np.cumsum(lot_amounts, axis=1)
+        amounts = np.where(
+            is_lot.any(axis=1), np.minimum(amounts, cum_amounts[:, -1]), 0.0
+        )
+
+        # Lots up to the first that leaves nothing to sell
+        is_done = is_lot & (amounts[:, None] - cum_amounts <= ZERO_AMOUNT)
+        last_sold = np.where(
+            is_done.any(axis=1), is_done.argmax(axis=1), is_lot.shape[1]
+        )
+        is_sold = is_lot & (np.arange(is_lot.shape[1]) <= last_sold[:, None])
+        sell_amounts = np.where(
+            is_sold,
+            np.clip(amounts[:, None] - (cum_amounts - lot_amounts), 0.0, lot_amounts),
+            0.0,
+        )
+
+        sell_quantities = sell_amounts / price
+        left_quantities = quantities - sell_quantities
+        costs = self.lot_costs[rows]
+        left_costs = np.where(
+            is_sold,
+            costs
+            * np.divide(
+                left_quantities,
+                quantities,
+                out=np.zeros_like(quantities),
+                where=quantities != 0,
+            ),
+            costs,
+        )
+        self.lot_costs[rows] = left_costs
+        self.lot_quantities[rows] = np.where(
+            is_sold, left_quantities, self.lot_quantities[rows]
+        )
+        self.quantities[rows, currencies] -= sell_quantities.sum(axis=1)
+
+        sell_fees = sell_amounts * self.transaction_fee
+        pnls = sell_amounts - sell_fees - (costs - left_costs)
+        self.buy_power[rows] += sell_amounts.sum(axis=1) * (1 - self.transaction_fee)
+        num_sold = is_sold.sum(axis=1)
+        self.num_sells[rows] += num_sold
+        self.num_wins[rows] += (is_sold & (pnls > 0)).sum(axis=1)
+        self.traded_amounts[rows] += sell_amounts.sum(axis=1)
+        self.fees[rows] += sell_fees.sum(axis=1)
+        self.realized_pnls[rows] += np.where(is_sold, pnls, 0.0).sum(axis=1)
+        # The order counts once for every lot it sold from
+        self.num_sell_trades[rows] += num_sold
+        self.close_empty_lots(rows, prices)
+
+    def close_empty_lots(self, rows: np.ndarray, prices: np.ndarray) -> None:
+        currencies = self.lot_currencies[rows]
+        quantities = self.lot_quantities[rows]
+        is_closed = (currencies != CLOSED_LOT) & (
+            np.abs(quantities * np.append(prices, np.nan)[currencies]) <= ZERO_AMOUNT
+        )
+        if not is_closed.any():
+            return
+        self.lot_currencies[rows] = np.where(is_closed, CLOSED_LOT, currencies)
+        for currency in range(len(self.currency_codes)):
+            is_currency = currencies == currency
+            closed_quantities = np.where(is_closed & is_currency, quantities, 0.0).sum(
+                axis=1
+            )
+            # Rather than left with rounding errors once every lot is closed
+            is_left = (is_currency & ~is_closed).any(axis=1)
+            self.quantities[rows, currency] = np.where(
+                is_left, self.quantities[rows, currency] - closed_quantities, 0.0
+            )
+
+    def mark_to_market(self, prices: np.ndarray) -> None:
+        # Marks every portfolio at a run of ticks, given prices by currency
+        # and tick
+        positions_values = self.quantities @ prices
+        values = self.buy_power[:, None] + positions_values
+        start = 0
+        while start < prices.shape[1]:
+            stop = min(prices.shape[1], start + BATCH_MARK_TICKS - self.num_marked)
+            num_ticks = stop - start
+            self.marked_values[:, self.num_marked : self.num_marked + num_ticks] = (
+                values[:, start:stop]
+            )
+            self.marked_positions_values[
+                :, self.num_marked : self.num_marked + num_ticks
+            ] = positions_values[:, start:stop]
+            self.num_marked += num_ticks
+            if self.num_marked == BATCH_MARK_TICKS:
+                self.flush_marks()
+            start = stop
+
+    def flush_marks(self) -> None:
+        for row, metrics in enumerate(self.metrics):
+            metrics.update_many(
+                self.marked_values[row, : self.num_marked],
+                self.marked_positions_values[row, : self.num_marked],
+            )
+        self.num_marked = 0
+
+    def get_values(self, prices: np.ndarray) -> np.ndarray:
+        return self.buy_power + self.quantities @ prices
+
+    def get_holdings(self, row: int, timestamps: pd.Series) -> List[CryptoOrder]:
+        return [
+            CryptoOrder(
+                side="buy",
+                currency_code=self.currency_codes[self.lot_currencies[row, lot_idx]],
+                asset_price=self.lot_asset_prices[row, lot_idx],
+                amount=self.lot_costs[row, lot_idx],
+                limit_price=self.lot_limit_prices[row, lot_idx],
+                quantity=self.lot_quantities[row, lot_idx],
+                timestamp=timestamps.iloc[self.lot_ticks[row, lot_idx]],
+            )
+            for lot_idx in np.flatnonzero(self.lot_currencies[row] != CLOSED_LOT)
+        ]
+
+    def get_metrics(self, row: int) -> PerformanceMetrics:
+        self.flush_marks()
+        metrics = self.metrics[row]
+        metrics.traded_amount = float(self.traded_amounts[row])
+        metrics.fees = float(self.fees[row])
+        metrics.num_sells = int(self.num_sells[row])
+        metrics.num_wins = int(self.num_wins[row])
+        metrics.realized_pnl = float(self.realized_pnls[row])
+        return metrics.get_results()
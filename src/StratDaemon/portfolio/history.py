@@ -0,0 +1,203 @@
+import tempfile
+from datetime import datetime
+from typing import IO, Dict, Iterator, List, Tuple
+import numpy as np
+import pandas as pd
+from StratDaemon.models.crypto import CryptoOrder, Portfolio
+
+HISTORY_TAIL = 10_000  # Events kept in memory before older ones are spilled
+NO_CURRENCY = -1  # Currency index of events that change no position
+
+HISTORY_DTYPE = np.dtype(
+    [
+        ("timestamp", "datetime64[ns]"),
+        ("value", np.float64),
+        ("buy_power", np.float64),
+        ("currency", np.int32),
+        ("quantity", np.float64),  # Position of the currency after the event
+        ("price", np.float64),
+    ]
+)
+
+# Last position of each currency, as its quantity, price and time
+Positions = Dict[int, Tuple[float, float, np.datetime64]]
+
+
+class PortfolioHistory:
+    """
+    Value and buy power of a portfolio after each event, with the new
+    position of the currency the event traded, as records of a typed array.
+    Only the last `tail_size` events stay in memory: older ones are appended
+    to `spill_path`, or a temporary file. Indexing rebuilds snapshots from
+    the records, holding one order per currency at its last traded price,
+    except for snapshots appended whole, which keep their holdings.
+
+    The spill file is append-only output: a history starts empty and writes
+    after whatever the file already holds, so the records of earlier runs
+    are kept on disk but never loaded back.
+    """
+
+    def __init__(
+        self, tail_size: int = HISTORY_TAIL, spill_path: str | None = None
+    ) -> None:
+        assert tail_size > 1, "The tail must hold more than one event"
+        self.tail_size = tail_size
+        self.spill_path = spill_path
+        self.spill_file: IO[bytes] | None = None
+        self.spill_start = self.num_spilled = 0
+        # Positions as of the last spilled event
+        self.spilled_positions: Positions = {}
+        self.tail = np.zeros(tail_size, dtype=HISTORY_DTYPE)
+        self.tail_len = 0
+        self.currency_codes: List[str] = []
+        self.currency_idxs: Dict[str, int] = {}
+        self.snapshots: Dict[int, Portfolio] = {}
+
+    def __len__(self) -> int:
+        return self.num_spilled + self.tail_len
+
+    def get_currency_idx(self, currency_code: str) -> int:
+        if currency_code not in self.currency_idxs:
+            self.currency_idxs[currency_code] = len(self.currency_codes)
+            self.currency_codes.append(currency_code)
+        return self.currency_idxs[currency_code]
+
+    def record(
+        self,
+        timestamp: datetime,
+        value: float,
+        buy_power: float,
+        currency_code: str | None = None,
+        quantity: float = 0.0,
+        price: float = 0.0,
+    ) -> None:
+        if self.tail_len == self.tail_size:
+            self.spill()
+        self.tail[self.tail_len] = (
+            pd.Timestamp(timestamp).to_datetime64(),
+            value,
+            buy_power,
+            (
+                NO_CURRENCY
+                if currency_code is None
+                else self.get_currency_idx(currency_code)
+            ),
+            quantity,
+            price,
+        )
+        self.tail_len += 1
+
+    def append(self, portfolio: Portfolio) -> None:
+        self.record(portfolio.timestamp, portfolio.value, portfolio.buy_power)
+        self.snapshots[len(self) - 1] = portfolio
+
+    def spill(self) -> None:
+        # Moves the older half of the tail to the end of the spill file
+        if self.spill_file is None:
+            if self.spill_path is None:
+                self.spill_file = tempfile.TemporaryFile()
+            else:
+                self.spill_file = open(self.spill_path, "ab+")
+            self.spill_file.seek(0, 2)
+            self.spill_start = self.spill_file.tell()
+
+        num_spilled = self.tail_len // 2
+        spilled = self.tail[:num_spilled]
+        self.spill_file.seek(0, 2)
+        self.spill_file.write(spilled.tobytes())
+        self.spill_file.flush()
+        self.spilled_positions = self.get_positions(spilled, self.spilled_positions)
+
+        self.tail[: self.tail_len - num_spilled] = self.tail[
+            num_spilled : self.tail_len
+        ]
+        self.tail_len -= num_spilled
+        self.num_spilled += num_spilled
+
+    def get_records(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        stop = len(self) if stop is None else stop
+        tail = self.tail[
+            max(start - self.num_spilled, 0) : max(stop - self.num_spilled, 0)
+        ]
+        if start >= self.num_spilled:
+            return tail.copy()
+
+        self.spill_file.seek(self.spill_start + start * HISTORY_DTYPE.itemsize)
+        spilled = np.frombuffer(
+            self.spill_file.read(
+                (min(stop, self.num_spilled) - start) * HISTORY_DTYPE.itemsize
+            ),
+            dtype=HISTORY_DTYPE,
+        )
+        return np.concatenate([spilled, tail])
+
+    def get_positions(self, records: np.ndarray, positions: Positions) -> Positions:
+        # Positions after the records, starting from `positions`
+        traded = records[records["currency"] != NO_CURRENCY]
+        _, last_idxs = np.unique(traded["currency"][::-1], return_index=True)
+        positions = positions.copy()
+        for record in traded[len(traded) - 1 - last_idxs]:
+            positions[int(record["currency"])] = (
+                float(record["quantity"]),
+                float(record["price"]),
+                record["timestamp"],
+            )
+        return positions
+
+    def get_positions_before(self, idx: int) -> Positions:
+        if idx >= self.num_spilled:
+            return self.get_positions(
+                self.tail[: idx - self.num_spilled], self.spilled_positions
+            )
+        return self.get_positions(self.get_records(0, idx), {})
+
+    def to_portfolio(self, record: np.void, positions: Positions) -> Portfolio:
+        return Portfolio(
+            timestamp=pd.Timestamp(record["timestamp"]),
+            value=float(record["value"]),
+            buy_power=float(record["buy_power"]),
+            holdings=[
+                CryptoOrder(
+                    side="buy",
+                    currency_code=self.currency_codes[currency],
+                    asset_price=price,
+                    amount=quantity * price,
+                    limit_price=-1,
+                    quantity=quantity,
+                    timestamp=pd.Timestamp(timestamp),
+                )
+                for currency, (quantity, price, timestamp) in sorted(positions.items())
+                if quantity != 0
+            ],
+        )
+
+    def iter_snapshots(self, start: int, stop: int) -> Iterator[Portfolio]:
+        # Rebuilds the snapshots in one pass over their records
+        positions = self.get_positions_before(start)
+        for idx, record in enumerate(self.get_records(start, stop), start):
+            if record["currency"] != NO_CURRENCY:
+                positions[int(record["currency"])] = (
+                    float(record["quantity"]),
+                    float(record["price"]),
+                    record["timestamp"],
+                )
+            yield self.snapshots.get(idx) or self.to_portfolio(record, positions)
+
+    def __iter__(self) -> Iterator[Portfolio]:
+        return self.iter_snapshots(0, len(self))
+
+    def __getitem__(self, key: int | slice) -> Portfolio | List[Portfolio]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            assert step > 0, "Snapshots can only be sliced forwards"
+            snapshots = list(self.iter_snapshots(start, max(start, stop)))
+            return snapshots[::step]
+        idx = key + len(self) if key < 0 else key
+        if not 0 <= idx < len(self):
+            raise IndexError("Portfolio history index out of range")
+        return next(self.iter_snapshots(idx, idx + 1))
+
+    def close(self) -> None:
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
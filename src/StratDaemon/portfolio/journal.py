@@ -0,0 +1,151 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List
+import numpy as np
+import pandas as pd
+from pandera.typing import DataFrame
+from pydantic import BaseModel
+from StratDaemon.models.crypto import CryptoHistorical, CryptoOrder
+from StratDaemon.portfolio.portfolio_manager import PortfolioManager
+
+JOURNAL_SYNC_EVERY = 1  # Orders appended between syncs of the journal to disk
+JOURNAL_BUFFER_SIZE = 2**16  # Bytes of appended orders buffered in memory
+JOURNAL_SCAN_SIZE = 2**12  # Bytes read at a time looking for the last record
+
+
+class JournalRecord(BaseModel):
+    # An order as executed, with the prices of the tick it was processed at
+    order: CryptoOrder
+    prices: Dict[str, float]
+
+
+class OrderJournal:
+    """
+    Executed orders appended to a JSON-lines file, one record per line, so
+    each order costs one write however long the journal is. Appends are
+    buffered and synced to disk every `sync_every` orders, and a record cut
+    short by a crash is skipped when reading, and dropped before the next
+    append so that it starts on its own line. The file is only created by
+    the first append.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        sync_every: int = JOURNAL_SYNC_EVERY,
+        buffer_size: int = JOURNAL_BUFFER_SIZE,
+    ) -> None:
+        assert sync_every > 0, "The journal must be synced every few orders"
+        self.path = Path(path)
+        self.sync_every = sync_every
+        self.buffer_size = buffer_size
+        self.file: IO[str] | None = None
+        self.num_unsynced = 0
+
+    def append(self, order: CryptoOrder, cur_prices_dt: Dict[str, float]) -> None:
+        if self.file is None:
+            truncate_partial_record(self.path)
+            self.file = open(self.path, "a", buffering=self.buffer_size)
+        self.file.write(
+            JournalRecord(order=order, prices=cur_prices_dt).model_dump_json() + "\n"
+        )
+        self.num_unsynced += 1
+        if self.num_unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        if self.file is not None and self.num_unsynced > 0:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.num_unsynced = 0
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+def truncate_partial_record(path: Path) -> None:
+    # Cuts the file after its last complete record, scanning back from the end
+    if not path.exists():
+        return
+    with open(path, "rb+") as f:
+        pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            step = min(JOURNAL_SCAN_SIZE, pos)
+            f.seek(pos - step)
+            newline_idx = f.read(step).rfind(b"\n")
+            if newline_idx >= 0:
+                f.truncate(pos - step + newline_idx + 1)
+                return
+            pos -= step
+        f.truncate(0)
+
+
+def read_journal(
+    path: str | Path,
+    currency_codes: List[str] | None = None,
+    start_dt: datetime | None = None,
+    end_dt: datetime | None = None,
+) -> Iterator[JournalRecord]:
+    # Streams the records of the currencies, or of every currency, with
+    # orders from `start_dt` up to and including `end_dt`
+    selected = None if currency_codes is None else set(currency_codes)
+    start_dt = None if start_dt is None else pd.Timestamp(start_dt)
+    end_dt = None if end_dt is None else pd.Timestamp(end_dt)
+    with open(path, "r") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # Cut short by a crash while appending
+                break
+            record = json.loads(line)
+            order = record["order"]
+            if selected is not None and order["currency_code"] not in selected:
+                continue
+            if start_dt is not None or end_dt is not None:
+                timestamp = pd.Timestamp(order["timestamp"])
+                if (start_dt is not None and timestamp < start_dt) or (
+                    end_dt is not None and timestamp > end_dt
+                ):
+                    continue
+            yield JournalRecord.model_validate(record)
+
+
+def replay_orders(
+    portfolio_mgr: PortfolioManager,
+    records: Iterable[JournalRecord],
+    dt_dfs: Dict[str, DataFrame[CryptoHistorical]] | None = None,
+) -> None:
+    # Processes the orders again, as they were before being executed. Given
+    # the bars since, each lot's trailing high is raised by the bars after it
+    # was bought, as it was while trading.
+    dt_dfs = dt_dfs or {}
+    dt_bars = {
+        currency_code: (np.asarray(df["close"]), np.asarray(df["timestamp"]))
+        for currency_code, df in dt_dfs.items()
+    }
+
+    def observe_until(timestamp: datetime | None) -> None:
+        for currency_code, df in dt_dfs.items():
+            closes, timestamps = dt_bars[currency_code]
+            end = (
+                len(df)
+                if timestamp is None
+                else int(df["timestamp"].searchsorted(pd.Timestamp(timestamp), "right"))
+            )
+            if end > 0:
+                portfolio_mgr.observe_bars(
+                    currency_code, closes[:end], timestamps[:end]
+                )
+
+    for record in records:
+        order = record.order.model_copy()
+        observe_until(order.timestamp)
+        if order.side == "buy":
+            # Buys were executed for what was left after fees
+            order.amount /= 1 - portfolio_mgr.transaction_fee
+        portfolio_mgr.process_order_at(record.prices, order.timestamp, order)
+    observe_until(None)
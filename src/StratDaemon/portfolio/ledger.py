@@ -0,0 +1,245 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+import numpy as np
+from StratDaemon.models.crypto import CryptoOrder
+
+LEDGER_CAPACITY = 64  # Lots the arrays start with, doubled when full
+ZERO_AMOUNT = 1.0  # Amounts within this of zero count as nothing
+CLOSED_LOT = -1  # Currency index of lots sold or worth nothing
+
+
+class PositionLedger:
+    """
+    Open lots in the order they were bought, as arrays of their currency
+    index, quantity, cost, order prices and highest price since they were
+    bought, with each currency's total quantity and number of lots kept up
+    to date. Sells are filled first in, first out. Lots are only turned into
+    `CryptoOrder` holdings when asked for.
+    """
+
+    def __init__(
+        self, currency_codes: List[str], capacity: int = LEDGER_CAPACITY
+    ) -> None:
+        self.currency_codes: List[str] = []
+        self.currency_idxs: Dict[str, int] = {}
+        self.quantities = np.zeros(0)
+        self.num_lots = np.zeros(0, dtype=np.int64)
+        # Smallest lot of each currency, to tell when a lot may be worth
+        # nothing without looking at every lot
+        self.min_quantities = np.zeros(0)
+        for currency_code in currency_codes:
+            self.get_currency_idx(currency_code)
+
+        self.lot_currencies = np.zeros(capacity, dtype=np.int64)
+        self.lot_quantities = np.zeros(capacity)
+        self.lot_costs = np.zeros(capacity)
+        self.lot_asset_prices = np.zeros(capacity)
+        self.lot_limit_prices = np.zeros(capacity)
+        self.lot_highs = np.zeros(capacity)
+        self.lot_timestamps = np.empty(capacity, dtype=object)
+        self.size = self.num_closed = 0
+
+    def get_lot_arrays(self) -> List[np.ndarray]:
+        return [
+            self.lot_currencies,
+            self.lot_quantities,
+            self.lot_costs,
+            self.lot_asset_prices,
+            self.lot_limit_prices,
+            self.lot_highs,
+            self.lot_timestamps,
+        ]
+
+    def __len__(self) -> int:
+        return self.size - self.num_closed
+
+    def get_currency_idx(self, currency_code: str) -> int:
+        if currency_code not in self.currency_idxs:
+            self.currency_idxs[currency_code] = len(self.currency_codes)
+            self.currency_codes.append(currency_code)
+            self.quantities = np.append(self.quantities, 0.0)
+            self.num_lots = np.append(self.num_lots, 0)
+            self.min_quantities = np.append(self.min_quantities, np.inf)
+        return self.currency_idxs[currency_code]
+
+    def get_held_currency_codes(self) -> List[str]:
+        return [
+            currency_code
+            for currency_code, num_lots in zip(self.currency_codes, self.num_lots)
+            if num_lots > 0
+        ]
+
+    def get_prices(self, cur_prices_dt: Dict[str, float]) -> np.ndarray:
+        # Prices by currency index, which only held currencies need
+        return np.array(
+            [
+                cur_prices_dt[currency_code] if num_lots > 0 else 0.0
+                for currency_code, num_lots in zip(self.currency_codes, self.num_lots)
+            ]
+        )
+
+    def get_value(self, cur_prices_dt: Dict[str, float]) -> float:
+        return float(self.quantities @ self.get_prices(cur_prices_dt))
+
+    def add(
+        self,
+        currency_code: str,
+        quantity: float,
+        cost: float,
+        asset_price: float,
+        limit_price: float,
+        timestamp: datetime,
+    ) -> None:
+        if self.size == len(self.lot_currencies):
+            (
+                self.lot_currencies,
+                self.lot_quantities,
+                self.lot_costs,
+                self.lot_asset_prices,
+                self.lot_limit_prices,
+                self.lot_highs,
+                self.lot_timestamps,
+            ) = [
+                np.concatenate([values, np.zeros_like(values)])
+                for values in self.get_lot_arrays()
+            ]
+        idx = self.get_currency_idx(currency_code)
+        lot_idx = self.size
+        self.lot_currencies[lot_idx] = idx
+        self.lot_quantities[lot_idx] = quantity
+        self.lot_costs[lot_idx] = cost
+        self.lot_asset_prices[lot_idx] = asset_price
+        self.lot_limit_prices[lot_idx] = limit_price
+        self.lot_highs[lot_idx] = asset_price
+        self.lot_timestamps[lot_idx] = timestamp
+        self.size += 1
+        self.quantities[idx] += quantity
+        self.num_lots[idx] += 1
+        self.min_quantities[idx] = min(self.min_quantities[idx], quantity)
+
+    def add_order(self, order: CryptoOrder) -> None:
+        self.add(
+            order.currency_code,
+            order.quantity,
+            order.amount,
+            order.asset_price,
+            order.limit_price,
+            order.timestamp,
+        )
+
+    def raise_highs(self, currency_code: str, high: float) -> None:
+        lot_idxs = self.get_lot_idxs([currency_code])
+        self.lot_highs[lot_idxs] = np.maximum(self.lot_highs[lot_idxs], high)
+
+    def sell(
+        self, currency_code: str, amount: float, cur_prices_dt: Dict[str, float]
+    ) -> Tuple[float, np.ndarray, np.ndarray]:
+        # Sells up to `amount` of the currency from its oldest lots on, until
+        # what is left to sell is nothing. Returns the amount that could be
+        # sold, and the amount sold from each lot touched with the cost of
+        # what was sold of it, and closes every lot worth nothing afterwards.
+        idx = self.get_currency_idx(currency_code)
+        price = cur_prices_dt[currency_code]
+        all_lot_idxs = np.flatnonzero(self.lot_currencies[: self.size] == idx)
+        lot_idxs, quantities = all_lot_idxs, self.lot_quantities[all_lot_idxs]
+        lot_amounts = quantities * price
+        cum_amounts = np.cumsum(lot_amounts)
+        amount = min(amount, float(cum_amounts[-1])) if len(lot_idxs) > 0 else 0.0
+
+        # What is left to sell after each lot, stopping at the first lot
+        # that leaves nothing
+        is_done = amount - cum_amounts <= ZERO_AMOUNT
+        num_sold = int(is_done.argmax()) + 1 if is_done.any() else len(lot_idxs)
+        lot_idxs, quantities = lot_idxs[:num_sold], quantities[:num_sold]
+        sell_amounts = np.clip(
+            amount - (cum_amounts - lot_amounts)[:num_sold],
+            0.0,
+            lot_amounts[:num_sold],
+        )
+
+        sell_quantities = sell_amounts / price
+        left_quantities = quantities - sell_quantities
+        # Cost basis goes down with the quantity left
+        costs = self.lot_costs[lot_idxs]
+        self.lot_costs[lot_idxs] *= np.divide(
+            left_quantities,
+            quantities,
+            out=np.zeros(num_sold),
+            where=quantities != 0,
+        )
+        self.lot_quantities[lot_idxs] = left_quantities
+        self.quantities[idx] -= sell_quantities.sum()
+        if len(all_lot_idxs) > 0:
+            self.min_quantities[idx] = self.lot_quantities[all_lot_idxs].min()
+        self.close_empty_lots(cur_prices_dt)
+        return amount, sell_amounts, costs - self.lot_costs[lot_idxs]
+
+    def close_empty_lots(self, cur_prices_dt: Dict[str, float]) -> None:
+        # Only currencies whose smallest lot is worth nothing have lots to
+        # close
+        prices = self.get_prices(cur_prices_dt)
+        held_idxs = np.flatnonzero(self.num_lots > 0)
+        min_values = self.min_quantities[held_idxs] * prices[held_idxs]
+        for idx in held_idxs[np.abs(min_values) <= ZERO_AMOUNT]:
+            self.close_currency_lots(idx, prices[idx])
+
+        # Closed lots are left in place until they make up half the arrays
+        if 2 * self.num_closed > self.size:
+            is_open = self.lot_currencies[: self.size] != CLOSED_LOT
+            size = int(is_open.sum())
+            for values in self.get_lot_arrays():
+                values[:size] = values[: self.size][is_open]
+            self.lot_timestamps[size : self.size] = None
+            self.size, self.num_closed = size, 0
+
+    def close_currency_lots(self, idx: int, price: float) -> None:
+        lot_idxs = np.flatnonzero(self.lot_currencies[: self.size] == idx)
+        quantities = self.lot_quantities[lot_idxs]
+        is_closed = np.abs(quantities * price) <= ZERO_AMOUNT
+        closed_idxs = lot_idxs[is_closed]
+        self.lot_currencies[closed_idxs] = CLOSED_LOT
+        self.lot_timestamps[closed_idxs] = None
+        self.num_closed += len(closed_idxs)
+
+        self.num_lots[idx] -= len(closed_idxs)
+        if self.num_lots[idx] == 0:
+            # Rather than left with rounding errors
+            self.quantities[idx], self.min_quantities[idx] = 0.0, np.inf
+        else:
+            self.quantities[idx] -= quantities[is_closed].sum()
+            self.min_quantities[idx] = quantities[~is_closed].min()
+
+    def get_lot_idxs(self, currency_codes: List[str] | None = None) -> np.ndarray:
+        # Open lots of the currencies, or of every currency, in order. Closed
+        # lots index the extra last entry, which is never selected.
+        is_selected = np.zeros(len(self.currency_codes) + 1, dtype=bool)
+        if currency_codes is None:
+            is_selected[:-1] = True
+        else:
+            is_selected[[self.currency_idxs[code] for code in currency_codes]] = True
+        return np.flatnonzero(is_selected[self.lot_currencies[: self.size]])
+
+    def get_first_lot_dts(self) -> Dict[str, datetime]:
+        # When the oldest open lot of each held currency was bought
+        lot_idxs = self.get_lot_idxs()
+        _, first_idxs = np.unique(self.lot_currencies[lot_idxs], return_index=True)
+        return {
+            self.currency_codes[self.lot_currencies[lot_idx]]: self.lot_timestamps[
+                lot_idx
+            ]
+            for lot_idx in lot_idxs[first_idxs]
+        }
+
+    def to_order(self, lot_idx: int) -> CryptoOrder:
+        return CryptoOrder(
+            side="buy",
+            currency_code=self.currency_codes[self.lot_currencies[lot_idx]],
+            asset_price=self.lot_asset_prices[lot_idx],
+            amount=self.lot_costs[lot_idx],
+            limit_price=self.lot_limit_prices[lot_idx],
+            quantity=self.lot_quantities[lot_idx],
+            timestamp=self.lot_timestamps[lot_idx],
+        )
+
+    def to_holdings(self) -> List[CryptoOrder]:
+        return [self.to_order(lot_idx) for lot_idx in self.get_lot_idxs()]
@@ -0,0 +1,154 @@
+from math import sqrt
+import numpy as np
+from pydantic import BaseModel
+
+# Metrics that are better lower, which tuning minimizes
+MINIMIZED_METRICS = ("max_drawdown", "return_std", "turnover", "fees")
+
+
+class PerformanceMetrics(BaseModel):
+    num_ticks: int = 0
+    total_return: float = 0.0
+    max_drawdown: float = 0.0
+    # Of the returns between consecutive ticks
+    mean_return: float = 0.0
+    return_std: float = 0.0
+    sharpe_ratio: float = 0.0
+    sortino_ratio: float = 0.0
+    # Fraction of ticks with any position, and mean fraction of the value held
+    time_in_market: float = 0.0
+    mean_exposure: float = 0.0
+    # Amount traded per unit of mean portfolio value
+    turnover: float = 0.0
+    fees: float = 0.0
+    # Of the lot sales, against what was paid for the lots
+    win_rate: float = 0.0
+    realized_pnl: float = 0.0
+
+
+class MetricsAccumulator:
+    """
+    Performance of a portfolio kept up to date on every mark-to-market tick
+    and trade in constant memory: the drawdown from the running peak, the
+    mean and squared deviations of tick returns (merged with Chan's update
+    for batches of ticks), time in market, exposure and trade statistics.
+    """
+
+    def __init__(self) -> None:
+        self.num_ticks = 0
+        self.first_value = self.last_value = self.peak_value = 0.0
+        self.value_sum = self.max_drawdown = 0.0
+        self.num_returns = 0
+        self.mean_return = self.m2_return = self.downside_m2 = 0.0
+        self.num_in_market = 0
+        self.exposure_sum = 0.0
+        self.traded_amount = self.fees = 0.0
+        self.num_sells = self.num_wins = 0
+        self.realized_pnl = 0.0
+
+    def update(self, value: float, positions_value: float) -> None:
+        if self.num_ticks == 0:
+            self.first_value = self.last_value = self.peak_value = value
+        else:
+            # Ratios to a zero value count as none, as in `get_results`
+            ret = value / self.last_value - 1 if self.last_value else 0.0
+            self.num_returns += 1
+            delta = ret - self.mean_return
+            self.mean_return += delta / self.num_returns
+            self.m2_return += delta * (ret - self.mean_return)
+            self.downside_m2 += min(ret, 0.0) ** 2
+            self.last_value = value
+            self.peak_value = max(self.peak_value, value)
+            if self.peak_value:
+                self.max_drawdown = max(self.max_drawdown, 1 - value / self.peak_value)
+        self.num_ticks += 1
+        self.value_sum += value
+        self.num_in_market += positions_value > 0
+        self.exposure_sum += positions_value / value if value else 0.0
+
+    def update_many(self, values: np.ndarray, positions_values: np.ndarray) -> None:
+        # Same as calling `update` on each tick
+        if len(values) == 0:
+            return
+        if self.num_ticks == 0:
+            self.first_value = self.last_value = self.peak_value = float(values[0])
+        last_values = np.append(self.last_value, values[:-1])
+        # Ratios to a zero value count as none, as in `update`
+        returns = np.divide(
+            values, last_values, out=np.ones(len(values)), where=last_values != 0
+        )
+        returns -= 1
+        if self.num_ticks == 0:
+            # The first tick has no return
+            returns = returns[1:]
+        if len(returns) > 0:
+            num_returns = self.num_returns + len(returns)
+            mean_return = float(returns.mean())
+            delta = mean_return - self.mean_return
+            self.m2_return += float(((returns - mean_return) ** 2).sum()) + (
+                delta**2 * self.num_returns * len(returns) / num_returns
+            )
+            self.mean_return += delta * len(returns) / num_returns
+            self.num_returns = num_returns
+            self.downside_m2 += float((np.minimum(returns, 0.0) ** 2).sum())
+
+        peak_values = np.maximum.accumulate(np.maximum(values, self.peak_value))
+        drawdowns = 1 - np.divide(
+            values, peak_values, out=np.ones(len(values)), where=peak_values != 0
+        )
+        self.max_drawdown = max(self.max_drawdown, float(drawdowns.max()))
+        self.peak_value = float(peak_values[-1])
+        self.last_value = float(values[-1])
+        self.num_ticks += len(values)
+        self.value_sum += float(values.sum())
+        self.num_in_market += int((positions_values > 0).sum())
+        exposures = np.divide(
+            positions_values, values, out=np.zeros(len(values)), where=values != 0
+        )
+        self.exposure_sum += float(exposures.sum())
+
+    def add_buy(self, amount: float, fee: float) -> None:
+        self.traded_amount += amount
+        self.fees += fee
+
+    def add_sells(
+        self, amounts: np.ndarray, fees: np.ndarray, costs: np.ndarray
+    ) -> None:
+        # Lot sales, with what was paid for the part of each lot sold
+        pnls = amounts - fees - costs
+        self.num_sells += len(amounts)
+        self.num_wins += int((pnls > 0).sum())
+        self.traded_amount += float(amounts.sum())
+        self.fees += float(fees.sum())
+        self.realized_pnl += float(pnls.sum())
+
+    def get_results(self) -> PerformanceMetrics:
+        return_std = (
+            sqrt(self.m2_return / (self.num_returns - 1))
+            if self.num_returns > 1
+            else 0.0
+        )
+        downside_std = (
+            sqrt(self.downside_m2 / self.num_returns) if self.num_returns > 0 else 0.0
+        )
+        num_ticks = max(self.num_ticks, 1)
+        mean_value = self.value_sum / num_ticks
+        return PerformanceMetrics(
+            num_ticks=self.num_ticks,
+            total_return=(
+                self.last_value / self.first_value - 1 if self.first_value else 0.0
+            ),
+            max_drawdown=self.max_drawdown,
+            mean_return=self.mean_return,
+            return_std=return_std,
+            sharpe_ratio=self.mean_return / return_std if return_std > 0 else 0.0,
+            sortino_ratio=(
+                self.mean_return / downside_std if downside_std > 0 else 0.0
+            ),
+            time_in_market=self.num_in_market / num_ticks,
+            mean_exposure=self.exposure_sum / num_ticks,
+            turnover=self.traded_amount / mean_value if mean_value else 0.0,
+            fees=self.fees,
+            win_rate=self.num_wins / self.num_sells if self.num_sells else 0.0,
+            realized_pnl=self.realized_pnl,
+        )
@@ -1,12 +1,18 @@
-from collections import defaultdict
 from math import isclose
-from typing import Dict, List, Tuple
+from typing import Dict, List
 from pandera.typing import DataFrame
 from datetime import datetime
+import numpy as np
 import pandas as pd
 
-from StratDaemon.models.crypto import CryptoHistorical, CryptoOrder, Portfolio
+from StratDaemon.models.crypto import CryptoHistorical, CryptoOrder
+from StratDaemon.portfolio.history import HISTORY_TAIL, PortfolioHistory
+from StratDaemon.portfolio.ledger import ZERO_AMOUNT, PositionLedger
+from StratDaemon.portfolio.metrics import MetricsAccumulator
 from StratDaemon.utils.constants import TRAILING_STOP_LOSS, TRAILING_TAKE_PROFIT
+from StratDaemon.utils.windows import WindowFrame
+
+EXIT_SCAN_TICKS = 64  # Ticks looked at first when scanning for the next exit
 
 
 class PortfolioManager:
@@ -17,6 +23,8 @@ class PortfolioManager:
         trailing_stop_loss: float = TRAILING_STOP_LOSS,
         trailing_take_profit: float = TRAILING_TAKE_PROFIT,
         initial_timestamp: datetime | None = None,
+        history_tail: int = HISTORY_TAIL,
+        history_path: str | None = None,
     ):
         self.initial_buy_power = buy_power
         self.transaction_fee = 0.01
@@ -24,163 +32,234 @@ class PortfolioManager:
         self.trailing_take_profit = trailing_take_profit
         self.currency_codes = currency_codes
         self.num_buy_trades = self.num_sell_trades = 0
-        self.portfolio_hist = [
-            Portfolio(
-                value=buy_power,
-                buy_power=buy_power,
-                timestamp=initial_timestamp or datetime.now(),
-            )
-        ]
+        self.buy_power = buy_power
+        self.ledger = PositionLedger(currency_codes)
+        # Time of the last bar of each currency the lot highs were raised by
+        self.last_bar_dts: Dict[str, np.datetime64] = {}
+        self.metrics = MetricsAccumulator()
+        self.portfolio_hist = PortfolioHistory(history_tail, history_path)
+        self.portfolio_hist.record(
+            initial_timestamp or datetime.now(), buy_power, buy_power
+        )
 
     def get_cur_prices_dt(
-        self, dt_dfs: Dict[str, DataFrame[CryptoHistorical]]
+        self, dt_dfs: Dict[str, DataFrame[CryptoHistorical] | WindowFrame]
     ) -> Dict[str, float]:
         return {
-            currency_code: dt_dfs[currency_code].iloc[-1].close
+            currency_code: np.asarray(dt_dfs[currency_code]["close"])[-1]
             for currency_code in self.currency_codes
         }
 
     def get_lst_timestamp(
-        self, dt_dfs: Dict[str, DataFrame[CryptoHistorical]]
+        self, dt_dfs: Dict[str, DataFrame[CryptoHistorical] | WindowFrame]
     ) -> datetime:
-        return dt_dfs[next(iter(dt_dfs))].iloc[-1].timestamp
+        return pd.Timestamp(np.asarray(dt_dfs[next(iter(dt_dfs))]["timestamp"])[-1])
+
+    def get_new_bar_idx(self, currency_code: str, timestamps: np.ndarray) -> int:
+        if currency_code not in self.last_bar_dts:
+            return 0
+        return int(
+            np.searchsorted(timestamps, self.last_bar_dts[currency_code], "right")
+        )
+
+    def observe_bars(
+        self, currency_code: str, closes: np.ndarray, timestamps: np.ndarray
+    ) -> None:
+        # Raises the highs of the currency's lots by the bars after the last
+        # one seen, so each bar is only looked at once
+        start = self.get_new_bar_idx(currency_code, timestamps)
+        if (
+            start < len(closes)
+            and self.ledger.num_lots[self.ledger.get_currency_idx(currency_code)]
+        ):
+            self.ledger.raise_highs(currency_code, float(closes[start:].max()))
+        self.last_bar_dts[currency_code] = timestamps[-1]
+
+    def get_stopped_lot_idxs(self, cur_prices_dt: Dict[str, float]) -> np.ndarray:
+        # Lots whose price fell the trailing stop loss below, or rose the
+        # trailing take profit above, their high since they were bought
+        ledger = self.ledger
+        lot_idxs = ledger.get_lot_idxs()
+        prices = ledger.get_prices(cur_prices_dt)[ledger.lot_currencies[lot_idxs]]
+        highs = ledger.lot_highs[lot_idxs]
+        is_stopped = (prices < highs * (1 - self.trailing_stop_loss)) | (
+            prices > highs * (1 + self.trailing_take_profit)
+        )
+        return lot_idxs[is_stopped]
 
-    def compute_exit_signal(self, df: DataFrame[CryptoHistorical]) -> bool:
-        df["highest"] = df["close"].cummax()
-        df["trailingstop"] = df["highest"] * (1 - self.trailing_stop_loss)
-        df["trailingtakeprofit"] = df["highest"] * (1 + self.trailing_take_profit)
-        df["exit_signal"] = df["close"] < df["trailingstop"]
-        df["exit_signal"] |= df["close"] > df["trailingtakeprofit"]
-        return df["exit_signal"].iloc[-1]
+    def get_exit_tick(
+        self,
+        currency_code: str,
+        closes: np.ndarray,
+        seen_closes: np.ndarray,
+        timestamps: np.ndarray,
+        ends: np.ndarray,
+        tick: int,
+    ) -> int:
+        # First tick from `tick` on at which a lot of the currency is stopped
+        # out as long as its lots stay the same, or `len(ends)`. `seen_closes`
+        # has -inf at bars no window covers. Lots bought earlier have the
+        # higher highs, so the oldest lot hits the stop loss first and the
+        # newest the take profit.
+        lot_idxs = self.ledger.get_lot_idxs([currency_code])
+        if len(lot_idxs) == 0:
+            return len(ends)
+        highs = self.ledger.lot_highs[lot_idxs]
+        oldest_high, newest_high = highs.max(), highs.min()
+        start = self.get_new_bar_idx(currency_code, timestamps)
+
+        # Scans ticks in blocks that double in size
+        num_ticks = EXIT_SCAN_TICKS
+        while tick < len(ends):
+            stop = min(tick + num_ticks, len(ends))
+            running_highs = np.maximum.accumulate(
+                seen_closes[start : ends[stop - 1] + 1]
+            )
+            tick_highs = running_highs[ends[tick:stop] - start]
+            tick_closes = closes[ends[tick:stop]]
+            is_exit = (
+                tick_closes
+                < np.maximum(oldest_high, tick_highs) * (1 - self.trailing_stop_loss)
+            ) | (
+                tick_closes
+                > np.maximum(newest_high, tick_highs) * (1 + self.trailing_take_profit)
+            )
+            if is_exit.any():
+                return tick + int(is_exit.argmax())
+            oldest_high = max(oldest_high, running_highs[-1])
+            newest_high = max(newest_high, running_highs[-1])
+            start, tick = ends[stop - 1] + 1, stop
+            num_ticks *= 2
+        return len(ends)
 
     def check_stop_loss(
-        self, dt_dfs: Dict[str, DataFrame[CryptoHistorical]]
+        self, dt_dfs: Dict[str, DataFrame[CryptoHistorical] | WindowFrame]
     ) -> List[CryptoOrder]:
-        prev_portfolio = self.portfolio_hist[-1]
+        for currency_code in self.currency_codes:
+            df = dt_dfs[currency_code]
+            self.observe_bars(
+                currency_code, np.asarray(df["close"]), np.asarray(df["timestamp"])
+            )
         cur_prices_dt = self.get_cur_prices_dt(dt_dfs)
-        new_sell_orders = []
+        return self.create_stop_loss_orders(
+            self.get_stopped_lot_idxs(cur_prices_dt),
+            cur_prices_dt,
+            self.get_lst_timestamp(dt_dfs),
+        )
 
-        for holding in prev_portfolio.holdings:
-            currency_code = holding.currency_code
-            df = dt_dfs[currency_code]
-            if self.compute_exit_signal(df):
-                cur_price = cur_prices_dt[currency_code]
-                order = CryptoOrder(
+    def create_stop_loss_orders(
+        self,
+        lot_idxs: np.ndarray,
+        cur_prices_dt: Dict[str, float],
+        timestamp: datetime,
+    ) -> List[CryptoOrder]:
+        # One order per lot, which sells it as long as the lots of its
+        # currency bought before it are sold first
+        ledger = self.ledger
+        new_sell_orders = []
+        for currency, quantity in zip(
+            ledger.lot_currencies[lot_idxs].tolist(),
+            ledger.lot_quantities[lot_idxs].tolist(),
+        ):
+            currency_code = ledger.currency_codes[currency]
+            cur_price = cur_prices_dt[currency_code]
+            new_sell_orders.append(
+                CryptoOrder(
                     currency_code=currency_code,
                     side="sell",
-                    amount=cur_price * holding.quantity,
+                    amount=cur_price * quantity,
                     asset_price=cur_price,
-                    quantity=holding.quantity,
-                    timestamp=self.get_lst_timestamp(dt_dfs),
+                    quantity=quantity,
+                    timestamp=timestamp,
                     limit_price=-1,
                 )
-                new_sell_orders.append(order)
-
+            )
         return new_sell_orders
 
     def process_order(
         self,
-        dt_dfs: Dict[str, DataFrame[CryptoHistorical]],
+        dt_dfs: Dict[str, DataFrame[CryptoHistorical] | WindowFrame],
         order: CryptoOrder,
     ) -> List[CryptoOrder]:
-        prev_portfolio = self.portfolio_hist[-1]
-
-        cur_prices_dt = self.get_cur_prices_dt(dt_dfs)
-        cur_portfolio = Portfolio(
-            value=prev_portfolio.value,
-            buy_power=prev_portfolio.buy_power,
-            timestamp=self.get_lst_timestamp(dt_dfs),
+        return self.process_order_at(
+            self.get_cur_prices_dt(dt_dfs), self.get_lst_timestamp(dt_dfs), order
         )
-        cur_holdings, executed_orders = getattr(self, f"handle_{order.side}_order")(
-            cur_prices_dt, order, prev_portfolio, cur_portfolio
-        )
-        cur_portfolio.holdings = cur_holdings
 
-        cur_portfolio.value = self.calculate_portfolio_value(
-            cur_portfolio, cur_prices_dt
-        )
-        self.portfolio_hist.append(cur_portfolio)
-        return executed_orders
-
-    def calculate_portfolio_value(
-        self, portfolio: Portfolio, cur_prices_dt: Dict[str, float]
-    ) -> float:
-        holdings_value = portfolio.buy_power + sum(
-            holding.quantity * cur_prices_dt[holding.currency_code]
-            for holding in portfolio.holdings
-        )
-        return holdings_value
-
-    def handle_buy_order(
+    def process_order_at(
         self,
-        _: float,
+        cur_prices_dt: Dict[str, float],
+        timestamp: datetime,
         order: CryptoOrder,
-        prev_portfolio: Portfolio,
-        cur_portfolio: Portfolio,
-    ) -> Tuple[List[CryptoOrder], List[CryptoOrder]]:
-        cur_holdings = prev_portfolio.holdings
-        executed_orders = []
+    ) -> List[CryptoOrder]:
+        executed_orders = getattr(self, f"handle_{order.side}_order")(
+            cur_prices_dt, order
+        )
+        currency_code = order.currency_code
+        self.portfolio_hist.record(
+            timestamp,
+            self.calculate_portfolio_value(cur_prices_dt),
+            self.buy_power,
+            currency_code,
+            self.ledger.quantities[self.ledger.get_currency_idx(currency_code)],
+            cur_prices_dt[currency_code],
+        )
+        return executed_orders
 
-        if not self.is_zero(cur_portfolio.buy_power):
-            order.amount = min(order.amount, cur_portfolio.buy_power)
-            cur_portfolio.buy_power -= order.amount
+    def get_holdings(self) -> List[CryptoOrder]:
+        return self.ledger.to_holdings()
 
-            order.amount = order.amount * (1 - self.transaction_fee)
-            order.quantity = order.amount / order.asset_price
+    def add_holdings(self, holdings: List[CryptoOrder]) -> None:
+        for holding in holdings:
+            self.ledger.add_order(holding)
 
-            executed_orders.append(order)
-            cur_holdings.append(order)
-            self.num_buy_trades += 1
+    def calculate_portfolio_value(self, cur_prices_dt: Dict[str, float]) -> float:
+        return self.buy_power + self.ledger.get_value(cur_prices_dt)
 
-        return cur_holdings, executed_orders
+    def mark_to_market(self, cur_prices_dt: Dict[str, float]) -> None:
+        positions_value = self.ledger.get_value(cur_prices_dt)
+        self.metrics.update(self.buy_power + positions_value, positions_value)
 
-    def handle_sell_order(
-        self,
-        cur_prices_dt: Dict[str, float],
-        order: CryptoOrder,
-        prev_portfolio: Portfolio,
-        cur_portfolio: Portfolio,
-    ) -> Tuple[List[CryptoOrder], List[CryptoOrder]]:
-        cur_holdings = prev_portfolio.holdings
-        currency_code = order.currency_code
-        executed_orders = []
-
-        # This also updates the amount of each holding
-        total_holdings_amt = self.get_total_holdings_amt(cur_prices_dt, cur_holdings)
-        order.amount = min(order.amount, sum(total_holdings_amt[currency_code]))
-        original_order_amount = order.amount
-
-        for holding in cur_holdings:
-            if holding.currency_code != order.currency_code:
-                continue
+    def mark_to_market_many(self, dt_prices: Dict[str, np.ndarray]) -> None:
+        # Marks a run of ticks without trades, given each currency's prices
+        ledger = self.ledger
+        num_ticks = len(next(iter(dt_prices.values())))
+        positions_values = np.zeros(num_ticks)
+        for idx in np.flatnonzero(ledger.num_lots > 0):
+            positions_values += (
+                ledger.quantities[idx] * dt_prices[ledger.currency_codes[idx]]
+            )
+        self.metrics.update_many(self.buy_power + positions_values, positions_values)
 
-            sell_amount = min(holding.amount, order.amount)
-            holding.amount -= sell_amount
-            order.amount -= sell_amount
-            holding.quantity -= sell_amount / cur_prices_dt[currency_code]
-            cur_portfolio.buy_power += sell_amount * (1 - self.transaction_fee)
+    def handle_buy_order(
+        self, _: Dict[str, float], order: CryptoOrder
+    ) -> List[CryptoOrder]:
+        if self.is_zero(self.buy_power):
+            return []
 
-            executed_orders.append(order)
-            self.num_sell_trades += 1
+        order.amount = min(order.amount, self.buy_power)
+        self.buy_power -= order.amount
+        self.metrics.add_buy(order.amount, order.amount * self.transaction_fee)
 
-            if self.is_zero(order.amount):
-                break
+        order.amount = order.amount * (1 - self.transaction_fee)
+        order.quantity = order.amount / order.asset_price
 
-        order.amount = original_order_amount
+        self.ledger.add_order(order)
+        self.num_buy_trades += 1
+        return [order]
 
-        return [
-            holding for holding in cur_holdings if not self.is_zero(holding.amount)
-        ], executed_orders
+    def handle_sell_order(
+        self, cur_prices_dt: Dict[str, float], order: CryptoOrder
+    ) -> List[CryptoOrder]:
+        order.amount, sell_amounts, sell_costs = self.ledger.sell(
+            order.currency_code, order.amount, cur_prices_dt
+        )
+        self.buy_power += float(sell_amounts.sum()) * (1 - self.transaction_fee)
+        self.metrics.add_sells(
+            sell_amounts, sell_amounts * self.transaction_fee, sell_costs
+        )
+        # The order counts once for every lot it sold from
+        self.num_sell_trades += len(sell_amounts)
+        return [order] * len(sell_amounts)
 
     def is_zero(self, num: float) -> bool:
-        return isclose(num, 0, abs_tol=1)
-
-    def get_total_holdings_amt(
-        self, cur_prices_dt: Dict[str, float], holdings: List[CryptoOrder]
-    ) -> Dict[str, List[float]]:
-        total_holdings = defaultdict(list)
-        for holding in holdings:
-            currency_code = holding.currency_code
-            holding.amount = holding.quantity * cur_prices_dt[currency_code]
-            total_holdings[currency_code].append(holding.amount)
-        return total_holdings
+        return isclose(num, 0, abs_tol=ZERO_AMOUNT)
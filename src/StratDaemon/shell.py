@@ -20,6 +20,9 @@ def start(
     strategy: Annotated[str, typer.Option("--strategy", "-s")] = "rsi",
     path_to_orders: Annotated[str, typer.Option("--path-to-orders", "-pto")] = None,
     path_to_holdings: Annotated[str, typer.Option("--path-to-holdings", "-pth")] = None,
+    path_to_positions: Annotated[
+        str, typer.Option("--path-to-positions", "-ptp")
+    ] = None,
     integration: Annotated[str, typer.Option("--integration", "-i")] = "robinhood",
     path_to_currency_codes: Annotated[
         str, typer.Option("--path-to-currency-codes", "-ptc")
@@ -31,6 +34,8 @@ def start(
         float, typer.Option("--max-amount-per-order", "-mapo")
     ] = 0.0,
     paper_trade: Annotated[bool, typer.Option("--paper-trade", "-p")] = False,
+    incremental: Annotated[bool, typer.Option("--incremental", "-inc")] = False,
+    path_to_history: Annotated[str, typer.Option("--path-to-history", "-pthi")] = None,
 ):
     match integration:
         case "robinhood":
@@ -63,6 +68,8 @@ def start(
         auto_generate_orders,
         max_amount_per_order,
         paper_trade,
+        incremental=incremental,
+        history_path=path_to_history,
     )
 
     if path_to_holdings is not None:
@@ -73,6 +80,11 @@ def start(
         for holding in holdings:
             strat.holdings[holding["currency_code"]] = holding["amount"]
 
+    if path_to_positions is not None:
+        if not os.path.exists(path_to_positions):
+            raise typer.Exit(f"Path to positions does not exist: {path_to_positions}")
+        strat.restore_positions(path_to_positions)
+
     if path_to_orders is not None:
         if not os.path.exists(path_to_orders):
             raise typer.Exit(f"Path to orders does not exist: {path_to_orders}")
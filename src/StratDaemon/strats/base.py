@@ -1,11 +1,13 @@
-import json
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Tuple
 from StratDaemon.integration.broker.base import BaseBroker
 from StratDaemon.integration.notification.base import BaseNotification
 from StratDaemon.models.crypto import CryptoHistorical, CryptoLimitOrder, CryptoOrder
-from pandera.typing import DataFrame, Series
+from pandera.typing import DataFrame
+import numpy as np
+import pandas as pd
 from devtools import pprint
+from StratDaemon.portfolio.journal import OrderJournal, read_journal, replay_orders
 from StratDaemon.portfolio.portfolio_manager import PortfolioManager
 from StratDaemon.utils.constants import (
     BUY_POWER,
@@ -18,6 +20,7 @@ from StratDaemon.utils.constants import (
 from collections import defaultdict
 from uuid import uuid4
 from StratDaemon.utils.funcs import print_dt
+from StratDaemon.utils.windows import WindowFrame, get_last_row
 
 
 class BaseStrategy:
@@ -34,6 +37,8 @@ class BaseStrategy:
         trailing_stop_loss: float = TRAILING_STOP_LOSS,
         trailing_take_profit: float = TRAILING_TAKE_PROFIT,
         max_holding_per_currency: float = MAX_HOLDING_PER_CURRENCY,
+        incremental: bool = False,
+        history_path: str | None = None,
     ) -> None:
         self.name = name
         self.broker = broker
@@ -45,9 +50,17 @@ class BaseStrategy:
         self.paper_trade = paper_trade
         self.max_holding_per_currency = max_holding_per_currency
         self.portfolio_mgr = PortfolioManager(
-            currency_codes, buy_power, trailing_stop_loss, trailing_take_profit
+            currency_codes,
+            buy_power,
+            trailing_stop_loss,
+            trailing_take_profit,
+            history_path=history_path,
         )
-        self.path_to_positions = Path(f"{self.name}_{uuid4()}.json")
+        self.path_to_positions = Path(f"{self.name}_{uuid4()}.jsonl")
+        self.order_journal = OrderJournal(self.path_to_positions)
+        self.incremental = incremental
+        self.prev_dt_dfs: Dict[str, DataFrame[CryptoHistorical] | WindowFrame] = {}
+        self.indicator_states: Dict[str, Any] = {}
 
     def init(self) -> None:
         if self.paper_trade:
@@ -68,8 +81,11 @@ class BaseStrategy:
         self.limit_orders.append(order)
 
     def construct_dt_dfs(
-        self, dt_dfs_input: Dict[str, DataFrame[CryptoHistorical]] | None
-    ) -> Dict[str, DataFrame[CryptoHistorical]]:
+        self,
+        dt_dfs_input: Dict[str, DataFrame[CryptoHistorical] | WindowFrame] | None,
+    ) -> Dict[str, DataFrame[CryptoHistorical] | WindowFrame]:
+        # Windows are read as they are, with their indicators alongside, and
+        # columns are read by position, so frames need no 0-based index
         currency_codes = {order.currency_code for order in self.limit_orders}
         currency_codes.update(self.currency_codes)
         dt_dfs = dict()
@@ -80,15 +96,67 @@ class BaseStrategy:
                 df = self.broker.get_crypto_historical(
                     currency_code, RH_HISTORICAL_INTERVAL, RH_HISTORICAL_SPAN
                 )
-            df = self.transform_df(df)
-            df = df.reset_index(drop=True)
+            df = (
+                self.transform_df_incremental(currency_code, df)
+                if self.incremental
+                else self.transform_df(df)
+            )
             dt_dfs[currency_code] = df
         return dt_dfs
 
+    def get_num_new_bars(
+        self,
+        prev_df: DataFrame[CryptoHistorical] | WindowFrame | None,
+        df: DataFrame[CryptoHistorical] | WindowFrame,
+    ) -> int | None:
+        if prev_df is None or len(prev_df) != len(df):
+            return None
+
+        prev_timestamps = np.asarray(prev_df["timestamp"])
+        timestamps = np.asarray(df["timestamp"])
+        num_new_bars = int(np.searchsorted(prev_timestamps, timestamps[0]))
+        num_overlap = len(df) - num_new_bars
+        if num_overlap <= 0 or not np.array_equal(
+            prev_timestamps[num_new_bars:], timestamps[:num_overlap]
+        ):
+            return None
+
+        for col in ["high", "low", "close"]:
+            if not np.array_equal(
+                np.asarray(prev_df[col])[num_new_bars:],
+                np.asarray(df[col])[:num_overlap],
+            ):
+                return None
+        return num_new_bars
+
+    def transform_df_incremental(
+        self,
+        currency_code: str,
+        df: DataFrame[CryptoHistorical] | WindowFrame,
+    ) -> DataFrame[CryptoHistorical] | WindowFrame:
+        num_new_bars = self.get_num_new_bars(self.prev_dt_dfs.get(currency_code), df)
+        self.prev_dt_dfs[currency_code] = df
+
+        if num_new_bars is None:
+            self.indicator_states[currency_code] = self.create_indicator_state(len(df))
+            num_new_bars = len(df)
+
+        state = self.indicator_states[currency_code]
+        if state is None:
+            return self.transform_df(df)
+
+        new_bars = (
+            np.asarray(df[col])[len(df) - num_new_bars :].tolist()
+            for col in ["high", "low", "close"]
+        )
+        for high, low, close in zip(*new_bars):
+            state.update(high, low, close)
+        return state.apply(df)
+
     def filter_orders(
         self,
         orders: List[CryptoLimitOrder],
-        dt_dfs: Dict[str, DataFrame[CryptoHistorical]],
+        dt_dfs: Dict[str, DataFrame[CryptoHistorical] | WindowFrame],
     ) -> Tuple[List[CryptoLimitOrder], List[Tuple[bool, bool]]]:
         filtered_orders: List[CryptoLimitOrder] = []
         order_signals = []
@@ -142,7 +210,9 @@ class BaseStrategy:
 
     def execute(
         self,
-        dt_dfs_input: Dict[str, DataFrame[CryptoHistorical]] | None = None,
+        dt_dfs_input: (
+            Dict[str, DataFrame[CryptoHistorical] | WindowFrame] | None
+        ) = None,
         print_orders: bool = True,
         save_positions: bool = True,
     ) -> List[CryptoOrder]:
@@ -185,17 +255,16 @@ class BaseStrategy:
         for order, (confident_signal, risk_signal) in zip(
             filtered_orders, order_signals
         ):
-            df = dt_dfs[order.currency_code]
-            most_recent_data: Series[CryptoHistorical] = df.iloc[-1]
+            most_recent_data = get_last_row(dt_dfs[order.currency_code])
 
             order = CryptoOrder(
                 side=order.side,
                 currency_code=order.currency_code,
-                asset_price=most_recent_data.close,
+                asset_price=most_recent_data["close"],
                 amount=order.amount,
                 limit_price=order.limit_price,
-                quantity=order.amount / most_recent_data.close,
-                timestamp=most_recent_data.timestamp,
+                quantity=order.amount / most_recent_data["close"],
+                timestamp=most_recent_data["timestamp"],
             )
 
             if confident_signal or risk_signal:
@@ -218,55 +287,294 @@ class BaseStrategy:
                             getattr(self.broker, f"{exec_order.side}_crypto_market")(
                                 exec_order.currency_code,
                                 exec_order.amount,
-                                most_recent_data,
+                                pd.Series(most_recent_data),
                             )
                         )
 
                     if print_orders:
                         pprint(exec_order)
 
-                    if save_positions:
-                        self.write_order_to_file(exec_order)
+                # Only once the broker filled it, and once for sells, which are
+                # executed once for every lot they sold from
+                if save_positions and executed_orders:
+                    self.write_order_to_file(executed_orders[0], dt_dfs)
 
                 if print_orders:
-                    print_dt(
-                        f"Remaining buy power: {self.portfolio_mgr.portfolio_hist[-1].buy_power}"
-                    )
+                    print_dt(f"Remaining buy power: {self.portfolio_mgr.buy_power}")
 
+        self.portfolio_mgr.mark_to_market(self.portfolio_mgr.get_cur_prices_dt(dt_dfs))
         return processed_orders
 
-    def write_order_to_file(self, order: CryptoOrder) -> None:
-        positions = []
-        if self.path_to_positions.exists():
-            with open(self.path_to_positions, "r") as f:
-                positions = json.load(f)
+    def execute_vectorized(
+        self,
+        dt_closes: Dict[str, np.ndarray],
+        timestamps: pd.Series,
+        ends: np.ndarray,
+        span: int,
+        progress_callback: Callable[[int, Dict[str, float]], None] | None = None,
+        progress_freq: int = 1,
+        dt_features: Dict[str, Dict[str, np.ndarray]] | None = None,
+        first_tick: int = 0,
+    ) -> List[CryptoOrder]:
+        # Simulated counterpart of calling `execute` on every `span`-row window
+        # ending at `ends`: signals come from `compute_signals` in one pass and
+        # only the ticks that can trade are replayed through the portfolio.
+        # `progress_callback` gets the tick and its prices after every
+        # `progress_freq` ticks, as if each tick had been replayed.
+        # `dt_features` can be passed in when it was computed for the same
+        # closes, ends and indicator parameters. Backtests run in chunks pass
+        # the number of ticks before the chunk as `first_tick`.
+        self.check_span(span)
+        assert (
+            self.auto_generate_orders and not self.limit_orders
+        ), "Vectorized execution only supports auto-generated orders"
+
+        sides = ("sell", "buy")
+        if dt_features is None:
+            dt_features = {
+                currency_code: self.compute_features(
+                    dt_closes[currency_code], ends, span
+                )
+                for currency_code in self.currency_codes
+            }
+        dt_signals = {
+            currency_code: self.compute_signals(
+                dt_closes[currency_code], ends, span, dt_features[currency_code]
+            )
+            for currency_code in self.currency_codes
+        }
+        dt_sides = {
+            currency_code: self.get_sides(signals)
+            for currency_code, signals in dt_signals.items()
+        }
+
+        is_active = np.zeros(len(ends), dtype=bool)
+        for currency_code in self.currency_codes:
+            is_active |= dt_sides[currency_code] != ""
+
+        is_checkpoint = np.zeros(len(ends), dtype=bool)
+        if progress_callback is not None:
+            is_checkpoint[
+                (progress_freq - 1 - first_tick) % progress_freq :: progress_freq
+            ] = True
+
+        # Lot highs only take in bars some window covers, as in `execute`
+        num_windows = np.zeros(len(timestamps) + 1, dtype=np.int64)
+        np.add.at(num_windows, ends - span + 1, 1)
+        np.add.at(num_windows, ends + 1, -1)
+        is_covered = np.cumsum(num_windows[:-1]) > 0
+        dt_seen_closes = {
+            currency_code: np.where(is_covered, dt_closes[currency_code], -np.inf)
+            for currency_code in self.currency_codes
+        }
+        bar_timestamps = timestamps.to_numpy()
+
+        # Ticks at which a lot of each currency is stopped out, kept until its
+        # lots change
+        def get_exit_tick(currency_code: str, tick: int) -> int:
+            return self.portfolio_mgr.get_exit_tick(
+                currency_code,
+                dt_closes[currency_code],
+                dt_seen_closes[currency_code],
+                bar_timestamps,
+                ends,
+                tick,
+            )
+
+        dt_exit_ticks = {
+            currency_code: get_exit_tick(currency_code, 0)
+            for currency_code in self.currency_codes
+        }
+
+        # Ticks skipped since the last replayed one are marked to market
+        # together, as nothing traded in between
+        def mark_ticks(start: int, stop: int) -> None:
+            if stop > start:
+                self.portfolio_mgr.mark_to_market_many(
+                    {
+                        currency_code: dt_closes[currency_code][ends[start:stop]]
+                        for currency_code in self.currency_codes
+                    }
+                )
+
+        executed: List[CryptoOrder] = []
+        event_ticks = np.append(np.flatnonzero(is_active | is_checkpoint), len(ends))
+        event_pos = num_marked = 0
+        while True:
+            tick = min(event_ticks[event_pos], *dt_exit_ticks.values())
+            mark_ticks(num_marked, tick)
+            if tick == len(ends):
+                break
+            event_pos += tick == event_ticks[event_pos]
+            idx = ends[tick]
+            timestamp = timestamps.iloc[idx]
+            cur_prices_dt = {
+                currency_code: dt_closes[currency_code][idx]
+                for currency_code in self.currency_codes
+            }
+            for currency_code in self.currency_codes:
+                self.portfolio_mgr.observe_bars(
+                    currency_code,
+                    dt_seen_closes[currency_code][: idx + 1],
+                    bar_timestamps[: idx + 1],
+                )
+
+            # `execute` handles currencies in order of their best scoring order
+            ranked_currency_codes = sorted(
+                self.currency_codes,
+                key=lambda currency_code: max(
+                    dt_signals[currency_code][f"{side}_score"][tick] for side in sides
+                ),
+                reverse=True,
+            )
+            filtered_orders: List[CryptoLimitOrder | CryptoOrder] = [
+                CryptoLimitOrder(
+                    side=dt_sides[currency_code][tick],
+                    currency_code=currency_code,
+                    limit_price=dt_signals[currency_code][
+                        f"{dt_sides[currency_code][tick]}_limit"
+                    ][tick],
+                    amount=dt_signals[currency_code][
+                        f"{dt_sides[currency_code][tick]}_amount"
+                    ][tick],
+                )
+                for currency_code in ranked_currency_codes
+                if dt_sides[currency_code][tick] != ""
+            ]
+            filtered_orders.extend(
+                self.portfolio_mgr.create_stop_loss_orders(
+                    self.portfolio_mgr.get_stopped_lot_idxs(cur_prices_dt),
+                    cur_prices_dt,
+                    timestamp,
+                )
+            )
 
-        positions.append(order.model_dump_json())
+            for order in filtered_orders:
+                cur_price = cur_prices_dt[order.currency_code]
+                order = CryptoOrder(
+                    side=order.side,
+                    currency_code=order.currency_code,
+                    asset_price=cur_price,
+                    amount=order.amount,
+                    limit_price=order.limit_price,
+                    quantity=order.amount / cur_price,
+                    timestamp=timestamp,
+                )
+                executed.extend(
+                    self.portfolio_mgr.process_order_at(cur_prices_dt, timestamp, order)
+                )
+            for currency_code in {order.currency_code for order in filtered_orders}:
+                dt_exit_ticks[currency_code] = get_exit_tick(currency_code, tick + 1)
+            self.portfolio_mgr.mark_to_market(cur_prices_dt)
+            num_marked = tick + 1
+
+            if is_checkpoint[tick]:
+                progress_callback(first_tick + tick, cur_prices_dt)
+
+        return executed
+
+    def get_sides(self, signals: Dict[str, np.ndarray]) -> np.ndarray:
+        # Side of the order each tick of `compute_signals` trades, or ""
+        assert not np.any(
+            signals["buy_confident"] & signals["sell_confident"]
+        ), "Confident signals for both orders cannot be True at the same time."
+        assert not np.any(
+            signals["buy_risk"] & signals["sell_risk"]
+        ), "Risk signals for both orders cannot be True at the same time."
+
+        # At most one side fires, so the score order of the two orders
+        # picked in `filter_orders` does not matter.
+        return np.select(
+            [
+                signals[f"{side}_{signal}"]
+                for signal in ("confident", "risk")
+                for side in ("buy", "sell")
+            ],
+            ["buy", "sell", "buy", "sell"],
+            default="",
+        )
 
-        with open(self.path_to_positions, "w") as f:
-            json.dump(positions, f)
+    def write_order_to_file(
+        self,
+        order: CryptoOrder,
+        dt_dfs: Dict[str, DataFrame[CryptoHistorical] | WindowFrame],
+    ) -> None:
+        self.order_journal.append(order, self.portfolio_mgr.get_cur_prices_dt(dt_dfs))
+
+    def restore_positions(self, path_to_positions: str | Path) -> None:
+        # Rebuilds the portfolio from the orders journaled before a restart,
+        # raising the lots' trailing highs by the bars since, and keeps
+        # journaling to the same file. The orders are replayed alone first to
+        # find the lots still open, so that bars are fetched from when the
+        # oldest of each currency's lots was bought.
+        records = list(read_journal(path_to_positions))
+        open_lots_mgr = PortfolioManager(
+            self.currency_codes, self.portfolio_mgr.initial_buy_power
+        )
+        replay_orders(open_lots_mgr, records)
+        first_lot_dts = open_lots_mgr.ledger.get_first_lot_dts()
+        dt_dfs = {
+            currency_code: self.broker.get_crypto_historical(
+                currency_code,
+                RH_HISTORICAL_INTERVAL,
+                RH_HISTORICAL_SPAN,
+                start_dt=first_lot_dts.get(currency_code),
+            )
+            for currency_code in self.currency_codes
+        }
+        replay_orders(self.portfolio_mgr, records, dt_dfs)
+        self.order_journal.close()
+        self.path_to_positions = Path(path_to_positions)
+        self.order_journal = OrderJournal(self.path_to_positions)
+
+    def close(self) -> None:
+        self.order_journal.close()
+        self.portfolio_mgr.portfolio_hist.close()
 
     def execute_buy_condition(
-        self, df: DataFrame[CryptoHistorical], order: CryptoLimitOrder
+        self, df: DataFrame[CryptoHistorical] | WindowFrame, order: CryptoLimitOrder
     ) -> Tuple[bool, bool]:
         raise NotImplementedError("This method should be overridden by subclasses")
 
     def execute_sell_condition(
-        self, df: DataFrame[CryptoHistorical], order: CryptoLimitOrder
+        self, df: DataFrame[CryptoHistorical] | WindowFrame, order: CryptoLimitOrder
     ) -> Tuple[bool, bool]:
         raise NotImplementedError("This method should be overridden by subclasses")
 
     def transform_df(
-        self, df: DataFrame[CryptoHistorical]
-    ) -> DataFrame[CryptoHistorical]:
+        self, df: DataFrame[CryptoHistorical] | WindowFrame
+    ) -> DataFrame[CryptoHistorical] | WindowFrame:
         return df
 
+    def create_indicator_state(self, span: int) -> Any:
+        return None
+
+    def check_span(self, span: int) -> None:
+        # Fails for windows of `span` rows too short for the indicators
+        pass
+
+    def compute_features(
+        self, close: np.ndarray, ends: np.ndarray, span: int
+    ) -> Dict[str, np.ndarray]:
+        # The parts of `compute_signals` that only depend on the indicator
+        # parameters, so strategies that differ in thresholds can share them
+        return {}
+
+    def compute_signals(
+        self,
+        close: np.ndarray,
+        ends: np.ndarray,
+        span: int,
+        features: Dict[str, np.ndarray] | None = None,
+    ) -> Dict[str, np.ndarray]:
+        raise NotImplementedError("This method should be overridden by subclasses")
+
     def get_auto_generated_orders(
         self, currency_code: str, df: DataFrame[CryptoHistorical]
     ) -> List[CryptoLimitOrder]:
         return []
 
     def get_score(
-        self, df: DataFrame[CryptoHistorical], order: CryptoLimitOrder
+        self, df: DataFrame[CryptoHistorical] | WindowFrame, order: CryptoLimitOrder
     ) -> float:
         raise NotImplementedError("This method should be overridden by subclasses")
@@ -0,0 +1,183 @@
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from StratDaemon.portfolio.batch import PortfolioBatch
+from StratDaemon.strats.base import BaseStrategy
+
+
+def get_ranked_orders(
+    strat: BaseStrategy,
+    dt_closes: Dict[str, np.ndarray],
+    ends: np.ndarray,
+    span: int,
+    dt_features: Dict[str, Dict[str, np.ndarray]],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Ticks the strategy trades at, with the side ("" for none), limit price
+    # and amount of each currency's order there, and the currency indices in
+    # the order `execute_vectorized` handles them
+    currency_codes = strat.currency_codes
+    dt_signals = {
+        currency_code: strat.compute_signals(
+            dt_closes[currency_code], ends, span, dt_features[currency_code]
+        )
+        for currency_code in currency_codes
+    }
+    sides = np.stack(
+        [
+            strat.get_sides(dt_signals[currency_code])
+            for currency_code in currency_codes
+        ],
+        axis=1,
+    )
+    ticks = np.flatnonzero((sides != "").any(axis=1))
+    sides = sides[ticks]
+
+    def stack(name: str) -> np.ndarray:
+        return np.stack(
+            [
+                dt_signals[currency_code][name][ticks]
+                for currency_code in currency_codes
+            ],
+            axis=1,
+        )
+
+    is_buy = sides == "buy"
+    limit_prices = np.where(is_buy, stack("buy_limit"), stack("sell_limit"))
+    amounts = np.where(is_buy, stack("buy_amount"), stack("sell_amount"))
+
+    # Best score of each currency's orders, as `max` picks it, highest first
+    # with ties left in currency order
+    buy_scores, sell_scores = stack("buy_score"), stack("sell_score")
+    scores = np.where(buy_scores > sell_scores, buy_scores, sell_scores)
+    ranks = np.argsort(-scores, axis=1, kind="stable")
+    # Sorting NaN scores is up to Python's sort, so those ticks are left to it
+    for i in np.flatnonzero(np.isnan(scores).any(axis=1)):
+        ranks[i] = sorted(
+            range(len(currency_codes)),
+            key=lambda idx: max(sell_scores[i, idx], buy_scores[i, idx]),
+            reverse=True,
+        )
+    return ticks, sides, limit_prices, amounts, ranks
+
+
+def execute_batch(
+    strats: List[BaseStrategy],
+    dt_closes: Dict[str, np.ndarray],
+    timestamps: pd.Series,
+    ends: np.ndarray,
+    span: int,
+    dt_features: Dict[str, Dict[str, np.ndarray]],
+) -> PortfolioBatch:
+    # Same as calling `execute_vectorized` on each strategy, for strategies
+    # on the same currencies that only differ in their thresholds and share
+    # `dt_features`. The portfolios step through the ticks any of them trades
+    # or is stopped out at together, each trading only at its own.
+    assert all(
+        strat.auto_generate_orders and not strat.limit_orders for strat in strats
+    ), "Batched execution only supports auto-generated orders"
+    for strat in strats:
+        strat.check_span(span)
+
+    currency_codes = strats[0].currency_codes
+    portfolio_mgrs = [strat.portfolio_mgr for strat in strats]
+    batch = PortfolioBatch(
+        currency_codes,
+        portfolio_mgrs[0].buy_power,
+        [portfolio_mgr.trailing_stop_loss for portfolio_mgr in portfolio_mgrs],
+        [portfolio_mgr.trailing_take_profit for portfolio_mgr in portfolio_mgrs],
+        portfolio_mgrs[0].transaction_fee,
+    )
+    num_ticks = len(ends)
+    closes = np.stack([dt_closes[currency_code] for currency_code in currency_codes])
+
+    # Orders of every strategy one after the other, with each strategy's
+    # ticks followed by `num_ticks` to tell when it has none left
+    all_orders = [
+        get_ranked_orders(strat, dt_closes, ends, span, dt_features) for strat in strats
+    ]
+    num_orders = np.array([len(orders[0]) for orders in all_orders])
+    offsets = np.append(0, np.cumsum(num_orders)[:-1])
+    order_ticks = np.concatenate(
+        [np.append(orders[0], num_ticks) for orders in all_orders]
+    )
+    sides, limit_prices, amounts, ranks = [
+        np.concatenate([orders[i] for orders in all_orders]) for i in range(1, 5)
+    ]
+
+    # Lot highs only take in bars some window covers, as in `execute_vectorized`
+    num_windows = np.zeros(len(timestamps) + 1, dtype=np.int64)
+    np.add.at(num_windows, ends - span + 1, 1)
+    np.add.at(num_windows, ends + 1, -1)
+    is_covered = np.cumsum(num_windows[:-1]) > 0
+    seen_closes = np.where(is_covered, closes, -np.inf)
+
+    rows = np.arange(len(strats))
+    order_pos = np.zeros(len(strats), dtype=np.int64)
+    next_order_ticks = order_ticks[offsets + rows]
+    exit_ticks = np.full(len(strats), num_ticks)
+    last_tick = -1
+    while True:
+        event_ticks = np.minimum(next_order_ticks, exit_ticks)
+        tick = int(event_ticks.min())
+        # Nothing traded since the last tick
+        batch.mark_to_market(closes[:, ends[last_tick + 1 : tick]])
+        if tick == num_ticks:
+            break
+        idx = ends[tick]
+        prices = closes[:, idx]
+        start = ends[last_tick] + 1 if last_tick >= 0 else 0
+        batch.raise_highs(seen_closes[:, start : idx + 1].max(axis=1))
+        event_rows = np.flatnonzero(event_ticks == tick)
+
+        # Stop loss orders are made before any order is processed, and sell
+        # each stopped lot at its value then
+        is_stopped = batch.get_stopped_lots(event_rows, prices)
+        stop_rows, stop_lots = np.nonzero(is_stopped)
+        stop_slots = (np.cumsum(is_stopped, axis=1) - 1)[stop_rows, stop_lots]
+        stop_rows = event_rows[stop_rows]
+        stop_currencies = batch.lot_currencies[stop_rows, stop_lots]
+        stop_amounts = (
+            prices[stop_currencies] * batch.lot_quantities[stop_rows, stop_lots]
+        )
+
+        # Each portfolio's orders in rank order, then its stop loss orders
+        order_rows = event_rows[next_order_ticks[event_rows] == tick]
+        order_idxs = offsets[order_rows] + order_pos[order_rows]
+        for currencies in ranks[order_idxs].T:
+            order_sides = sides[order_idxs, currencies]
+            is_buy = order_sides == "buy"
+            batch.buy(
+                order_rows[is_buy],
+                currencies[is_buy],
+                amounts[order_idxs[is_buy], currencies[is_buy]],
+                prices[currencies[is_buy]],
+                limit_prices[order_idxs[is_buy], currencies[is_buy]],
+                tick,
+            )
+            is_sell = order_sides == "sell"
+            batch.sell(
+                order_rows[is_sell],
+                currencies[is_sell],
+                amounts[order_idxs[is_sell], currencies[is_sell]],
+                prices,
+            )
+        for slot in range(stop_slots.max() + 1 if len(stop_slots) > 0 else 0):
+            is_slot = stop_slots == slot
+            batch.sell(
+                stop_rows[is_slot],
+                stop_currencies[is_slot],
+                stop_amounts[is_slot],
+                prices,
+            )
+
+        order_pos[order_rows] += 1
+        next_order_ticks[order_rows] = order_ticks[
+            offsets[order_rows] + order_rows + order_pos[order_rows]
+        ]
+        exit_ticks[event_rows] = batch.get_exit_ticks(
+            event_rows, closes, seen_closes, ends, tick + 1
+        )
+        batch.mark_to_market(prices[:, None])
+        last_tick = tick
+
+    return batch
@@ -1,4 +1,5 @@
-from typing import List, Tuple
+from collections import deque
+from typing import Dict, List, Tuple
 from StratDaemon.integration.broker.base import BaseBroker
 from StratDaemon.integration.notification.base import BaseNotification
 from StratDaemon.strats.base import BaseStrategy
@@ -7,6 +8,7 @@ from pandera.typing import DataFrame
 from StratDaemon.utils.constants import (
     BUY_POWER,
     DEFAULT_INDICATOR_LENGTH,
+    FIB_VALUES,
     MAX_HOLDING_PER_CURRENCY,
     PERCENT_DIFF_THRESHOLD,
     RSI_BUY_THRESHOLD,
@@ -17,19 +19,128 @@ from StratDaemon.utils.constants import (
     TRAILING_TAKE_PROFIT,
     VOL_WINDOW_SIZE,
 )
+import numpy as np
 import pandas as pd
-from StratDaemon.utils.funcs import percent_difference
+from StratDaemon.utils.funcs import percent_difference, percent_difference_arr
 from StratDaemon.utils.indicators import (
     add_boll_diff,
     add_fib_ret_lvls,
     add_rsi,
     add_super_trend,
     add_trends_upwards,
+    get_fib_ret_lvls,
+)
+from StratDaemon.utils.kernels import (
+    bbands,
+    first_valid_index,
+    sma,
+    window_values,
+    windowed_rsi,
+)
+from StratDaemon.utils.windows import WindowFrame, get_last_row
+from StratDaemon.utils.incremental import (
+    IncrementalAtr,
+    IncrementalRsi,
+    IncrementalSuperTrend,
+    RollingExtrema,
+    RollingStats,
 )
 
 pd.options.mode.chained_assignment = None
 
 
+class FibVolRsiIndicators:
+    """
+    Incremental counterpart of `FibVolRsiStrategy.transform_df` for a sliding window
+    of `span` bars. Every column the strategy reads matches the batch result on the
+    same window. ATR and the rsi rows other than the latest and the trend-span row
+    keep the value each bar had when it was the latest, and the supertrend runs
+    from the first bar seen.
+    """
+
+    def __init__(
+        self,
+        span: int,
+        indicator_length: int,
+        rsi_trend_span: int,
+        atr_length: int = 14,
+        multiplier: float = 3,
+    ) -> None:
+        self.span = span
+        self.indicator_length = indicator_length
+        self.atr_length = atr_length
+        self.boll = RollingStats(indicator_length)
+        self.sma_half = RollingStats(span // 2)
+        self.sma_full = RollingStats(span)
+        self.extrema = RollingExtrema(span)
+        self.atr = IncrementalAtr(atr_length, span - 1)
+        self.super_trend = IncrementalSuperTrend(atr_length, multiplier)
+        self.super_trend_cols = [
+            f"SUPERT{suffix}_{atr_length}_{float(multiplier)}"
+            for suffix in ("", "d", "l", "s")
+        ]
+        self.rsi = IncrementalRsi(indicator_length, span - 1)
+        self.rsi_prev_pos = max(0, span - rsi_trend_span)
+        self.rsi_prev = IncrementalRsi(indicator_length, self.rsi_prev_pos)
+        self.rsi_prev_hist = deque(maxlen=span - self.rsi_prev_pos)
+        self.hist = {
+            col: deque(maxlen=span)
+            for col in ["upper_bb", "lower_bb", "atr", *self.super_trend_cols, "rsi"]
+        }
+
+    def update(self, high: float, low: float, close: float) -> None:
+        for stat in (self.boll, self.sma_half, self.sma_full, self.extrema):
+            stat.update(close)
+
+        mid, deviations = self.boll.get_mean(), 2.0 * self.boll.get_std()
+        self.hist["upper_bb"].append(mid + deviations)
+        self.hist["lower_bb"].append(mid - deviations)
+        self.hist["atr"].append(self.atr.update(high, low, close))
+        for col, val in zip(
+            self.super_trend_cols, self.super_trend.update(high, low, close)
+        ):
+            self.hist[col].append(val)
+        self.hist["rsi"].append(self.rsi.update(close))
+        self.rsi_prev_hist.append(self.rsi_prev.update(close))
+
+    def get_hist(self, col: str) -> np.ndarray:
+        return np.fromiter(self.hist[col], dtype=float, count=len(self.hist[col]))
+
+    def apply(
+        self, df: DataFrame[CryptoHistorical] | WindowFrame
+    ) -> DataFrame[CryptoHistorical] | WindowFrame:
+        assert (
+            len(df) == self.span
+        ), f"Indicator state is for windows of {self.span} bars, got {len(df)}"
+
+        for col in ("upper_bb", "lower_bb"):
+            vals = self.get_hist(col)
+            vals[: self.indicator_length - 1] = np.nan
+            df[col] = vals
+        df["boll_diff"] = df["upper_bb"] - df["lower_bb"]
+
+        atr = self.get_hist("atr")
+        atr[: self.atr_length] = np.nan
+        df["atr"] = atr
+        for col in self.super_trend_cols:
+            df[col] = self.get_hist(col)
+
+        trends_upwards = np.zeros(self.span, dtype=bool)
+        trends_upwards[-1] = self.sma_half.get_mean() > self.sma_full.get_mean()
+        df["trends_upwards"] = trends_upwards
+        fib_vals = get_fib_ret_lvls(
+            self.extrema.get_min(), self.extrema.get_max(), trends_upwards[-1]
+        )
+        for i, val in enumerate(fib_vals):
+            df[f"fib_{i}"] = val
+
+        rsi = self.get_hist("rsi")
+        rsi[: self.indicator_length] = 50.0
+        rsi[self.rsi_prev_pos] = self.rsi_prev_hist[0]
+        df["rsi"] = rsi
+        return df
+
+
 class FibVolRsiStrategy(BaseStrategy):
     def __init__(
         self,
@@ -50,6 +161,8 @@ class FibVolRsiStrategy(BaseStrategy):
         rsi_trend_span: int = RSI_TREND_SPAN,
         trailing_stop_loss: float = TRAILING_STOP_LOSS,
         trailing_take_profit: float = TRAILING_TAKE_PROFIT,
+        incremental: bool = False,
+        history_path: str | None = None,
     ) -> None:
         super().__init__(
             "fib_retracements_volatility_rsi",
@@ -63,6 +176,8 @@ class FibVolRsiStrategy(BaseStrategy):
             trailing_stop_loss,
             trailing_take_profit,
             max_holding_per_currency,
+            incremental,
+            history_path,
         )
         self.percent_diff_threshold = percent_diff_threshold
         self.vol_window_size = vol_window_size
@@ -76,46 +191,47 @@ class FibVolRsiStrategy(BaseStrategy):
 
     def is_within_p_thres(
         self,
-        df: DataFrame[CryptoHistorical],
+        df: DataFrame[CryptoHistorical] | WindowFrame,
         indicator_value: float,
         percent_diff_threshold: float,
         indicator: str,
     ) -> bool:
         return (
-            abs(percent_difference(df.iloc[-1][indicator], indicator_value))
+            abs(percent_difference(get_last_row(df)[indicator], indicator_value))
             <= percent_diff_threshold
         )
 
     def is_indicator_increasing(
-        self, df: DataFrame[CryptoHistorical], indicator: str
+        self, df: DataFrame[CryptoHistorical] | WindowFrame, indicator: str
     ) -> bool:
         indicator_cur, indicator_prev = self.get_indicator_trend(df, indicator)
         return indicator_cur > indicator_prev
 
     def get_indicator_trend(
-        self, df: DataFrame[CryptoHistorical], indicator: str
+        self, df: DataFrame[CryptoHistorical] | WindowFrame, indicator: str
     ) -> Tuple[float, float]:
         assert (
             len(df) > self.vol_window_size
         ), f"Not enough data points to calculate indicator increase: DataFrame has {len(df)} but need more than {self.vol_window_size}"
-        rolling_mean = df[indicator].rolling(window=self.vol_window_size).mean()
-        return rolling_mean.iloc[-1], rolling_mean.iloc[-2]
+        values = np.asarray(df[indicator], dtype=float)
+        window = self.vol_window_size
+        return values[-window:].mean(), values[-window - 1 : -1].mean()
 
-    def rsi_percent_change(self, df: DataFrame[CryptoHistorical]) -> float:
-        assert df.index[0] == 0, "Index must be 0-based"
-        rsi = df.rsi
-        rsi_prev_idx = max(rsi.first_valid_index(), len(rsi) - self.rsi_trend_span)
-        rsi_cur, rsi_prev = rsi.iloc[-1], rsi.loc[rsi_prev_idx]
-        return percent_difference(rsi_cur, rsi_prev)
+    def rsi_percent_change(
+        self, df: DataFrame[CryptoHistorical] | WindowFrame
+    ) -> float:
+        rsi = np.asarray(df["rsi"], dtype=float)
+        rsi_prev_idx = max(first_valid_index(rsi), len(rsi) - self.rsi_trend_span)
+        return percent_difference(rsi[-1], rsi[rsi_prev_idx])
 
-    def is_rsi_increasing(self, df: DataFrame[CryptoHistorical]) -> bool:
+    def is_rsi_increasing(self, df: DataFrame[CryptoHistorical] | WindowFrame) -> bool:
         return self.rsi_percent_change(df) >= self.rsi_percent_incr_threshold
 
-    def is_rsi_decreasing(self, df: DataFrame[CryptoHistorical]) -> bool:
+    def is_rsi_decreasing(self, df: DataFrame[CryptoHistorical] | WindowFrame) -> bool:
         return self.rsi_percent_change(df) <= -self.rsi_percent_incr_threshold
 
     def execute_buy_condition(
-        self, df: DataFrame[CryptoHistorical], order: CryptoLimitOrder
+        self, df: DataFrame[CryptoHistorical] | WindowFrame, order: CryptoLimitOrder
     ) -> Tuple[bool, bool]:
         is_within_fib_lvl = self.is_within_p_thres(
             df, order.limit_price, self.percent_diff_threshold, "close"
@@ -127,14 +243,14 @@ class FibVolRsiStrategy(BaseStrategy):
         )  # stabilizing at support
 
         # if vol is increasing, it's risky to buy since it could be either resistance or breakthrough
-        is_within_rsi_lvl = df.iloc[-1].rsi <= self.rsi_buy_threshold
+        is_within_rsi_lvl = get_last_row(df)["rsi"] <= self.rsi_buy_threshold
         risk_signal = (
             is_within_fib_lvl and is_within_rsi_lvl and self.is_rsi_increasing(df)
         )
         return confident_signal or self.is_rsi_increasing(df), risk_signal
 
     def execute_sell_condition(
-        self, df: DataFrame[CryptoHistorical], order: CryptoLimitOrder
+        self, df: DataFrame[CryptoHistorical] | WindowFrame, order: CryptoLimitOrder
     ) -> Tuple[bool, bool]:
         is_within_fib_lvl = self.is_within_p_thres(
             df, order.limit_price, self.percent_diff_threshold, "close"
@@ -144,7 +260,7 @@ class FibVolRsiStrategy(BaseStrategy):
             is_within_fib_lvl and is_vol_increasing
         )  # trying to break resistance
 
-        is_within_rsi_lvl = df.iloc[-1].rsi >= self.rsi_sell_threshold
+        is_within_rsi_lvl = get_last_row(df)["rsi"] >= self.rsi_sell_threshold
         risk_signal = is_within_rsi_lvl and self.is_rsi_decreasing(df)
 
         # if vol increasing, it's safe to sell but misses out on some opportunities
@@ -152,16 +268,16 @@ class FibVolRsiStrategy(BaseStrategy):
         return confident_signal and self.is_rsi_decreasing(df), risk_signal
 
     def get_score(
-        self, df: DataFrame[CryptoHistorical], order: CryptoLimitOrder
+        self, df: DataFrame[CryptoHistorical] | WindowFrame, order: CryptoLimitOrder
     ) -> float:
-        sr = df.iloc[-1]
+        sr = get_last_row(df)
         return (
-            (1 - abs(percent_difference(sr.close, order.limit_price)))
+            (1 - abs(percent_difference(sr["close"], order.limit_price)))
             + (
                 1
                 - abs(
                     percent_difference(
-                        sr.rsi,
+                        sr["rsi"],
                         (
                             self.rsi_buy_threshold
                             if order.side == "buy"
@@ -173,23 +289,33 @@ class FibVolRsiStrategy(BaseStrategy):
         ) / 2
 
     def transform_df(
-        self, df: DataFrame[CryptoHistorical]
-    ) -> DataFrame[CryptoHistorical]:
+        self, df: DataFrame[CryptoHistorical] | WindowFrame
+    ) -> DataFrame[CryptoHistorical] | WindowFrame:
         df = add_boll_diff(df, self.indicator_length)
         df = add_super_trend(df, atr_length=14, multiplier=3)
         df = add_trends_upwards(df)
-        df = add_fib_ret_lvls(df, df["trends_upwards"].iloc[-1])
+        df = add_fib_ret_lvls(df, np.asarray(df["trends_upwards"])[-1])
         df = add_rsi(df, self.indicator_length)
         return df
 
+    def check_span(self, span: int) -> None:
+        # The volatility window averages Bollinger bands, which need
+        # `indicator_length` rows of the window first
+        assert (
+            span - (self.indicator_length - 1) > self.vol_window_size
+        ), "Interval inputs are invalid"
+
+    def create_indicator_state(self, span: int) -> FibVolRsiIndicators:
+        return FibVolRsiIndicators(span, self.indicator_length, self.rsi_trend_span)
+
     def get_auto_generated_orders(
         self, currency_code: str, df: DataFrame[CryptoHistorical]
     ) -> List[CryptoLimitOrder]:
-        sr = df.iloc[-1]
+        sr = get_last_row(df)
 
-        fib_vals = sorted(sr.filter(like="fib_").values)
+        fib_vals = sorted(val for col, val in sr.items() if "fib_" in col)
         n = len(fib_vals)
-        closest_idx = (fib_vals - sr.close).argmin()
+        closest_idx = (np.asarray(fib_vals) - sr["close"]).argmin()
 
         orders = [
             CryptoLimitOrder(
@@ -215,3 +341,99 @@ class FibVolRsiStrategy(BaseStrategy):
             order.amount *= score
 
         return orders
+
+    def compute_features(
+        self, close: np.ndarray, ends: np.ndarray, span: int
+    ) -> Dict[str, np.ndarray]:
+        assert (
+            span > self.vol_window_size
+        ), f"Not enough data points to calculate indicator increase: windows have {span} but need more than {self.vol_window_size}"
+        features = super().compute_features(close, ends, span)
+        cur_close = close[ends]
+        windows = window_values(close, ends, span)
+
+        lower_bb, _, upper_bb = bbands(close, self.indicator_length)
+        boll_diff_mean = sma(upper_bb - lower_bb, self.vol_window_size)
+        features["is_vol_increasing"] = boll_diff_mean[ends] > boll_diff_mean[ends - 1]
+
+        rsi = windowed_rsi(close, ends, span - 1, self.indicator_length)
+        rsi_prev_pos = max(0, span - self.rsi_trend_span)
+        rsi_prev = windowed_rsi(
+            close,
+            ends - (span - 1 - rsi_prev_pos),
+            rsi_prev_pos,
+            self.indicator_length,
+        )
+        features["rsi"] = rsi
+        features["rsi_percent_change"] = percent_difference_arr(rsi, rsi_prev)
+
+        trends_upwards = windows[:, span - span // 2 :].mean(axis=1) > windows.mean(
+            axis=1
+        )
+        low, high = windows.min(axis=1)[:, None], windows.max(axis=1)[:, None]
+        diff = high - low
+        fib_vals = np.where(
+            trends_upwards[:, None],
+            high + (diff * np.array(FIB_VALUES)),
+            low - (diff * np.array(FIB_VALUES)),
+        )
+        fib_vals.sort(axis=1)
+        n = fib_vals.shape[1]
+        closest_idx = (fib_vals - cur_close[:, None]).argmin(axis=1)
+        rows = np.arange(len(ends))
+        features["sell_limit"] = fib_vals[rows, np.minimum(closest_idx + 1, n - 1)]
+        features["buy_limit"] = fib_vals[rows, np.maximum(closest_idx - 1, 0)]
+        return features
+
+    def compute_signals(
+        self,
+        close: np.ndarray,
+        ends: np.ndarray,
+        span: int,
+        features: Dict[str, np.ndarray] | None = None,
+    ) -> Dict[str, np.ndarray]:
+        if features is None:
+            features = self.compute_features(close, ends, span)
+        cur_close = close[ends]
+        rsi = features["rsi"]
+        is_vol_increasing = features["is_vol_increasing"]
+        is_rsi_increasing = (
+            features["rsi_percent_change"] >= self.rsi_percent_incr_threshold
+        )
+        is_rsi_decreasing = (
+            features["rsi_percent_change"] <= -self.rsi_percent_incr_threshold
+        )
+        limit_prices = {side: features[f"{side}_limit"] for side in ("sell", "buy")}
+
+        is_within_fib_lvl = {
+            side: np.abs(percent_difference_arr(cur_close, limit_price))
+            <= self.percent_diff_threshold
+            for side, limit_price in limit_prices.items()
+        }
+        signals = {
+            "buy_confident": (is_within_fib_lvl["buy"] & ~is_vol_increasing)
+            | is_rsi_increasing,
+            "buy_risk": is_within_fib_lvl["buy"]
+            & (rsi <= self.rsi_buy_threshold)
+            & is_rsi_increasing,
+            "sell_confident": is_within_fib_lvl["sell"]
+            & is_vol_increasing
+            & is_rsi_decreasing,
+            "sell_risk": (rsi >= self.rsi_sell_threshold) & is_rsi_decreasing,
+        }
+
+        for side, limit_price in limit_prices.items():
+            rsi_threshold = (
+                self.rsi_buy_threshold if side == "buy" else self.rsi_sell_threshold
+            )
+            score = (
+                (1 - np.abs(percent_difference_arr(cur_close, limit_price)))
+                + (1 - np.abs(percent_difference_arr(rsi, rsi_threshold)))
+            ) / 2
+            signals[f"{side}_limit"] = limit_price
+            signals[f"{side}_score"] = score
+            signals[f"{side}_amount"] = self.max_amount_per_order * np.where(
+                np.isnan(score), 0.5, np.where(score < 0, 1e-6, score)
+            )
+
+        return signals
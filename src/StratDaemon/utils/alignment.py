@@ -0,0 +1,123 @@
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+from pandera.typing import DataFrame
+from StratDaemon.models.crypto import CryptoHistorical
+
+ALIGN_INTERSECTION = "intersection"  # Times at which every currency has a bar
+ALIGN_UNION = "union"  # Times at which any currency has a bar, gaps filled
+
+
+def merge_epoch_pair(a: np.ndarray, b: np.ndarray, policy: str) -> np.ndarray:
+    # Union or intersection of two sorted, unique epoch arrays. Each value is
+    # placed by how many of the other array's values come before it.
+    a_idxs = np.searchsorted(b, a)
+    is_shared = a_idxs < len(b)
+    is_shared[is_shared] = b[a_idxs[is_shared]] == a[is_shared]
+    if policy == ALIGN_INTERSECTION:
+        return a[is_shared]
+    a = a[~is_shared]
+    merged = np.empty(len(a) + len(b), dtype=np.result_type(a, b))
+    merged[np.arange(len(a)) + np.searchsorted(b, a)] = a
+    merged[np.arange(len(b)) + np.searchsorted(a, b)] = b
+    return merged
+
+
+def merge_epochs(
+    epoch_arrays: List[np.ndarray], policy: str = ALIGN_INTERSECTION
+) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Shared time index of sorted, unique int64 epoch arrays, and per array the
+    position of each shared time in it (-1 where it has none). The arrays are
+    k-way merged in rounds that merge them in pairs, so each round halves
+    their number and none of them sorts.
+    """
+    assert policy in (ALIGN_INTERSECTION, ALIGN_UNION), f"Unknown policy {policy}"
+    runs = list(epoch_arrays)
+    while len(runs) > 1:
+        runs = [
+            (
+                merge_epoch_pair(runs[i], runs[i + 1], policy)
+                if i + 1 < len(runs)
+                else runs[i]
+            )
+            for i in range(0, len(runs), 2)
+        ]
+    epochs = runs[0]
+
+    index_maps: List[np.ndarray] = []
+    for epoch_array in epoch_arrays:
+        index_map = np.searchsorted(epoch_array, epochs)
+        is_missing = index_map == len(epoch_array)
+        is_missing[~is_missing] = (
+            epoch_array[index_map[~is_missing]] != epochs[~is_missing]
+        )
+        index_map[is_missing] = -1
+        index_maps.append(index_map)
+    return epochs, index_maps
+
+
+class AlignedBars:
+    """
+    Bars of several currencies on one shared time index, held as a single
+    (currency, time, field) array. `index_maps[i]` gives the row of currency
+    i's frame at each time, or -1 where union alignment filled in a flat bar
+    at the previous close (its first close before its first bar) without
+    volume, or NaN bars for a currency without any.
+    """
+
+    def __init__(
+        self, dfs: List[DataFrame[CryptoHistorical]], policy: str = ALIGN_INTERSECTION
+    ) -> None:
+        self.columns = list(dfs[0].columns)
+        self.fields = [col for col in self.columns if col != "timestamp"]
+        assert all(
+            [col for col in df.columns if col != "timestamp"] == self.fields
+            for df in dfs
+        ), "Frames must have the same columns"
+
+        epochs, self.index_maps = merge_epochs(
+            [df["timestamp"].to_numpy("datetime64[ns]").view(np.int64) for df in dfs],
+            policy,
+        )
+        self.timestamps = epochs.view("datetime64[ns]")
+        self.values = np.empty((len(dfs), len(epochs), len(self.fields)))
+        for i, (df, index_map) in enumerate(zip(dfs, self.index_maps)):
+            self.fill(df, index_map, self.values[i])
+
+    def fill(
+        self, df: DataFrame[CryptoHistorical], index_map: np.ndarray, out: np.ndarray
+    ) -> None:
+        # Gathers the frame's bars at the shared times into `out`, one field
+        # at a time, where missing times take the previous bar (or the first)
+        is_missing = index_map < 0
+        if is_missing.all():
+            # A currency without bars has no close to fill in from
+            out[:] = np.nan
+            return
+        rows = index_map
+        if is_missing.any():
+            positions = np.where(is_missing, 0, np.arange(len(index_map)))
+            rows = index_map[np.maximum.accumulate(positions)]
+            rows[rows < 0] = index_map[~is_missing][0]
+
+        closes = df["close"].to_numpy(float)[rows]
+        for j, field in enumerate(self.fields):
+            out[:, j] = closes if field == "close" else df[field].to_numpy(float)[rows]
+            if field in ("open", "high", "low"):
+                out[is_missing, j] = closes[is_missing]
+            elif field == "volume":
+                out[is_missing, j] = 0.0
+
+    def get_field(self, field: str) -> np.ndarray:
+        # (currency, time) view of one field
+        return self.values[:, :, self.fields.index(field)]
+
+    def to_dfs(self) -> List[DataFrame[CryptoHistorical]]:
+        # Frames viewing each currency's rows of the array
+        dfs: List[DataFrame[CryptoHistorical]] = []
+        for values in self.values:
+            df = pd.DataFrame(values, columns=self.fields, copy=False)
+            df.insert(self.columns.index("timestamp"), "timestamp", self.timestamps)
+            dfs.append(df)
+        return dfs
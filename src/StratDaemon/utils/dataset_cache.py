@@ -0,0 +1,104 @@
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from threading import Lock
+from typing import Callable, Dict, List, Tuple
+from pandera.typing import DataFrame
+from pydantic import BaseModel
+from StratDaemon.models.crypto import CryptoHistorical
+from StratDaemon.utils.constants import DATASET_CACHE_MAX_BYTES
+
+
+class DatasetKey(BaseModel, frozen=True):
+    currency_codes: Tuple[str, ...]
+    source: str
+    timeframe: str
+    start_dt: datetime | None = None
+    end_dt: datetime | None = None
+    gap_filled: bool = False
+
+
+class DatasetCache:
+    """
+    Process-wide LRU cache of prepared historical frames, bounded by their memory
+    usage. Entries are keyed by `DatasetKey` and the data version of each currency,
+    which `invalidate` bumps when new bars are written. Cached frames are shared, so
+    callers must not modify them in place.
+    """
+
+    def __init__(self, max_bytes: int = DATASET_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[
+            Tuple[DatasetKey, Tuple[int, ...]],
+            Tuple[List[DataFrame[CryptoHistorical]], int],
+        ] = OrderedDict()
+        self.versions: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.num_bytes = 0
+        self.num_hits = self.num_misses = 0
+        self.lock = Lock()
+
+    def get_versions(self, key: DatasetKey) -> Tuple[int, ...]:
+        return tuple(
+            self.versions[(currency_code, key.source)]
+            for currency_code in key.currency_codes
+        )
+
+    def get(self, key: DatasetKey) -> List[DataFrame[CryptoHistorical]] | None:
+        with self.lock:
+            versioned_key = (key, self.get_versions(key))
+            if versioned_key not in self.entries:
+                return None
+            self.entries.move_to_end(versioned_key)
+            return list(self.entries[versioned_key][0])
+
+    def get_or_load(
+        self,
+        key: DatasetKey,
+        load: Callable[[], List[DataFrame[CryptoHistorical]]],
+    ) -> List[DataFrame[CryptoHistorical]]:
+        with self.lock:
+            versioned_key = (key, self.get_versions(key))
+            if versioned_key in self.entries:
+                self.entries.move_to_end(versioned_key)
+                self.num_hits += 1
+                return list(self.entries[versioned_key][0])
+            self.num_misses += 1
+
+        dfs = load()
+        num_bytes = sum(int(df.memory_usage(deep=True).sum()) for df in dfs)
+
+        with self.lock:
+            # Bars written while loading make this result stale, so do not keep it
+            if versioned_key[1] != self.get_versions(key) or num_bytes > self.max_bytes:
+                return list(dfs)
+            if versioned_key not in self.entries:
+                self.entries[versioned_key] = (dfs, num_bytes)
+                self.num_bytes += num_bytes
+            while self.num_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.num_bytes -= evicted_bytes
+        return list(dfs)
+
+    def invalidate(self, currency_code: str, source: str) -> None:
+        with self.lock:
+            self.versions[(currency_code, source)] += 1
+            for versioned_key in list(self.entries):
+                key = versioned_key[0]
+                if key.source == source and currency_code in key.currency_codes:
+                    _, num_bytes = self.entries.pop(versioned_key)
+                    self.num_bytes -= num_bytes
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.num_bytes = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.num_bytes,
+            "hits": self.num_hits,
+            "misses": self.num_misses,
+        }
+
+
+DATASET_CACHE = DatasetCache()
@@ -1,6 +1,7 @@
 from datetime import datetime
 import sys
 from typing import List, Tuple
+import numpy as np
 import optuna
 import pandas as pd
 import os
@@ -47,6 +48,15 @@ def percent_difference(value1, value2):
     return (value1 - value2) / value2 if value2 != 0 else 0
 
 
+def percent_difference_arr(values1: np.ndarray, values2: np.ndarray) -> np.ndarray:
+    return np.divide(
+        values1 - values2,
+        values2,
+        out=np.zeros(np.broadcast(values1, values2).shape),
+        where=values2 != 0,
+    )
+
+
 def print_dt(*args, **kw):
     print("[%s]" % (datetime.now()), *args, **kw)
 
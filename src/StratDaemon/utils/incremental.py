@@ -0,0 +1,204 @@
+from collections import deque
+from math import isnan, nan, sqrt
+from typing import Deque, Tuple
+import numpy as np
+
+
+class RollingStats:
+    """Mean and population standard deviation of the latest `length` values."""
+
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.values: Deque[float] = deque(maxlen=length)
+        self.mean = 0.0
+        self.sq_dev_sum = 0.0
+        self.num_updates = 0
+
+    @property
+    def is_ready(self) -> bool:
+        return len(self.values) == self.length
+
+    def update(self, value: float) -> None:
+        if self.is_ready:
+            old_value = self.values[0]
+            self.values.append(value)
+            old_mean = self.mean
+            self.mean += (value - old_value) / self.length
+            self.sq_dev_sum += (value - old_value) * (
+                value - self.mean + old_value - old_mean
+            )
+        else:
+            self.values.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(self.values)
+            self.sq_dev_sum += delta * (value - self.mean)
+
+        self.num_updates += 1
+        if self.num_updates % self.length == 0:
+            # Resync the running sums so rounding errors cannot accumulate
+            values = np.fromiter(self.values, dtype=float)
+            self.mean = values.mean()
+            self.sq_dev_sum = ((values - self.mean) ** 2).sum()
+
+    def get_mean(self) -> float:
+        return self.mean if self.is_ready else nan
+
+    def get_std(self) -> float:
+        return sqrt(max(self.sq_dev_sum, 0.0) / self.length) if self.is_ready else nan
+
+
+class RollingExtrema:
+    """Minimum and maximum of the latest `length` values using monotonic queues."""
+
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.num_updates = 0
+        self.mins: Deque[Tuple[int, float]] = deque()
+        self.maxs: Deque[Tuple[int, float]] = deque()
+
+    def update(self, value: float) -> None:
+        while self.mins and self.mins[-1][1] >= value:
+            self.mins.pop()
+        while self.maxs and self.maxs[-1][1] <= value:
+            self.maxs.pop()
+        self.mins.append((self.num_updates, value))
+        self.maxs.append((self.num_updates, value))
+
+        self.num_updates += 1
+        oldest_idx = self.num_updates - self.length
+        if self.mins[0][0] < oldest_idx:
+            self.mins.popleft()
+        if self.maxs[0][0] < oldest_idx:
+            self.maxs.popleft()
+
+    def get_min(self) -> float:
+        return self.mins[0][1]
+
+    def get_max(self) -> float:
+        return self.maxs[0][1]
+
+
+class WindowedEwm:
+    """
+    Adjusted exponential moving average with `alpha = 1 / length` (the RMA used by
+    pandas_ta) over the latest `num_values` values, or over every value seen when
+    `num_values` is None.
+    """
+
+    def __init__(self, length: int, num_values: int | None = None) -> None:
+        self.decay = 1 - 1 / length
+        self.min_periods = length
+        self.num_values = num_values
+        self.evicted_weight = self.decay**num_values if num_values else 0.0
+        self.values: Deque[float] = deque(maxlen=num_values)
+        self.weighted_sum = self.weight_sum = 0.0
+        self.num_updates = 0
+
+    def update(self, value: float) -> None:
+        if self.num_values == 0:
+            return
+        if self.num_values is not None and len(self.values) == self.num_values:
+            self.weighted_sum = (
+                self.decay * self.weighted_sum
+                - self.evicted_weight * self.values[0]
+                + value
+            )
+        else:
+            self.weighted_sum = self.decay * self.weighted_sum + value
+            self.weight_sum = self.decay * self.weight_sum + 1
+
+        if self.num_values is not None:
+            self.values.append(value)
+            if (self.num_updates + 1) % self.num_values == 0:
+                self.weighted_sum = np.dot(
+                    np.fromiter(self.values, dtype=float),
+                    self.decay ** np.arange(len(self.values) - 1, -1, -1),
+                )
+        self.num_updates += 1
+
+    def get_value(self) -> float:
+        num_obs = self.num_updates if self.num_values is None else len(self.values)
+        if num_obs < self.min_periods:
+            return nan
+        return self.weighted_sum / self.weight_sum
+
+
+class IncrementalRsi:
+    """RSI of a window ending at the latest close that holds `num_diffs` price changes."""
+
+    def __init__(self, length: int, num_diffs: int | None = None) -> None:
+        self.gains = WindowedEwm(length, num_diffs)
+        self.losses = WindowedEwm(length, num_diffs)
+        self.prev_close: float | None = None
+
+    def update(self, close: float) -> float:
+        if self.prev_close is not None:
+            diff = close - self.prev_close
+            self.gains.update(max(diff, 0.0))
+            self.losses.update(max(-diff, 0.0))
+        self.prev_close = close
+        return self.get_value()
+
+    def get_value(self) -> float:
+        gain, loss = self.gains.get_value(), self.losses.get_value()
+        if isnan(gain) or isnan(loss) or gain + loss == 0:
+            return 50.0
+        return 100 * gain / (gain + loss)
+
+
+class IncrementalAtr:
+    """Average true range over a window holding `num_values` true ranges."""
+
+    def __init__(self, length: int, num_values: int | None = None) -> None:
+        self.true_ranges = WindowedEwm(length, num_values)
+        self.prev_close: float | None = None
+
+    def update(self, high: float, low: float, close: float) -> float:
+        if self.prev_close is not None:
+            self.true_ranges.update(
+                max(
+                    abs(high - low),
+                    abs(high - self.prev_close),
+                    abs(self.prev_close - low),
+                )
+            )
+        self.prev_close = close
+        return self.true_ranges.get_value()
+
+
+class IncrementalSuperTrend:
+    """
+    Supertrend over every bar seen so far. It is recursive from its first bar, so it
+    matches `ta.supertrend` on a frame that starts at the same bar.
+    """
+
+    def __init__(self, length: int, multiplier: float) -> None:
+        self.multiplier = multiplier
+        self.atr = IncrementalAtr(length)
+        self.direction = 1
+        self.upper_band = self.lower_band = nan
+        self.num_updates = 0
+
+    def update(
+        self, high: float, low: float, close: float
+    ) -> Tuple[float, int, float, float]:
+        hl2 = 0.5 * (high + low)
+        matr = self.multiplier * self.atr.update(high, low, close)
+        upper_band, lower_band = hl2 + matr, hl2 - matr
+
+        if self.num_updates > 0:
+            if close > self.upper_band:
+                self.direction = 1
+            elif close < self.lower_band:
+                self.direction = -1
+            else:
+                if self.direction > 0 and lower_band < self.lower_band:
+                    lower_band = self.lower_band
+                if self.direction < 0 and upper_band > self.upper_band:
+                    upper_band = self.upper_band
+        self.upper_band, self.lower_band = upper_band, lower_band
+        self.num_updates += 1
+
+        if self.direction > 0:
+            return lower_band, self.direction, lower_band, nan
+        return upper_band, self.direction, nan, upper_band
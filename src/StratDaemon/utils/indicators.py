@@ -1,19 +1,23 @@
-import pandas as pd
+from typing import List, Tuple
+import numpy as np
 from pandera.typing import DataFrame
 from StratDaemon.models.crypto import CryptoHistorical
 from StratDaemon.utils.constants import FIB_VALUES
-import pandas_ta as ta
+from StratDaemon.utils import kernels
+
+
+def get_fib_ret_lvls(low: float, high: float, trends_upward: bool) -> List[float]:
+    diff = high - low
+    if trends_upward:
+        return [high + (diff * fib) for fib in FIB_VALUES]
+    return [low - (diff * fib) for fib in FIB_VALUES]
 
 
 def add_fib_ret_lvls(
     df: DataFrame[CryptoHistorical], trends_upward: bool
 ) -> DataFrame[CryptoHistorical]:
-    low, high = df["close"].min(), df["close"].max()
-    diff = high - low
-    if trends_upward:
-        vals = [high + (diff * fib) for fib in FIB_VALUES]
-    else:
-        vals = [low - (diff * fib) for fib in FIB_VALUES]
+    close = np.asarray(df["close"], dtype=float)
+    vals = get_fib_ret_lvls(close.min(), close.max(), trends_upward)
 
     for i, val in enumerate(vals):
         df[f"fib_{i}"] = val
@@ -24,18 +28,18 @@ def add_fib_ret_lvls(
 def add_boll_diff(
     df: DataFrame[CryptoHistorical], length: int
 ) -> DataFrame[CryptoHistorical]:
-    boll = ta.bbands(df["close"], length=length)
-    df["upper_bb"] = boll[f"BBU_{length}_2.0"]
-    df["lower_bb"] = boll[f"BBL_{length}_2.0"]
-    df["boll_diff"] = df["upper_bb"] - df["lower_bb"]
+    lower_bb, _, upper_bb = kernels.bbands(np.asarray(df["close"], dtype=float), length)
+    df["upper_bb"] = upper_bb
+    df["lower_bb"] = lower_bb
+    df["boll_diff"] = upper_bb - lower_bb
     return df
 
 
 def add_rsi(
     df: DataFrame[CryptoHistorical], length: int
 ) -> DataFrame[CryptoHistorical]:
-    df["rsi"] = ta.rsi(df["close"], length=length)
-    df["rsi"] = df["rsi"].fillna(50)
+    rsi = kernels.rsi(np.asarray(df["close"], dtype=float), length)
+    df["rsi"] = np.where(np.isnan(rsi), 50.0, rsi)
     return df
 
 
@@ -45,21 +49,30 @@ def add_trends_upwards(df: DataFrame[CryptoHistorical]) -> DataFrame[CryptoHisto
     return df
 
 
-def sma(df: DataFrame, col: str) -> DataFrame:
+def sma(df: DataFrame, col: str) -> Tuple[np.ndarray, np.ndarray]:
     n = len(df)
-    sma_50 = ta.sma(df[col], length=n // 2)
-    sma_200 = ta.sma(df[col], length=n)
+    values = np.asarray(df[col], dtype=float)
+    sma_50 = kernels.sma(values, n // 2)
+    sma_200 = kernels.sma(values, n)
     return sma_50, sma_200
 
 
 def add_super_trend(
     df: DataFrame[CryptoHistorical], atr_length: int, multiplier: float
 ) -> DataFrame:
-    df["atr"] = ta.atr(df["high"], df["low"], df["close"], length=atr_length)
-    super_trend = ta.supertrend(
-        df["high"], df["low"], df["close"], atr_length, multiplier
+    high, low, close = (
+        np.asarray(df[col], dtype=float) for col in ("high", "low", "close")
     )
-    super_trend = super_trend.fillna(method="bfill")
-    super_trend["SUPERT_14_3.0"].iloc[0] = super_trend["SUPERT_14_3.0"].iloc[1]
-    df = pd.concat([df, super_trend], axis=1)
+    df["atr"] = kernels.atr(high, low, close, atr_length)
+    trend, direction, long, short = kernels.supertrend(
+        high, low, close, atr_length, multiplier
+    )
+    trend, long, short = kernels.bfill(trend), kernels.bfill(long), kernels.bfill(short)
+    trend[0] = trend[1]
+
+    props = f"_{atr_length}_{float(multiplier)}"
+    df[f"SUPERT{props}"] = trend
+    df[f"SUPERTd{props}"] = direction
+    df[f"SUPERTl{props}"] = long
+    df[f"SUPERTs{props}"] = short
     return df
@@ -0,0 +1,267 @@
+import sys
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Tuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Array-in/array-out versions of the pandas_ta indicators used by the strategies.
+# Outputs line up with their inputs and hold NaN where pandas_ta would.
+
+
+def first_valid_index(values: np.ndarray) -> int:
+    is_valid = ~np.isnan(values)
+    return int(is_valid.argmax()) if is_valid.any() else len(values)
+
+
+def sma(close: np.ndarray, length: int) -> np.ndarray:
+    # Leading NaN values (e.g. from another indicator's warm-up) are skipped
+    out = np.full(len(close), np.nan)
+    first_valid = first_valid_index(close)
+    if len(close) - first_valid < length:
+        return out
+    valid = close[first_valid:]
+    # Summing offsets from the first value keeps the cumulative sum small
+    shift = valid[0]
+    cum_sum = np.cumsum(np.concatenate(([0.0], valid - shift)))
+    out[first_valid + length - 1 :] = (
+        cum_sum[length:] - cum_sum[:-length]
+    ) / length + shift
+    return out
+
+
+def bbands(
+    close: np.ndarray, length: int, std: float = 2.0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Mean and variance of each window from one cumulative sum of the values and
+    # their squares. Sums are restarted every block, offset from its first value,
+    # so they stay small enough for the variance to keep its precision.
+    lower, mid, upper = (np.full(len(close), np.nan) for _ in range(3))
+    first_valid = first_valid_index(close)
+    if len(close) - first_valid < length:
+        return lower, mid, upper
+    valid = close[first_valid:]
+    num_windows = len(valid) - length + 1
+
+    block = 2**12
+    mean, var = np.empty(num_windows), np.empty(num_windows)
+    sums = np.zeros((2, block + length))
+    for start in range(0, num_windows, block):
+        rows = valid[start : start + block + length - 1]
+        m, end = len(rows) - length + 1, len(rows) + 1
+        np.subtract(rows, rows[0], out=sums[0, 1:end])
+        np.square(sums[0, 1:end], out=sums[1, 1:end])
+        np.cumsum(sums[:, :end], axis=1, out=sums[:, :end])
+        window_sums = (sums[:, length : length + m] - sums[:, :m]) / length
+        mean[start : start + m] = window_sums[0] + rows[0]
+        var[start : start + m] = window_sums[1] - np.square(window_sums[0])
+    np.maximum(var, 0.0, out=var)
+
+    # Windows of one repeated value have no deviation at all, as in pandas_ta
+    maybe_flat = np.flatnonzero(var <= 1e-20 * np.square(mean))
+    if len(maybe_flat) > 0:
+        windows = sliding_window_view(valid, length)[maybe_flat]
+        var[maybe_flat[np.ptp(windows, axis=1) == 0]] = 0.0
+
+    deviations = std * np.sqrt(var)
+    mid[first_valid + length - 1 :] = mean
+    lower[first_valid + length - 1 :] = mean - deviations
+    upper[first_valid + length - 1 :] = mean + deviations
+    return lower, mid, upper
+
+
+def rma(values: np.ndarray, length: int) -> np.ndarray:
+    # Adjusted EWM with alpha = 1 / length and min_periods = length, skipping
+    # leading NaN values. The recursion is evaluated in blocks as scaled cumulative
+    # sums, with blocks small enough for decay ** -block to stay finite.
+    out = np.full(len(values), np.nan)
+    first_valid = first_valid_index(values)
+    if len(values) - first_valid < length:
+        return out
+    valid = values[first_valid:]
+    n = len(valid)
+
+    decay = 1 - 1 / length
+    if decay == 0:
+        out[first_valid:] = valid
+        return out
+
+    block = min(n, max(1, int(300 / -np.log(decay))))
+    inv_powers = decay ** -np.arange(block)
+    powers = decay ** np.arange(1, block + 1)
+    smoothed = np.empty(n)
+    weighted_sum, start_power = 0.0, 1.0
+    for start in range(0, n, block):
+        chunk = valid[start : start + block]
+        m = len(chunk)
+        weighted_sums = powers[:m] * (
+            weighted_sum + np.cumsum(chunk * inv_powers[:m]) / decay
+        )
+        weight_sums = (1 - start_power * powers[:m]) / (1 - decay)
+        smoothed[start : start + m] = weighted_sums / weight_sums
+        weighted_sum = weighted_sums[-1]
+        start_power *= powers[m - 1]
+
+    out[first_valid:] = smoothed
+    out[first_valid : first_valid + length - 1] = np.nan
+    return out
+
+
+def rsi(close: np.ndarray, length: int) -> np.ndarray:
+    if len(close) < length:
+        return np.full(len(close), np.nan)
+    diff = np.diff(close, prepend=np.nan)
+    positive_avg = rma(np.where(diff < 0, 0.0, diff), length)
+    negative_avg = rma(np.where(diff > 0, 0.0, diff), length)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100.0 * positive_avg / (positive_avg + np.abs(negative_avg))
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    high_low_range = high - low
+    if (high_low_range == 0).any():
+        high_low_range = high_low_range + sys.float_info.epsilon
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    out = np.fmax(
+        np.abs(high_low_range),
+        np.fmax(np.abs(high - prev_close), np.abs(prev_close - low)),
+    )
+    out[:1] = np.nan
+    return out
+
+
+def atr(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int
+) -> np.ndarray:
+    if len(close) < length:
+        return np.full(len(close), np.nan)
+    return rma(true_range(high, low, close), length)
+
+
+def supertrend(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    length: int,
+    multiplier: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Same recursion as ta.supertrend (including its placeholder 0 in the first
+    # trend row) over plain floats instead of pandas .iloc lookups. Each flip
+    # depends on bands ratcheted since the last one, so it stays a loop.
+    m = len(close)
+    hl2 = 0.5 * (high + low)
+    matr = multiplier * atr(high, low, close, length)
+    upper_band = (hl2 + matr).tolist()
+    lower_band = (hl2 - matr).tolist()
+    close_vals = close.tolist()
+
+    direction = [1] * m
+    trend = [0.0] * m
+    long, short = [np.nan] * m, [np.nan] * m
+    for i in range(1, m):
+        if close_vals[i] > upper_band[i - 1]:
+            direction[i] = 1
+        elif close_vals[i] < lower_band[i - 1]:
+            direction[i] = -1
+        else:
+            direction[i] = direction[i - 1]
+            if direction[i] > 0 and lower_band[i] < lower_band[i - 1]:
+                lower_band[i] = lower_band[i - 1]
+            if direction[i] < 0 and upper_band[i] > upper_band[i - 1]:
+                upper_band[i] = upper_band[i - 1]
+
+        if direction[i] > 0:
+            trend[i] = long[i] = lower_band[i]
+        else:
+            trend[i] = short[i] = upper_band[i]
+
+    return np.array(trend), np.array(direction), np.array(long), np.array(short)
+
+
+def bfill(values: np.ndarray) -> np.ndarray:
+    idx = np.where(np.isnan(values), len(values), np.arange(len(values)))
+    idx = np.minimum.accumulate(idx[::-1])[::-1]
+    return np.append(values, np.nan)[idx]
+
+
+def window_values(values: np.ndarray, ends: np.ndarray, length: int) -> np.ndarray:
+    return sliding_window_view(values, length)[ends - length + 1]
+
+
+def windowed_rsi(
+    close: np.ndarray, ends: np.ndarray, num_diffs: int, length: int
+) -> np.ndarray:
+    # RSI as `add_rsi` computes it on a window holding `num_diffs` price changes
+    # that ends at each of `ends`: the adjusted Wilder average only looks back
+    # to the start of the window, so it is a finite exponentially weighted sum.
+    if num_diffs < length:
+        return np.full(len(ends), 50.0)
+
+    diff = np.diff(close, prepend=close[0])
+    weights = (1 - 1 / length) ** np.arange(num_diffs)
+    gains = np.convolve(np.clip(diff, 0, None), weights)[ends]
+    losses = np.convolve(np.clip(-diff, 0, None), weights)[ends]
+    total = gains + losses
+    return np.divide(100 * gains, total, out=np.full(len(ends), 50.0), where=total != 0)
+
+
+def time_call(func: Callable, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def benchmark(
+    sizes: Iterable[int] = (50, 1_000, 100_000, 1_000_000),
+    length: int = 20,
+) -> Dict[Tuple[str, int], float]:
+    import pandas as pd
+    import pandas_ta as ta
+
+    speedups = {}
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        close = 0.1 * np.exp(np.cumsum(rng.normal(0, 0.003, size)))
+        spread = np.abs(rng.normal(0, 0.001, size)) * close
+        high, low = close + spread, close - spread
+        high_sr, low_sr, close_sr = pd.Series(high), pd.Series(low), pd.Series(close)
+        repeat = 1 if size >= 100_000 else 5
+
+        cases = {
+            "sma": (
+                lambda: ta.sma(close_sr, length=length),
+                lambda: sma(close, length),
+            ),
+            "bbands": (
+                lambda: ta.bbands(close_sr, length=length),
+                lambda: bbands(close, length),
+            ),
+            "rsi": (
+                lambda: ta.rsi(close_sr, length=length),
+                lambda: rsi(close, length),
+            ),
+            "atr": (
+                lambda: ta.atr(high_sr, low_sr, close_sr, length=14),
+                lambda: atr(high, low, close, 14),
+            ),
+            "supertrend": (
+                lambda: ta.supertrend(high_sr, low_sr, close_sr, 14, 3),
+                lambda: supertrend(high, low, close, 14, 3),
+            ),
+        }
+        for name, (ta_func, kernel_func) in cases.items():
+            ta_time = time_call(ta_func, repeat)
+            kernel_time = time_call(kernel_func, repeat)
+            speedups[(name, size)] = ta_time / kernel_time
+            print(
+                f"{name:>10} {size:>9} rows: pandas_ta {ta_time * 1e3:10.3f} ms, "
+                f"kernel {kernel_time * 1e3:10.3f} ms, {ta_time / kernel_time:8.1f}x"
+            )
+
+    return speedups
+
+
+if __name__ == "__main__":
+    benchmark()
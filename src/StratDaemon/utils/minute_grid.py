@@ -0,0 +1,108 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandera.typing import DataFrame
+from StratDaemon.models.crypto import CryptoHistorical
+
+SYNTHETIC_COLUMN = "synthetic"
+GRID_STEP = np.timedelta64(1, "m")
+
+
+def to_minute_grid(df: DataFrame[CryptoHistorical]) -> pd.DataFrame:
+    """
+    Every minute from the first bar to the last, with the minutes between bars
+    linearly interpolated and flagged in the `synthetic` column. Built once per
+    dataset, so backtests slice windows out of it by offset.
+    """
+    df = df.dropna().set_index("timestamp", drop=True)
+    grid = df.reindex(pd.date_range(df.index[0], df.index[-1], freq="1 min"))
+    synthetic = grid.isnull().any(axis=1).to_numpy()
+    grid = grid.interpolate(method="linear")
+    grid = grid.reset_index().rename(columns={"index": "timestamp"})
+    grid[SYNTHETIC_COLUMN] = synthetic
+    return grid
+
+
+def slice_minute_grid(
+    grid: pd.DataFrame, start_dt: datetime, end_dt: datetime
+) -> DataFrame[CryptoHistorical]:
+    # The minutes of [start_dt, end_dt] as gap filling that range alone would
+    # give them: minutes before its first bar and after its last one hold
+    # those bars' values instead of ones interpolated from outside the range
+    grid_start = grid["timestamp"].iloc[0].to_datetime64()
+    lo = int((np.datetime64(start_dt, "ns") - grid_start) // GRID_STEP)
+    hi = int((np.datetime64(end_dt, "ns") - grid_start) // GRID_STEP) + 1
+
+    offsets = np.arange(lo, hi)
+    idxs = np.clip(offsets, 0, len(grid) - 1)
+    is_bar = (offsets == idxs) & ~grid[SYNTHETIC_COLUMN].to_numpy()[idxs]
+    bar_idxs = np.flatnonzero(is_bar)
+    assert len(bar_idxs) > 0, f"No bars from {start_dt} to {end_dt}"
+
+    first, last = bar_idxs[0], bar_idxs[-1]
+    if first == 0 and last == len(offsets) - 1:
+        window = grid.iloc[lo:hi]
+    else:
+        idxs[:first] = idxs[first]
+        idxs[last + 1 :] = idxs[last]
+        window = grid.take(idxs)
+        window["timestamp"] = grid_start + offsets * GRID_STEP
+    return window.drop(columns=SYNTHETIC_COLUMN).reset_index(drop=True)
+
+
+class MinuteGridStream:
+    """
+    `slice_minute_grid(to_minute_grid(df), start_dt, end_dt)` built from the
+    bars of `df` handed over in time-ordered chunks. Each `push` returns the
+    minutes up to the chunk's last bar in the range (None if it has none) and
+    `close` the ones after the last bar, so only that bar is kept between
+    chunks to interpolate from.
+    """
+
+    def __init__(self, start_dt: datetime, end_dt: datetime) -> None:
+        self.start_dt = start_dt
+        self.end_dt = end_dt
+        self.grid_start: np.datetime64 | None = None
+        self.last_bar: pd.DataFrame | None = None
+
+    def get_offset(self, dt: datetime) -> int:
+        return int((np.datetime64(dt, "ns") - self.grid_start) // GRID_STEP)
+
+    def fill_edge(self, bar: pd.DataFrame, lo: int, hi: int) -> pd.DataFrame:
+        # Minutes [lo, hi) holding the values of `bar`
+        edge = bar.take(np.zeros(max(hi - lo, 0), dtype=int))
+        edge["timestamp"] = self.grid_start + np.arange(lo, hi) * GRID_STEP
+        return edge
+
+    def push(
+        self, df: DataFrame[CryptoHistorical]
+    ) -> DataFrame[CryptoHistorical] | None:
+        df = df.dropna()
+        if self.grid_start is None and len(df) > 0:
+            self.grid_start = df["timestamp"].iloc[0].to_datetime64()
+        bars = df[(df["timestamp"] >= self.start_dt) & (df["timestamp"] <= self.end_dt)]
+        if len(bars) == 0:
+            return None
+
+        first_bar = self.last_bar
+        if first_bar is not None:
+            bars = pd.concat([first_bar, bars])
+        self.last_bar = bars.iloc[-1:]
+        grid = to_minute_grid(bars).drop(columns=SYNTHETIC_COLUMN)
+
+        if first_bar is not None:
+            # The carried bar's minute was returned with the previous chunk
+            return grid.iloc[1:].reset_index(drop=True)
+        lo = self.get_offset(self.start_dt)
+        hi = self.get_offset(bars["timestamp"].iloc[0])
+        edge = self.fill_edge(grid.iloc[:1], lo, hi)
+        return pd.concat([edge, grid], ignore_index=True)
+
+    def close(self) -> DataFrame[CryptoHistorical]:
+        assert (
+            self.last_bar is not None
+        ), f"No bars from {self.start_dt} to {self.end_dt}"
+        bar = to_minute_grid(self.last_bar).drop(columns=SYNTHETIC_COLUMN)
+        lo = self.get_offset(bar["timestamp"].iloc[0]) + 1
+        hi = self.get_offset(self.end_dt) + 1
+        return self.fill_edge(bar, lo, hi).reset_index(drop=True)
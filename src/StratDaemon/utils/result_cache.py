@@ -0,0 +1,166 @@
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+from threading import Lock
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from pandera.typing import DataFrame
+from pydantic import BaseModel
+from StratDaemon.models.crypto import CryptoHistorical, CryptoOrder
+from StratDaemon.portfolio.history import PortfolioHistory
+from StratDaemon.portfolio.metrics import PerformanceMetrics
+from StratDaemon.utils.constants import BACKTEST_RESULT_CACHE_PATH
+from StratDaemon.utils.funcs import Parameters
+
+# Seconds a process waits for another one to finish writing
+RESULT_CACHE_TIMEOUT = 60
+# Bumped when backtests of the same inputs change, so older results are not reused
+RESULT_VERSION = 5
+
+
+class ResultKey(BaseModel, frozen=True):
+    strategy: str
+    params: Parameters
+    currency_codes: Tuple[str, ...]
+    buy_power: float
+    max_amount_per_order: float
+    max_holding_per_currency: float
+    start_dt: datetime | None = None
+    end_dt: datetime | None = None
+    prev_holdings: Tuple[CryptoOrder, ...] = ()
+    data_hash: str
+    version: int = RESULT_VERSION
+
+    def get_digest(self) -> str:
+        return hashlib.sha256(self.model_dump_json().encode()).hexdigest()
+
+
+class BacktestResult(BaseModel):
+    value: float
+    buy_power: float
+    holdings: List[CryptoOrder]
+    num_buy_trades: int
+    num_sell_trades: int
+    metrics: PerformanceMetrics = PerformanceMetrics()
+
+    @property
+    def num_trades(self) -> int:
+        return self.num_buy_trades + self.num_sell_trades
+
+    @classmethod
+    def from_run(
+        cls,
+        portfolio_hist: PortfolioHistory,
+        num_buy_trades: int,
+        num_sell_trades: int,
+        metrics: PerformanceMetrics,
+    ) -> "BacktestResult":
+        # Only the last snapshot is kept, so the history's spill file is closed
+        last_portfolio = portfolio_hist[-1]
+        portfolio_hist.close()
+        return cls(
+            value=last_portfolio.value,
+            buy_power=last_portfolio.buy_power,
+            holdings=last_portfolio.holdings,
+            num_buy_trades=num_buy_trades,
+            num_sell_trades=num_sell_trades,
+            metrics=metrics,
+        )
+
+
+def hash_data_dfs(
+    dfs: List[DataFrame[CryptoHistorical]],
+    start_dt: datetime | None = None,
+    end_dt: datetime | None = None,
+) -> str:
+    data_hash = hashlib.sha1()
+    for df in dfs:
+        timestamps = df["timestamp"].to_numpy("datetime64[ns]")
+        mask = np.ones(len(df), dtype=bool)
+        if start_dt is not None:
+            mask &= timestamps >= np.datetime64(start_dt, "ns")
+        if end_dt is not None:
+            mask &= timestamps <= np.datetime64(end_dt, "ns")
+        data_hash.update(np.ascontiguousarray(timestamps[mask]).tobytes())
+        for col in ("open", "high", "low", "close", "volume"):
+            data_hash.update(df[col].to_numpy(np.float64)[mask].tobytes())
+    return data_hash.hexdigest()
+
+
+class ResultCache:
+    """
+    Backtest results persisted in a local SQLite database, keyed by a digest of
+    `ResultKey`. SQLite's locking lets several tuning processes share the file;
+    a result computed twice concurrently is simply written twice.
+    """
+
+    def __init__(self, path: str = BACKTEST_RESULT_CACHE_PATH) -> None:
+        self.path = path
+        self.conn: sqlite3.Connection | None = None
+        self.pid: int | None = None
+        self.num_hits = self.num_misses = 0
+        self.lock = Lock()
+
+    def get_conn(self) -> sqlite3.Connection:
+        # Connections cannot be shared with forked processes, so each process
+        # opens its own
+        if self.conn is None or self.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(
+                self.path, timeout=RESULT_CACHE_TIMEOUT, check_same_thread=False
+            )
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, result TEXT NOT NULL)"
+            )
+            self.pid = os.getpid()
+        return self.conn
+
+    def get(self, key: ResultKey) -> BacktestResult | None:
+        with self.lock:
+            row = (
+                self.get_conn()
+                .execute(
+                    "SELECT result FROM results WHERE key = ?", (key.get_digest(),)
+                )
+                .fetchone()
+            )
+            if row is None:
+                self.num_misses += 1
+                return None
+            self.num_hits += 1
+        return BacktestResult.model_validate_json(row[0])
+
+    def put(self, key: ResultKey, result: BacktestResult) -> None:
+        with self.lock:
+            conn = self.get_conn()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, result) VALUES (?, ?)",
+                    (key.get_digest(), result.model_dump_json()),
+                )
+
+    def get_or_run(
+        self, key: ResultKey, run: Callable[[], BacktestResult]
+    ) -> BacktestResult:
+        result = self.get(key)
+        if result is not None:
+            return result
+
+        result = run()
+        self.put(key, result)
+        return result
+
+    def clear(self) -> None:
+        with self.lock:
+            conn = self.get_conn()
+            with conn:
+                conn.execute("DELETE FROM results")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"hits": self.num_hits, "misses": self.num_misses}
+
+
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,77 @@
+from multiprocessing.shared_memory import SharedMemory
+from typing import List
+import numpy as np
+import pandas as pd
+from pandera.typing import DataFrame
+from pydantic import BaseModel
+from StratDaemon.models.crypto import CryptoHistorical
+from StratDaemon.utils.constants import BAR_COLUMNS
+
+
+class SharedFramesSpec(BaseModel):
+    name: str
+    num_frames: int
+    num_rows: int
+
+
+class SharedFrames:
+    """
+    Aligned OHLCV frames copied once into a shared memory block. Other processes
+    attach to the block by name and get DataFrames that view it, so the bars are
+    neither pickled nor reloaded per process.
+    """
+
+    def __init__(self, shm: SharedMemory, num_frames: int, num_rows: int) -> None:
+        self.shm = shm
+        self.spec = SharedFramesSpec(
+            name=shm.name, num_frames=num_frames, num_rows=num_rows
+        )
+        self.values = np.ndarray(
+            (num_frames, len(BAR_COLUMNS), num_rows), dtype=np.float64, buffer=shm.buf
+        )
+        self.timestamps = np.ndarray(
+            (num_rows,),
+            dtype="datetime64[ns]",
+            buffer=shm.buf,
+            offset=self.values.nbytes,
+        )
+
+    @classmethod
+    def create(cls, dfs: List[DataFrame[CryptoHistorical]]) -> "SharedFrames":
+        num_rows = len(dfs[0])
+        timestamps = dfs[0]["timestamp"].to_numpy("datetime64[ns]")
+        assert all(
+            np.array_equal(df["timestamp"].to_numpy("datetime64[ns]"), timestamps)
+            for df in dfs
+        ), "Shared frames must be aligned on the same timestamps"
+
+        num_bytes = (len(dfs) * len(BAR_COLUMNS) + 1) * max(num_rows, 1) * 8
+        shared = cls(SharedMemory(create=True, size=num_bytes), len(dfs), num_rows)
+        for i, df in enumerate(dfs):
+            shared.values[i] = df[BAR_COLUMNS].to_numpy(np.float64).T
+        shared.timestamps[:] = timestamps
+        return shared
+
+    @classmethod
+    def attach(cls, spec: SharedFramesSpec) -> "SharedFrames":
+        # Meant for child processes of the creator, which share its resource
+        # tracker, so the block is still unlinked only once by the creator
+        shared = cls(SharedMemory(name=spec.name), spec.num_frames, spec.num_rows)
+        shared.values.flags.writeable = False
+        shared.timestamps.flags.writeable = False
+        return shared
+
+    def get_dfs(self) -> List[DataFrame[CryptoHistorical]]:
+        dfs = []
+        for values in self.values:
+            df = pd.DataFrame(values.T, columns=BAR_COLUMNS, copy=False)
+            df.insert(0, "timestamp", self.timestamps)
+            dfs.append(df)
+        return dfs
+
+    def close(self) -> None:
+        self.values = self.timestamps = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
@@ -0,0 +1,97 @@
+from typing import Any, Dict, List
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from pandera.typing import DataFrame
+from StratDaemon.models.crypto import CryptoHistorical
+
+
+class WindowFrame:
+    """
+    Window of bars that views a read-only `SlidingWindows` buffer. Columns are
+    NumPy arrays, and columns set on the window are kept alongside the bars.
+    The strategies read it as it is; `to_frame` materializes everything as one
+    DataFrame for consumers that need one.
+    """
+
+    def __init__(
+        self, columns: List[str], values: np.ndarray, timestamps: np.ndarray
+    ) -> None:
+        self.columns = columns
+        self.col_idxs = {col: i for i, col in enumerate(columns)}
+        self.values = values
+        self.timestamps = timestamps
+        self.extra_cols: Dict[str, np.ndarray | float] = {}
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, col: str) -> np.ndarray | float:
+        if col == "timestamp":
+            return self.timestamps
+        if col in self.col_idxs:
+            return self.values[self.col_idxs[col]]
+        return self.extra_cols[col]
+
+    def __setitem__(self, col: str, values: np.ndarray | float) -> None:
+        assert (
+            col != "timestamp" and col not in self.col_idxs
+        ), f"Bar column {col} is read-only"
+        self.extra_cols[col] = values
+
+    def get_last_row(self) -> Dict[str, Any]:
+        row: Dict[str, Any] = {"timestamp": pd.Timestamp(self.timestamps[-1])}
+        row.update(zip(self.columns, self.values[:, -1]))
+        for col, values in self.extra_cols.items():
+            row[col] = values if np.ndim(values) == 0 else values[-1]
+        return row
+
+    def to_frame(self) -> DataFrame[CryptoHistorical]:
+        cols = {"timestamp": self.timestamps}
+        cols.update(zip(self.columns, self.values))
+        cols.update(self.extra_cols)
+        return pd.DataFrame(cols)
+
+
+class SlidingWindows:
+    """
+    Windows of `span` bars over one contiguous column-major buffer per frame,
+    handed out as strided views without copying.
+    """
+
+    def __init__(self, df: DataFrame[CryptoHistorical], span: int) -> None:
+        self.span = span
+        self.columns = [col for col in df.columns if col != "timestamp"]
+        self.values = np.ascontiguousarray(df[self.columns].to_numpy(float).T)
+        self.timestamps = df["timestamp"].to_numpy()
+        self.values.flags.writeable = False
+        self.timestamps.flags.writeable = False
+        self.value_windows = sliding_window_view(self.values, span, axis=1)
+        self.timestamp_windows = sliding_window_view(self.timestamps, span)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def get_window(self, end: int) -> WindowFrame:
+        start = end - self.span + 1
+        assert 0 <= start and end < len(
+            self
+        ), f"Window ending at {end} is out of bounds for {len(self)} bars"
+        return WindowFrame(
+            self.columns,
+            self.value_windows[:, start],
+            self.timestamp_windows[start],
+        )
+
+
+def to_frame(
+    df: DataFrame[CryptoHistorical] | WindowFrame,
+) -> DataFrame[CryptoHistorical]:
+    return df.to_frame() if isinstance(df, WindowFrame) else df
+
+
+def get_last_row(df: DataFrame[CryptoHistorical] | WindowFrame) -> Dict[str, Any]:
+    # The last bar with its indicators, by column
+    if isinstance(df, WindowFrame):
+        return df.get_last_row()
+    return df.iloc[-1].to_dict()
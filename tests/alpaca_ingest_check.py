@@ -0,0 +1,193 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from alpaca.data.models import Bar
+from alpaca.data.requests import CryptoBarsRequest
+from alpaca.data.timeframe import TimeFrame
+from StratDaemon.integration.broker.alpaca import AlpacaBroker
+from StratDaemon.integration.db.alpaca import AlpacaMarketstoreDB
+from StratDaemon.integration.db.bar_store import ColumnarBarStore
+from StratDaemon.integration.db.coverage import CoverageIndex
+
+SYMBOL = "DOGE/USD"
+START_DT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+NUM_DAYS = 20
+REQUEST_LATENCY = 0.05  # Seconds the fake Alpaca API takes per request
+WRITE_LATENCY = 0.05  # Seconds the fake marketstore takes per write
+
+
+class FakeBarSet:
+    def __init__(self, data: Dict[str, List[Bar]]) -> None:
+        self.data = data
+
+
+class FakeDataClient:
+    # Serves one-minute bars for every minute of the requested dates
+    def __init__(self) -> None:
+        rng = np.random.default_rng(0)
+        self.bars: Dict[datetime, List[Bar]] = dict()
+        for day in range(NUM_DAYS):
+            day_dt = (START_DT + timedelta(days=day)).replace(tzinfo=None)
+            self.bars[day_dt] = [
+                Bar(
+                    SYMBOL,
+                    {
+                        "t": START_DT + timedelta(days=day, minutes=minute),
+                        "o": close,
+                        "h": close * 1.01,
+                        "l": close * 0.99,
+                        "c": close,
+                        "v": 100.0,
+                        "n": 3,
+                        "vw": close,
+                    },
+                )
+                for minute, close in enumerate(rng.uniform(0.1, 0.2, 24 * 60))
+            ]
+
+    def get_crypto_bars(self, request_params: CryptoBarsRequest) -> FakeBarSet:
+        time.sleep(REQUEST_LATENCY)
+        data = []
+        day_dt = request_params.start
+        while day_dt < request_params.end:
+            data.extend(self.bars.get(day_dt, []))
+            day_dt += timedelta(days=1)
+        return FakeBarSet({SYMBOL: data})
+
+
+class FakeResult:
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.data = df
+
+    def first(self) -> "FakeResult":
+        return self
+
+    def df(self) -> pd.DataFrame:
+        return self.data
+
+
+class FakeMarketstoreClient:
+    def __init__(self) -> None:
+        self.writes: List[np.ndarray] = []
+
+    def list_symbols(self) -> List[str]:
+        return []
+
+    def write(self, data: np.ndarray, tbk: str, isvariablelength: bool) -> dict:
+        time.sleep(WRITE_LATENCY)
+        self.writes.append(data)
+        return {"responses": None}
+
+    def query(self, params) -> FakeResult:
+        data = np.concatenate(self.writes)
+        df = pd.DataFrame(data).drop_duplicates("Epoch").sort_values("Epoch")
+        df.index = pd.to_datetime(df.pop("Epoch"), unit="s", utc=True)
+        df.index.name = "Epoch"
+        return FakeResult(df)
+
+
+def create_broker(**kwargs) -> AlpacaBroker:
+    return AlpacaBroker(
+        client=FakeDataClient(),
+        db=AlpacaMarketstoreDB(
+            coverage_index=CoverageIndex(
+                os.path.join(tempfile.mkdtemp(), "coverage.json")
+            ),
+            pym_cli=FakeMarketstoreClient(),
+        ),
+        **kwargs,
+    )
+
+
+def ingest_serially(broker: AlpacaBroker, dt_pairs) -> float:
+    # One request, one per-bar `model_dump` conversion and one write per range
+    start_time = time.perf_counter()
+    num_bars = 0
+    for start, end in dt_pairs:
+        bars = broker.client.get_crypto_bars(
+            CryptoBarsRequest(
+                symbol_or_symbols=[SYMBOL],
+                timeframe=TimeFrame.Minute,
+                start=start.strftime("%Y-%m-%d"),
+                end=end.strftime("%Y-%m-%d"),
+            )
+        )
+        df = pd.DataFrame([d.model_dump() for d in bars.data[SYMBOL]])
+        broker.db.update_ticker_data("DOGE", df)
+        num_bars += len(df)
+    return num_bars / (time.perf_counter() - start_time)
+
+
+def test_alpaca_ingest():
+    end_dt = START_DT + timedelta(days=NUM_DAYS)
+    # One range per missing day
+    dt_pairs = [
+        (
+            START_DT.date() + timedelta(days=day),
+            START_DT.date() + timedelta(days=day + 1),
+        )
+        for day in range(NUM_DAYS)
+    ]
+
+    serial_broker = create_broker(max_requests_per_second=1_000)
+    serial = ingest_serially(serial_broker, dt_pairs)
+
+    broker = create_broker(max_requests_per_second=1_000)
+    assert broker.db.check_data_availability("DOGE", START_DT, end_dt) == [
+        (START_DT.date(), end_dt.date() + timedelta(days=1))
+    ]
+    pipelined = broker.ingest(SYMBOL, dt_pairs)
+    assert pipelined > serial
+    writes = broker.db.pym_cli.writes
+    assert len(writes) == 1, "Bars were not batched into one write"
+
+    # The columnar conversion writes the same records as `model_dump`
+    serial_data = np.concatenate(serial_broker.db.pym_cli.writes)
+    assert writes[0].dtype == serial_data.dtype
+    assert np.array_equal(np.sort(writes[0], order="Epoch"), serial_data)
+
+    assert (
+        broker.db.check_data_availability(
+            "DOGE", START_DT, end_dt - timedelta(minutes=1)
+        )
+        == []
+    )
+    df = broker.get_crypto_historical("DOGE", "minute")
+    assert len(df) == NUM_DAYS * 24 * 60
+
+    # Bars pulled by a broker without the bar store reach it on the next read
+    broker = create_broker(max_requests_per_second=1_000)
+    store_broker = AlpacaBroker(
+        client=broker.client,
+        db=broker.db,
+        bar_store=ColumnarBarStore(tempfile.mkdtemp()),
+    )
+    broker.ingest(SYMBOL, dt_pairs[: NUM_DAYS // 2])
+    assert len(store_broker.get_crypto_historical("DOGE", "minute")) == len(df) // 2
+    broker.ingest(SYMBOL, dt_pairs[NUM_DAYS // 2 :])
+    store_df = store_broker.get_crypto_historical("DOGE", "minute")
+    assert store_df.equals(df[store_df.columns])
+
+    # Small batches split the writes, and the rate limit bounds the requests
+    broker = create_broker(max_requests_per_second=1_000, write_batch_size=5_000)
+    broker.ingest(SYMBOL, dt_pairs)
+    assert len(broker.db.pym_cli.writes) == NUM_DAYS * 24 * 60 // 5_760
+
+    rate_limit = 10
+    broker = create_broker(max_requests_per_second=rate_limit)
+    start_time = time.perf_counter()
+    broker.ingest(SYMBOL, dt_pairs)
+    assert time.perf_counter() - start_time >= (len(dt_pairs) - 1) / rate_limit
+
+    print(
+        f"Ingested {NUM_DAYS} days at {pipelined:,.0f} bars/sec pipelined vs "
+        f"{serial:,.0f} bars/sec serially"
+    )
+
+
+if __name__ == "__main__":
+    test_alpaca_ingest()
@@ -1,23 +1,45 @@
 from datetime import datetime, timedelta, timezone
-from typing import Generator, List, Dict, Tuple
+from typing import Callable, Generator, Iterable, List, Dict, Tuple
 from devtools import pprint
 import optuna
 import pandas as pd
 from pydantic import BaseModel
 from tqdm import tqdm
 from StratDaemon.integration.broker.alpaca import AlpacaBroker
+from StratDaemon.integration.broker.base import INTERVAL_DELTAS
+from StratDaemon.integration.db.bar_store import ColumnarBarStore
 from StratDaemon.models.crypto import CryptoHistorical, CryptoOrder, Portfolio
 from StratDaemon.portfolio.graph_positions import GraphHandler
+from StratDaemon.portfolio.history import PortfolioHistory
+from StratDaemon.portfolio.metrics import PerformanceMetrics
 from StratDaemon.strats.base import BaseStrategy
 from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
+from StratDaemon.utils.alignment import ALIGN_INTERSECTION, AlignedBars
 from pandera.typing import DataFrame
 import os
 import numpy as np
 from collections import defaultdict
+from StratDaemon.utils.constants import ALPACA_DATA_SOURCE, BAR_STORE_PATH
+from StratDaemon.utils.dataset_cache import DATASET_CACHE, DatasetKey
 from StratDaemon.utils.funcs import Parameters, load_best_study_parameters
-
-DEFAULT_BROKER = AlpacaBroker()
+from StratDaemon.utils.minute_grid import (
+    MinuteGridStream,
+    slice_minute_grid,
+    to_minute_grid,
+)
+from StratDaemon.utils.result_cache import (
+    RESULT_CACHE,
+    BacktestResult,
+    ResultKey,
+    hash_data_dfs,
+)
+from StratDaemon.utils.windows import SlidingWindows, WindowFrame
+
+DEFAULT_BROKER = AlpacaBroker(
+    bar_store=ColumnarBarStore(os.path.join(BAR_STORE_PATH, ALPACA_DATA_SOURCE))
+)
 TIMEFRAME = "hour"
+PROGRESS_FREQ = 100  # in ticks
 
 
 class BackTester:
@@ -28,63 +50,42 @@ class BackTester:
         buy_power: float,
         span: int = 30,
         wait_time: int = 5,
+        all_data_dfs: List[DataFrame[CryptoHistorical]] | None = None,
+        start_dt: datetime | None = None,
+        end_dt: datetime | None = None,
+        chunk_size: timedelta | None = None,
     ) -> None:
         self.strat = strat
         self.broker = DEFAULT_BROKER
         self.currency_codes = currency_codes
         strat_split = self.strat.name.split("_")
         self.strat_name = f"{strat_split[0]}_{strat_split[-1]}"
-        self.all_data_dfs = [
-            self.convert_to_timeframe(
-                self.broker.get_crypto_historical(
-                    currency_code, "minute", pull_from_api=False
-                ),
-                TIMEFRAME,
-            )
-            for currency_code in self.currency_codes
-        ]
-        self.ensure_data_dfs_consistent()
+        self.dataset_key: DatasetKey | None = None
+        # With a `chunk_size`, bars are read and gap filled that much time at
+        # a time while the backtest runs, rather than all held in memory
+        self.chunk_size = chunk_size
+        self.all_data_dfs: List[DataFrame[CryptoHistorical]] | None = None
+        if all_data_dfs is not None:
+            self.all_data_dfs = align_data_dfs(all_data_dfs)
+        elif chunk_size is None:
+            # Only the bars between `start_dt` and `end_dt` are loaded
+            self.dataset_key = get_dataset_key(currency_codes, start_dt, end_dt)
+            self.all_data_dfs = load_data_dfs(currency_codes, start_dt, end_dt)
+        self.grid_dfs: List[DataFrame[CryptoHistorical]] | None = None
+        self.last_closes: Dict[str, float] = {}
         self.span = span
         self.wait_time = wait_time
         self.buy_power = buy_power
         self.sanity_checks()
 
-    def convert_to_timeframe(
-        self, df: DataFrame[CryptoHistorical], timeframe: str
-    ) -> DataFrame[CryptoHistorical]:
-        if timeframe == "minute":
-            return df
-        else:
-            df_grp = df.groupby(
-                pd.Grouper(key="timestamp", freq=timeframe[0].upper())
-            ).agg(
-                {
-                    "open": "first",
-                    "high": "max",
-                    "low": "min",
-                    "close": "last",
-                    "volume": "sum",
-                }
-            )
-            return df_grp.reset_index()
-
     def sanity_checks(self) -> None:
-        assert len(self.currency_codes) == len(
+        assert self.all_data_dfs is None or len(self.currency_codes) == len(
             self.all_data_dfs
         ), "Currency codes and data must be of the same length"
 
-    def ensure_data_dfs_consistent(self) -> None:
-        dates = self.all_data_dfs[0].timestamp
-        for df in self.all_data_dfs[1:]:
-            cur_dates = df.timestamp
-            dates = np.intersect1d(dates, cur_dates)
-
-        for i, df in enumerate(self.all_data_dfs):
-            self.all_data_dfs[i] = df[df.timestamp.isin(dates)]
-
     def save_portfolio(
         self,
-        portfolio_hist: List[Portfolio],
+        portfolio_hist: PortfolioHistory,
         num_buy_trades: int,
         num_sell_trades: int,
         transactions: List[CryptoOrder],
@@ -158,55 +159,90 @@ class BackTester:
         save_graph: bool = False,
         debug: bool = False,
         prev_holdings: List[CryptoOrder] | None = None,
-    ) -> Tuple[List[Portfolio], int, int]:
+        vectorized: bool = False,
+        progress_callback: Callable[[int, int, float], None] | None = None,
+        progress_freq: int = PROGRESS_FREQ,
+        dt_features: Dict[str, Dict[str, np.ndarray]] | None = None,
+    ) -> Tuple[PortfolioHistory, int, int, PerformanceMetrics]:
         print(f"Starting with ${self.buy_power}")
         transactions: List[CryptoOrder] = []
 
         if prev_holdings is not None:
-            self.strat.portfolio_mgr.portfolio_hist[-1].holdings.extend(prev_holdings)
+            self.strat.portfolio_mgr.add_holdings(prev_holdings)
 
-        if start_dt is None and end_dt is None:
-            start_dt, end_dt = (
-                self.all_data_dfs[0].iloc[0].timestamp,
-                self.all_data_dfs[0].iloc[-1].timestamp,
-            )
+        start_dt, end_dt = self.get_time_range(start_dt, end_dt)
         print(f"Testing from {start_dt} to {end_dt}")
         total_time = (end_dt - start_dt).total_seconds() / 60
         total_time_tqdm = int((total_time - self.span) / self.wait_time) + 1
 
-        for dfs in tqdm(
-            self.get_data_by_interval(start_dt, end_dt, self.span, self.wait_time),
-            desc=f"Backtesting {'|'.join(self.currency_codes)} cryptos with {self.strat_name} strategy",
-            total=total_time_tqdm,
-        ):
-            assert all(
-                len(df) == len(dfs[0]) == self.span for df in dfs
-            ), f"All dataframes must have the same length as the span: {[len(df) for df in dfs]}"
-
-            input_dt_dfs = {
-                currency_code: df for currency_code, df in zip(self.currency_codes, dfs)
-            }
-            orders = self.strat.execute(
-                input_dt_dfs, print_orders=debug, save_positions=False
+        # Reports the portfolio value after the first `tick + 1` ticks, and may
+        # raise to stop the backtest early
+        def report_progress(tick: int, cur_prices_dt: Dict[str, float]) -> None:
+            progress_callback(
+                tick + 1,
+                total_time_tqdm,
+                self.strat.portfolio_mgr.calculate_portfolio_value(cur_prices_dt),
             )
-            transactions.extend(orders)
 
-        prev_portfolio = self.strat.portfolio_mgr.portfolio_hist[-1]
+        assert (
+            self.chunk_size is None or dt_features is None
+        ), "Features cannot be passed to a backtest run in chunks"
+
+        if vectorized:
+            for dt_closes, timestamps, ends, first_tick in self.get_vectorized_chunks(
+                start_dt, end_dt
+            ):
+                transactions.extend(
+                    self.strat.execute_vectorized(
+                        dt_closes,
+                        timestamps,
+                        ends,
+                        self.span,
+                        report_progress if progress_callback is not None else None,
+                        progress_freq,
+                        dt_features,
+                        first_tick,
+                    )
+                )
+        else:
+            for tick, dfs in enumerate(
+                tqdm(
+                    self.get_windows(start_dt, end_dt),
+                    desc=f"Backtesting {'|'.join(self.currency_codes)} cryptos with {self.strat_name} strategy",
+                    total=total_time_tqdm,
+                )
+            ):
+                assert all(
+                    len(df) == len(dfs[0]) == self.span for df in dfs
+                ), f"All dataframes must have the same length as the span: {[len(df) for df in dfs]}"
+
+                input_dt_dfs = {
+                    currency_code: df
+                    for currency_code, df in zip(self.currency_codes, dfs)
+                }
+                orders = self.strat.execute(
+                    input_dt_dfs, print_orders=debug, save_positions=False
+                )
+                transactions.extend(orders)
+
+                if progress_callback is not None and (tick + 1) % progress_freq == 0:
+                    report_progress(
+                        tick,
+                        {
+                            currency_code: df["close"][-1]
+                            for currency_code, df in input_dt_dfs.items()
+                        },
+                    )
+
+        portfolio_mgr = self.strat.portfolio_mgr
+        cur_prices_dt = self.get_last_closes()
         cur_portfolio = Portfolio(
             timestamp=datetime.now(),
-            value=prev_portfolio.value,
-            buy_power=prev_portfolio.buy_power,
-            holdings=prev_portfolio.holdings,
-        )
-        cur_prices_dt = {
-            currency_code: self.all_data_dfs[idx].iloc[-1].close
-            for idx, currency_code in enumerate(self.currency_codes)
-        }
-        cur_portfolio.value = self.strat.portfolio_mgr.calculate_portfolio_value(
-            cur_portfolio,
-            cur_prices_dt,
+            value=portfolio_mgr.calculate_portfolio_value(cur_prices_dt),
+            buy_power=portfolio_mgr.buy_power,
+            holdings=portfolio_mgr.get_holdings(),
         )
-        self.strat.portfolio_mgr.portfolio_hist.append(cur_portfolio)
+        portfolio_mgr.portfolio_hist.append(cur_portfolio)
 
         num_buy_trades = self.strat.portfolio_mgr.num_buy_trades
         num_sell_trades = self.strat.portfolio_mgr.num_sell_trades
@@ -231,6 +267,11 @@ class BackTester:
         print(f"Buy power left: ${cur_portfolio.buy_power}")
         self.print_agg_holdings(cur_portfolio.holdings, cur_prices_dt)
         portfolio_hist = self.strat.portfolio_mgr.portfolio_hist
+        metrics = portfolio_mgr.metrics.get_results()
+        print(
+            f"Max drawdown: {metrics.max_drawdown:.2%}, Sharpe ratio per tick: "
+            f"{metrics.sharpe_ratio:.4f}, time in market: {metrics.time_in_market:.2%}"
+        )
 
         if save_data:
             print("Saving portfolio data. This may take a while...")
@@ -245,35 +286,272 @@ class BackTester:
             portfolio_hist,
             num_buy_trades,
             num_sell_trades,
+            metrics,
         )
 
+    def get_time_range(
+        self, start_dt: datetime | None, end_dt: datetime | None
+    ) -> Tuple[datetime, datetime]:
+        if start_dt is None and end_dt is None:
+            assert (
+                self.all_data_dfs is not None
+            ), "Backtests run in chunks need a time range"
+            return (
+                self.all_data_dfs[0].iloc[0].timestamp,
+                self.all_data_dfs[0].iloc[-1].timestamp,
+            )
+        return start_dt, end_dt
+
+    def get_last_closes(self) -> Dict[str, float]:
+        if self.all_data_dfs is None:
+            return self.last_closes.copy()
+        return {
+            currency_code: self.all_data_dfs[idx].iloc[-1].close
+            for idx, currency_code in enumerate(self.currency_codes)
+        }
+
+    def get_vectorized_chunks(
+        self, start_dt: datetime, end_dt: datetime
+    ) -> Iterable[Tuple[Dict[str, np.ndarray], pd.Series, np.ndarray, int]]:
+        if self.chunk_size is None:
+            return [(*self.get_vectorized_inputs(start_dt, end_dt), 0)]
+        return (
+            (
+                {
+                    currency_code: df.close.to_numpy()
+                    for currency_code, df in zip(self.currency_codes, dfs)
+                },
+                dfs[0].timestamp,
+                ends,
+                first_tick,
+            )
+            for dfs, ends, first_tick in self.get_data_by_chunk(
+                start_dt, end_dt, self.span, self.wait_time
+            )
+        )
+
+    def get_windows(
+        self, start_dt: datetime, end_dt: datetime
+    ) -> Generator[List[WindowFrame], None, None]:
+        if self.chunk_size is None:
+            yield from self.get_data_by_interval(
+                start_dt, end_dt, self.span, self.wait_time
+            )
+            return
+        for dfs, ends, _ in self.get_data_by_chunk(
+            start_dt, end_dt, self.span, self.wait_time
+        ):
+            windows = [SlidingWindows(df, self.span) for df in dfs]
+            for i in ends:
+                yield [window.get_window(i) for window in windows]
+
+    def get_vectorized_inputs(
+        self, start_dt: datetime, end_dt: datetime
+    ) -> Tuple[Dict[str, np.ndarray], pd.Series, np.ndarray]:
+        dfs = self.get_dense_data_dfs(start_dt, end_dt)
+        return (
+            {
+                currency_code: df.close.to_numpy()
+                for currency_code, df in zip(self.currency_codes, dfs)
+            },
+            dfs[0].timestamp,
+            np.arange(self.span, len(dfs[0]), self.wait_time),
+        )
+
+    def get_dense_data_dfs(
+        self, start_dt: datetime, end_dt: datetime
+    ) -> List[DataFrame[CryptoHistorical]]:
+        return [
+            slice_minute_grid(grid, start_dt, end_dt) for grid in self.get_grid_dfs()
+        ]
+
+    def get_grid_dfs(self) -> List[DataFrame[CryptoHistorical]]:
+        # Gaps are filled once per dataset rather than for every backtest
+        if self.grid_dfs is None:
+            if self.dataset_key is None:
+                self.grid_dfs = self.fill_data_dfs()
+            else:
+                self.grid_dfs = DATASET_CACHE.get_or_load(
+                    self.dataset_key.model_copy(update={"gap_filled": True}),
+                    self.fill_data_dfs,
+                )
+        return self.grid_dfs
+
+    def fill_data_dfs(self) -> List[DataFrame[CryptoHistorical]]:
+        dfs: List[DataFrame[CryptoHistorical]] = []
+        for i, df in enumerate(self.all_data_dfs):
+            assert len(df) > 0, f"Dataframe {i} has no data"
+            df = to_minute_grid(df)
+            assert not df.isnull().values.any(), f"Dataframe {i} has NaN values"
+            dfs.append(df)
+        return dfs
+
     def get_data_by_interval(
         self,
         start_dt: datetime,
         end_dt: datetime,
         span: int,
         wait_time: int = 0,
-    ) -> Generator[DataFrame[CryptoHistorical], None, None]:
-        dfs: List[DataFrame[CryptoHistorical]] = []
+    ) -> Generator[List[WindowFrame], None, None]:
+        windows = [
+            SlidingWindows(df, span) for df in self.get_dense_data_dfs(start_dt, end_dt)
+        ]
 
-        # FIXME: Implement a more efficient way of getting data by interval
-        for i, df in enumerate(self.all_data_dfs):
-            df = df[(df.timestamp >= start_dt) & (df.timestamp <= end_dt)]
-            assert len(df) > 0, f"Dataframe {i} has no data"
+        n = len(windows[0])
+        for i in range(span, n, wait_time):
+            yield [window.get_window(i) for window in windows]
+
+    def get_data_by_chunk(
+        self,
+        start_dt: datetime,
+        end_dt: datetime,
+        span: int,
+        wait_time: int,
+    ) -> Generator[
+        Tuple[List[DataFrame[CryptoHistorical]], np.ndarray, int], None, None
+    ]:
+        # The dense bars of each chunk behind the `span` bars before its first
+        # window's end, with the ends of its windows and the number of windows
+        # before them. The windows are those `get_data_by_interval` gives.
+        tail_dfs: List[DataFrame[CryptoHistorical]] | None = None
+        offset = 0  # Dense bars before the tail
+        next_end, num_ticks = span, 0
+        for grid_dfs in self.get_grid_chunks(start_dt, end_dt):
+            dfs = grid_dfs
+            if tail_dfs is not None:
+                dfs = [
+                    pd.concat([tail_df, grid_df], ignore_index=True)
+                    for tail_df, grid_df in zip(tail_dfs, grid_dfs)
+                ]
+            ends = np.arange(next_end, offset + len(dfs[0]), wait_time)
+            if len(ends) > 0:
+                yield dfs, ends - offset, num_ticks
+                next_end, num_ticks = ends[-1] + wait_time, num_ticks + len(ends)
+
+            keep_from = min(next_end - span, offset + len(dfs[0]))
+            tail_dfs = [df.iloc[keep_from - offset :] for df in dfs]
+            offset = keep_from
+
+    def get_grid_chunks(
+        self, start_dt: datetime, end_dt: datetime
+    ) -> Generator[List[DataFrame[CryptoHistorical]], None, None]:
+        # Consecutive pieces of the frames `get_dense_data_dfs` gives
+        streams = [MinuteGridStream(start_dt, end_dt) for _ in self.currency_codes]
+        for dfs in self.read_data_chunks(start_dt, end_dt):
+            grid_dfs = [stream.push(df) for stream, df in zip(streams, dfs)]
+            if all(grid_df is not None for grid_df in grid_dfs):
+                yield grid_dfs
+            else:
+                assert all(
+                    grid_df is None for grid_df in grid_dfs
+                ), "Currencies must have bars at the same times"
+        yield [stream.close() for stream in streams]
+
+    def read_data_chunks(
+        self, start_dt: datetime, end_dt: datetime
+    ) -> Generator[List[DataFrame[CryptoHistorical]], None, None]:
+        # The bars from the `TIMEFRAME` bar holding `start_dt` to `end_dt`,
+        # `chunk_size` at a time
+        chunk_start_dt = get_load_start_dt(start_dt)
+        while chunk_start_dt <= end_dt:
+            chunk_end_dt = chunk_start_dt + self.chunk_size
+            read_end_dt = min(chunk_end_dt, end_dt)
+            if self.all_data_dfs is None:
+                dfs = read_data_dfs(self.currency_codes, chunk_start_dt, read_end_dt)
+            else:
+                dfs = [
+                    slice_data_df(df, chunk_start_dt, read_end_dt)
+                    for df in self.all_data_dfs
+                ]
+            if chunk_end_dt <= end_dt:
+                # Bars at the end are read with the next chunk
+                dfs = [df[df.timestamp < chunk_end_dt] for df in dfs]
+
+            for currency_code, df in zip(self.currency_codes, dfs):
+                if len(df) > 0:
+                    self.last_closes[currency_code] = df.close.iloc[-1]
+            yield dfs
+            chunk_start_dt = chunk_end_dt
+
+
+def align_data_dfs(
+    dfs: List[DataFrame[CryptoHistorical]],
+) -> List[DataFrame[CryptoHistorical]]:
+    return AlignedBars(dfs, ALIGN_INTERSECTION).to_dfs()
+
+
+def slice_data_df(
+    df: DataFrame[CryptoHistorical],
+    start_dt: datetime | None,
+    end_dt: datetime | None,
+) -> DataFrame[CryptoHistorical]:
+    mask = np.ones(len(df), dtype=bool)
+    if start_dt is not None:
+        mask &= df.timestamp >= start_dt
+    if end_dt is not None:
+        mask &= df.timestamp <= end_dt
+    return df[mask]
+
+
+def get_dataset_key(
+    currency_codes: List[str],
+    start_dt: datetime | None = None,
+    end_dt: datetime | None = None,
+) -> DatasetKey:
+    return DatasetKey(
+        currency_codes=tuple(currency_codes),
+        source=ALPACA_DATA_SOURCE,
+        timeframe=TIMEFRAME,
+        start_dt=start_dt,
+        end_dt=end_dt,
+    )
 
-            df = df.set_index("timestamp", drop=True)
-            df = df.reindex(pd.date_range(start_dt, end_dt, freq="1 min"))
-            df = df.interpolate(method="linear")
-            df = df.reset_index().rename(columns={"index": "timestamp"})
-            df = df.fillna(method="ffill").fillna(method="bfill")
 
-            assert not df.isnull().values.any(), f"Dataframe {i} has NaN values"
+def get_load_start_dt(start_dt: datetime | None) -> datetime | None:
+    # The `TIMEFRAME` bar holding `start_dt`, as in the full history
+    if start_dt is None:
+        return None
+    return pd.Timestamp(start_dt).floor(INTERVAL_DELTAS[TIMEFRAME]).to_pydatetime()
 
-            dfs.append(df)
 
-        n = len(df)
-        for i in range(span, n, wait_time):
-            yield [df[i - span + 1 : i + 1] for df in dfs]
+def load_data_dfs(
+    currency_codes: List[str],
+    start_dt: datetime | None = None,
+    end_dt: datetime | None = None,
+) -> List[DataFrame[CryptoHistorical]]:
+    load_start_dt = get_load_start_dt(start_dt)
+
+    def load() -> List[DataFrame[CryptoHistorical]]:
+        # A cached full history is sliced rather than queried again
+        all_data_dfs = None
+        if start_dt is not None or end_dt is not None:
+            all_data_dfs = DATASET_CACHE.get(get_dataset_key(currency_codes))
+        if all_data_dfs is not None:
+            return [slice_data_df(df, load_start_dt, end_dt) for df in all_data_dfs]
+        return read_data_dfs(currency_codes, load_start_dt, end_dt)
+
+    return DATASET_CACHE.get_or_load(
+        get_dataset_key(currency_codes, start_dt, end_dt), load
+    )
+
+
+def read_data_dfs(
+    currency_codes: List[str],
+    start_dt: datetime | None = None,
+    end_dt: datetime | None = None,
+) -> List[DataFrame[CryptoHistorical]]:
+    return align_data_dfs(
+        [
+            DEFAULT_BROKER.get_crypto_historical(
+                currency_code,
+                TIMEFRAME,
+                pull_from_api=False,
+                start_dt=start_dt,
+                end_dt=end_dt,
+            )
+            for currency_code in currency_codes
+        ]
+    )
 
 
 def create_strat(
@@ -291,6 +569,8 @@ def create_strat(
     rsi_trend_span: int,
     trailing_stop_loss: float,
     trailing_take_profit: float,
+    incremental: bool = False,
+    history_path: str | None = None,
 ) -> BaseStrategy:
     return strat(
         broker=DEFAULT_BROKER,
@@ -310,6 +590,8 @@ def create_strat(
         rsi_trend_span=rsi_trend_span,
         trailing_stop_loss=trailing_stop_loss,
         trailing_take_profit=trailing_take_profit,
+        incremental=incremental,
+        history_path=history_path,
     )
 
 
@@ -333,7 +615,12 @@ def conduct_back_test(
     start_dt: datetime | None = None,
     end_dt: datetime | None = None,
     prev_holdings: List[CryptoOrder] | None = None,
-) -> Tuple[List[Portfolio], int, int]:
+    vectorized: bool = False,
+    incremental: bool = False,
+    progress_callback: Callable[[int, int, float], None] | None = None,
+    chunk_size: timedelta | None = None,
+    history_path: str | None = None,
+) -> Tuple[PortfolioHistory, int, int, PerformanceMetrics]:
     assert span - (indicator_length - 1) > vol_window, "Interval inputs are invalid"
     strat = create_strat(
         strat_def,
@@ -350,6 +637,8 @@ def conduct_back_test(
         rsi_trend_span,
         trailing_stop_loss,
         trailing_take_profit,
+        incremental,
+        history_path,
     )
     back_tester = BackTester(
         strat,
@@ -357,6 +646,9 @@ def conduct_back_test(
         buy_power,
         span=span,
         wait_time=wait_time,
+        start_dt=start_dt,
+        end_dt=end_dt,
+        chunk_size=chunk_size,
     )
     return back_tester.run(
         start_dt=start_dt,
@@ -365,6 +657,85 @@ def conduct_back_test(
         save_graph=False,
         debug=False,
         prev_holdings=prev_holdings,
+        vectorized=vectorized,
+        progress_callback=progress_callback,
+    )
+
+
+def get_result_key(
+    strat_def: BaseStrategy,
+    max_amount_per_order: float,
+    max_holding_per_currency: float,
+    params: Parameters,
+    crypto_currency_codes: List[str],
+    buy_power: float,
+    start_dt: datetime | None = None,
+    end_dt: datetime | None = None,
+    prev_holdings: List[CryptoOrder] | None = None,
+    data_hash: str | None = None,
+) -> ResultKey:
+    if data_hash is None:
+        data_hash = hash_data_dfs(
+            load_data_dfs(crypto_currency_codes, start_dt, end_dt), start_dt, end_dt
+        )
+    return ResultKey(
+        strategy=strat_def.__name__,
+        params=params,
+        currency_codes=tuple(crypto_currency_codes),
+        buy_power=buy_power,
+        max_amount_per_order=max_amount_per_order,
+        max_holding_per_currency=max_holding_per_currency,
+        start_dt=start_dt,
+        end_dt=end_dt,
+        # Copied since the backtest updates the holdings it starts from in place
+        prev_holdings=tuple(holding.model_copy() for holding in prev_holdings or ()),
+        data_hash=data_hash,
+    )
+
+
+def conduct_cached_back_test(
+    strat_def: BaseStrategy,
+    max_amount_per_order: float,
+    max_holding_per_currency: float,
+    params: Parameters,
+    crypto_currency_codes: List[str],
+    buy_power: float,
+    start_dt: datetime | None = None,
+    end_dt: datetime | None = None,
+    prev_holdings: List[CryptoOrder] | None = None,
+    vectorized: bool = False,
+    progress_callback: Callable[[int, int, float], None] | None = None,
+) -> BacktestResult:
+    # Backtests are deterministic, so the result of a parameter point is reused
+    # for as long as the data it ran on does not change
+    key = get_result_key(
+        strat_def,
+        max_amount_per_order,
+        max_holding_per_currency,
+        params,
+        crypto_currency_codes,
+        buy_power,
+        start_dt,
+        end_dt,
+        prev_holdings,
+    )
+    return RESULT_CACHE.get_or_run(
+        key,
+        lambda: BacktestResult.from_run(
+            *conduct_back_test(
+                strat_def,
+                max_amount_per_order,
+                max_holding_per_currency,
+                crypto_currency_codes=crypto_currency_codes,
+                buy_power=buy_power,
+                start_dt=start_dt,
+                end_dt=end_dt,
+                prev_holdings=prev_holdings,
+                vectorized=vectorized,
+                progress_callback=progress_callback,
+                **params.model_dump(),
+            )
+        ),
     )
 
 
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from StratDaemon.integration.db.bar_store import (
+    AGGREGATE_TIMEFRAMES,
+    ColumnarBarStore,
+    SegmentedBarStore,
+    to_values,
+)
+from StratDaemon.utils.constants import BAR_COLUMNS
+from tests.vectorized_parity import generate_random_walk
+
+NUM_MINUTES = 60 * 24 * 60
+NUM_LIVE_MINUTES = 90  # Appended one at a time, crossing an hour boundary
+
+
+def aggregate_by_grouper(df: pd.DataFrame, delta) -> pd.DataFrame:
+    # How backtests used to roll minute bars up on every load
+    df_grp = df.groupby(pd.Grouper(key="timestamp", freq=delta)).agg(
+        {
+            "open": "first",
+            "high": "max",
+            "low": "min",
+            "close": "last",
+            "volume": "sum",
+        }
+    )
+    return df_grp.dropna().reset_index()
+
+
+def assert_aggregates(store: ColumnarBarStore, df: pd.DataFrame) -> None:
+    for timeframe, delta in AGGREGATE_TIMEFRAMES.items():
+        expected_df = aggregate_by_grouper(df, delta)
+        read_df = store.read("DOGE", timeframe)
+        assert (read_df.timestamp.to_numpy() == expected_df.timestamp.to_numpy()).all()
+        assert np.allclose(
+            read_df[BAR_COLUMNS].to_numpy(), expected_df[BAR_COLUMNS].to_numpy()
+        ), f"{timeframe} bars differ"
+
+
+def test_bar_aggregates():
+    df = generate_random_walk(0, NUM_MINUTES)
+    # A gap of a few hours, which has no buckets
+    df = df.drop(index=range(10_000, 10_300)).reset_index(drop=True)
+
+    for store in [
+        ColumnarBarStore(tempfile.mkdtemp()),
+        SegmentedBarStore(tempfile.mkdtemp(), max_segments=16),
+    ]:
+        # Appends ending inside a bucket, which later appends complete
+        for start in range(0, len(df), 5_000):
+            store.append("DOGE", "minute", df.iloc[start : start + 5_000])
+            assert (
+                store.read("DOGE", "1D").close.iloc[-1]
+                == df.close.iloc[min(start + 5_000, len(df)) - 1]
+            )
+        assert_aggregates(store, df)
+
+        # Live appends of a minute at a time update the trailing bucket
+        live_df = generate_random_walk(1, NUM_LIVE_MINUTES)
+        live_df["timestamp"] = df.timestamp.iloc[-1] + pd.to_timedelta(
+            np.arange(1, len(live_df) + 1), unit="min"
+        )
+        for i in range(len(live_df)):
+            store.append("DOGE", "minute", live_df.iloc[i : i + 1])
+        assert_aggregates(store, pd.concat([df, live_df], ignore_index=True))
+
+    # Minute bars stored before aggregates existed are rolled up on first read
+    store = ColumnarBarStore(tempfile.mkdtemp())
+    os.makedirs(store.get_partition_dir("DOGE", "minute"))
+    store.write_months("DOGE", "minute", to_values(df))
+    assert not store.has_data("DOGE", "1H")
+    assert_aggregates(store, df)
+
+    start = time.perf_counter()
+    aggregate_by_grouper(df, AGGREGATE_TIMEFRAMES["1H"])
+    grouper_time = time.perf_counter() - start
+    start = time.perf_counter()
+    store.read("DOGE", "1H")
+    read_time = time.perf_counter() - start
+
+    print(
+        f"Stored hourly bars read in {read_time * 1_000:.1f}ms vs "
+        f"{grouper_time * 1_000:.1f}ms to aggregate {NUM_MINUTES} minute bars"
+    )
+
+
+if __name__ == "__main__":
+    test_bar_aggregates()
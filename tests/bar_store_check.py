@@ -0,0 +1,100 @@
+import os
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from StratDaemon.integration.broker.kraken import KrakenBroker
+from StratDaemon.integration.db.bar_store import ColumnarBarStore
+from StratDaemon.utils.constants import BAR_COLUMNS
+from tests.vectorized_parity import generate_random_walk
+
+NUM_MINUTES_PER_YEAR = 365 * 24 * 60
+MAX_LOAD_TIME = 0.1  # in seconds
+
+
+def to_minutes(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(
+        timestamp=pd.date_range("2024-01-01", periods=len(df), freq="1min")
+    )
+
+
+def test_bar_store():
+    store = ColumnarBarStore(tempfile.mkdtemp())
+    df = to_minutes(generate_random_walk(0, 100_000))
+    assert not store.has_data("DOGE", "minute")
+
+    # Overlapping appends keep one bar per timestamp, the latest one winning
+    store.append("DOGE", "minute", df.iloc[:60_000])
+    updated_df = df.iloc[50_000:].copy()
+    updated_df.loc[55_000, "close"] *= 2
+    store.append("DOGE", "minute", updated_df)
+    assert store.get_months("DOGE", "minute") == ["2024-01", "2024-02", "2024-03"]
+
+    read_df = store.read("DOGE", "minute")
+    assert len(read_df) == len(df)
+    assert (read_df.timestamp.to_numpy() == df.timestamp.to_numpy()).all()
+    assert read_df.close[55_000] == 2 * df.close[55_000]
+    read_df.loc[55_000, "close"] = df.close[55_000]
+    assert np.array_equal(read_df[BAR_COLUMNS].to_numpy(), df[BAR_COLUMNS].to_numpy())
+
+    # Range reads are inclusive and cross month boundaries
+    start_dt, end_dt = datetime(2024, 1, 31, 23, 0), datetime(2024, 2, 1, 1, 0)
+    range_df = store.read("DOGE", "minute", start_dt, end_dt)
+    assert len(range_df) == 121
+    assert range_df.timestamp.iloc[0] == start_dt
+    assert range_df.timestamp.iloc[-1] == end_dt
+    assert store.read(
+        "DOGE", "minute", datetime(2023, 1, 1), datetime(2023, 2, 1)
+    ).empty
+
+    # One coin-year of minute bars
+    year_store = ColumnarBarStore(tempfile.mkdtemp())
+    year_df = to_minutes(generate_random_walk(1, NUM_MINUTES_PER_YEAR))
+    year_store.append("SHIB", "minute", year_df)
+
+    json_path = os.path.join(year_store.root, "SHIB.json")
+    year_df.to_json(json_path)
+    start = time.perf_counter()
+    pd.read_json(json_path)
+    json_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_df = year_store.read("SHIB", "minute")
+    load_time = time.perf_counter() - start
+    assert len(read_df) == NUM_MINUTES_PER_YEAR
+    assert load_time < MAX_LOAD_TIME, f"Loading took {load_time:.3f}s"
+
+    print(
+        f"Bar store reads back appended bars; one coin-year of minute bars loads in "
+        f"{load_time * 1_000:.1f}ms (JSON: {json_time * 1_000:.0f}ms)"
+    )
+
+
+def write_kraken_csv(path: str, df: pd.DataFrame) -> None:
+    # Kraken's files have no header and start with the epoch in seconds
+    df.assign(timestamp=df.timestamp.astype("int64") // 10**9, trades=1).to_csv(
+        path, mode="a", header=False, index=False
+    )
+
+
+def test_kraken_import():
+    df = to_minutes(generate_random_walk(2, 5_000))[["timestamp", *BAR_COLUMNS]]
+    broker = KrakenBroker(ColumnarBarStore(tempfile.mkdtemp()))
+    broker.local_data_path = tempfile.mkdtemp()
+    csv_path = os.path.join(broker.local_data_path, "DOGEUSD_1.csv")
+
+    # Rows added to the CSV after it was imported reach the bar store
+    write_kraken_csv(csv_path, df.iloc[:3_000])
+    assert len(broker.get_crypto_historical("DOGE", "minute")) == 3_000
+    write_kraken_csv(csv_path, df.iloc[3_000:])
+    read_df = broker.get_crypto_historical("DOGE", "minute")
+    # As parsed from the CSV, to the last digit or so
+    assert np.allclose(read_df[BAR_COLUMNS].to_numpy(), df[BAR_COLUMNS].to_numpy())
+    assert (read_df.timestamp.to_numpy() == df.timestamp.to_numpy()).all()
+    print("Kraken CSV rows added after the import are read from the bar store")
+
+
+if __name__ == "__main__":
+    test_bar_store()
+    test_kraken_import()
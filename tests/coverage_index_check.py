@@ -0,0 +1,134 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+from StratDaemon.integration.db.alpaca import AlpacaMarketstoreDB
+from StratDaemon.integration.db.coverage import (
+    CoverageIndex,
+    subtract_intervals,
+    to_intervals,
+)
+
+START_DT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+END_DT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+MAX_CHECK_TIME = 0.01  # in seconds
+
+
+class FakeResult:
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.data = df
+
+    def first(self) -> "FakeResult":
+        return self
+
+    def df(self) -> pd.DataFrame:
+        return self.data
+
+
+class FakeClient:
+    # Answers the marketstore calls the availability check makes
+    def __init__(self, epochs: np.ndarray) -> None:
+        self.epochs = epochs
+
+    def list_symbols(self) -> List[str]:
+        return ["DOGE"]
+
+    def sql(self, _) -> FakeResult:
+        return FakeResult(
+            pd.DataFrame(index=pd.to_datetime(self.epochs, unit="s", utc=True))
+        )
+
+    def write(self, *_, **__) -> dict:
+        return {"responses": None}
+
+
+def create_db(epochs: np.ndarray, path: str) -> AlpacaMarketstoreDB:
+    return AlpacaMarketstoreDB(
+        coverage_index=CoverageIndex(path), pym_cli=FakeClient(epochs)
+    )
+
+
+def check_by_scan(
+    db: AlpacaMarketstoreDB, epochs: np.ndarray
+) -> List[Tuple[datetime, datetime]]:
+    # The per-minute set difference the coverage index replaces
+    req_dates = pd.date_range(start=START_DT, end=END_DT, freq=db.timeframe)
+    req_dates = [d.to_pydatetime().replace(tzinfo=None) for d in req_dates]
+    all_dates = [
+        d.to_pydatetime().replace(tzinfo=None)
+        for d in pd.to_datetime(epochs, unit="s", utc=True)
+    ]
+    missing_dates = sorted(set(dt.date() for dt in set(req_dates) - set(all_dates)))
+    return [
+        (consec[0], consec[-1] + timedelta(days=1))
+        for consec in db.get_consec_dts(missing_dates, timedelta(days=1))
+    ]
+
+
+def test_coverage_index():
+    assert to_intervals(np.array([0, 60, 120, 300, 360, 600]), 60) == [
+        (0, 120),
+        (300, 360),
+        (600, 600),
+    ]
+    assert subtract_intervals(0, 660, [(0, 120), (300, 360), (600, 600)], 60) == [
+        (180, 240),
+        (420, 540),
+        (660, 660),
+    ]
+    assert subtract_intervals(300, 360, [(0, 120), (300, 360)], 60) == []
+
+    # A year of minute bars missing a few hours and the first days of March
+    epochs = np.arange(START_DT.timestamp(), END_DT.timestamp(), 60, dtype=np.int64)
+    is_missing = np.zeros(len(epochs), dtype=bool)
+    is_missing[100_000:100_180] = True
+    is_missing[300_000:300_001] = True
+    march = datetime(2024, 3, 1, tzinfo=timezone.utc).timestamp()
+    is_missing[(epochs >= march) & (epochs < march + 3 * 86_400)] = True
+    epochs = epochs[~is_missing]
+
+    path = os.path.join(tempfile.mkdtemp(), "coverage.json")
+    db = create_db(epochs, path)
+
+    start = time.perf_counter()
+    expected = check_by_scan(db, epochs)
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert db.check_data_availability("DOGE", START_DT, END_DT) == expected
+    rebuild_time = time.perf_counter() - start
+
+    # The persisted index answers without touching the stored epochs
+    db = create_db(np.array([], dtype=np.int64), path)
+    start = time.perf_counter()
+    assert db.check_data_availability("DOGE", START_DT, END_DT) == expected
+    check_time = time.perf_counter() - start
+    assert check_time < MAX_CHECK_TIME, f"Check took {check_time:.3f}s"
+
+    # Ingesting the missing days marks them as covered, including minutes
+    # without trades at the start of a request
+    for start_date, end_date in expected:
+        start_dt = datetime.combine(start_date, datetime.min.time(), timezone.utc)
+        end_dt = datetime.combine(end_date, datetime.min.time(), timezone.utc)
+        timestamps = pd.date_range(start_dt, end_dt, freq="1Min")[5:]
+        db.update_ticker_data(
+            "DOGE",
+            pd.DataFrame({"symbol": "DOGE/USD", "timestamp": timestamps, "close": 1.0}),
+            start_dt=start_dt,
+        )
+    assert db.check_data_availability("DOGE", START_DT, END_DT) == []
+    ((start_epoch, end_epoch),) = CoverageIndex(path).get("DOGE/1Min")
+    assert start_epoch == START_DT.timestamp() and end_epoch >= END_DT.timestamp()
+
+    print(
+        f"Coverage index finds {len(expected)} missing date ranges in "
+        f"{check_time * 1_000:.2f}ms ({rebuild_time:.2f}s to rebuild, "
+        f"{scan_time:.2f}s by scanning every minute)"
+    )
+
+
+if __name__ == "__main__":
+    test_coverage_index()
@@ -0,0 +1,117 @@
+import os
+import tempfile
+from datetime import datetime
+from typing import List
+import numpy as np
+import pandas as pd
+from StratDaemon.integration.broker.crypto_compare import (
+    LOCAL_DATA_PATH_SUFFIX,
+    MIGRATED_SUFFIX,
+    CryptoCompareBroker,
+)
+from StratDaemon.integration.db.bar_store import SegmentedBarStore
+from StratDaemon.models.crypto import CryptoHistorical
+from StratDaemon.utils.constants import BAR_COLUMNS
+from tests.vectorized_parity import generate_random_walk
+
+NUM_MINUTES = 30_000
+NUM_LEGACY_MINUTES = 5_000
+PAGE_SIZE = 2_000
+
+
+def serve_pages(broker: CryptoCompareBroker, df) -> List[int]:
+    # Stands in for the API: pages of bars up to `to_timestamp`, oldest first
+    page_sizes = []
+
+    def make_crypto_historical_req(
+        currency_code: str,
+        interval: str,
+        to_timestamp: datetime | None,
+        is_backtest: bool = False,
+    ) -> List[CryptoHistorical]:
+        page_df = df if to_timestamp is None else df[df.timestamp <= to_timestamp]
+        page_df = page_df.iloc[-(PAGE_SIZE + 1) :]
+        if len(page_df) <= 1:
+            # Past the start of the history
+            return []
+        page_sizes.append(len(page_df))
+        return [
+            {**row, "timestamp": row["timestamp"].to_pydatetime()}
+            for row in page_df.to_dict("records")
+        ]
+
+    broker.make_crypto_historical_req = make_crypto_historical_req
+    return page_sizes
+
+
+def count_appended_bars(store: SegmentedBarStore) -> List[int]:
+    num_bars = []
+    append = store.append
+
+    def counted(symbol, timeframe, df):
+        num_bars.append(len(df))
+        append(symbol, timeframe, df)
+
+    store.append = counted
+    return num_bars
+
+
+def test_crypto_compare_cache():
+    os.chdir(tempfile.mkdtemp())
+    df = generate_random_walk(0, NUM_MINUTES)
+
+    # A legacy cache holding the latest bars, unsorted and with duplicates
+    legacy_df = df.iloc[-NUM_LEGACY_MINUTES:]
+    legacy_path = f"DOGE_{LOCAL_DATA_PATH_SUFFIX}"
+    shuffled_df = legacy_df.sample(frac=1, random_state=0)
+    pd.concat([shuffled_df, shuffled_df.iloc[:100]], ignore_index=True).to_json(
+        legacy_path
+    )
+
+    store = SegmentedBarStore("bars")
+    broker = CryptoCompareBroker(bar_store=store)
+    page_sizes = serve_pages(broker, df)
+    num_bars = count_appended_bars(store)
+
+    read_df = broker.get_crypto_historical(
+        "DOGE", "minute", pull_from_api=True, is_backtest=True
+    )
+    assert not os.path.exists(legacy_path)
+    assert os.path.exists(f"{legacy_path}{MIGRATED_SUFFIX}")
+
+    # Each save writes only the pages fetched since the previous one
+    assert sum(num_bars) == len(legacy_df) + 100 + sum(page_sizes)
+    assert len(store.get_segment_paths("DOGE", "minute")) == 0
+
+    assert len(read_df) == len(df)
+    assert (read_df.timestamp.to_numpy() == df.timestamp.to_numpy()).all()
+    # JSON keeps 10 decimal places
+    assert np.allclose(
+        read_df[BAR_COLUMNS].to_numpy(), df[BAR_COLUMNS].to_numpy(), rtol=1e-8
+    )
+
+    # Loads can be limited to a time range
+    start_dt, end_dt = df.timestamp[1_000], df.timestamp[1_999]
+    range_df = broker.get_crypto_historical(
+        "DOGE", "minute", start_dt=start_dt, end_dt=end_dt
+    )
+    assert (range_df.timestamp.to_numpy() == df.timestamp[1_000:2_000].to_numpy()).all()
+
+    # Segments are read merged with the partitions before compaction
+    updated_df = df.iloc[[10, 20_000]].copy()
+    updated_df["close"] *= 2
+    store.append("DOGE", "minute", updated_df)
+    read_df = broker.get_crypto_historical("DOGE", "minute")
+    assert (read_df.close[[10, 20_000]].to_numpy() == updated_df.close.to_numpy()).all()
+    assert len(read_df) == len(df)
+    store.compact("DOGE", "minute")
+    assert broker.get_crypto_historical("DOGE", "minute").equals(read_df)
+
+    print(
+        f"CryptoCompare cache migrated {len(legacy_df)} legacy bars and appended "
+        f"{len(page_sizes)} pages as segments"
+    )
+
+
+if __name__ == "__main__":
+    test_crypto_compare_cache()
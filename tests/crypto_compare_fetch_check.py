@@ -0,0 +1,154 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import List
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+from StratDaemon.integration.broker.crypto_compare import CryptoCompareBroker
+from StratDaemon.integration.db.bar_store import SegmentedBarStore
+from StratDaemon.utils.constants import BAR_COLUMNS
+from tests.vectorized_parity import generate_random_walk
+
+NUM_PAGES = 40
+PAGE_SIZE = 2_000
+LATENCY = 0.02  # Seconds the stub takes to answer a request
+MAX_CONCURRENCY = 8
+RATE_LIMIT = 25  # Requests per second
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Serves the histominute JSON shape: the `limit + 1` bars up to `toTs`
+    protocol_version = "HTTP/1.1"
+    times: np.ndarray
+    bars: List[dict]
+    client_ports = set()
+    num_requests = 0
+
+    def do_GET(self):
+        StubHandler.client_ports.add(self.client_address[1])
+        StubHandler.num_requests += 1
+        query = parse_qs(urlparse(self.path).query)
+        limit = int(query["limit"][0])
+        to_ts = int(query["toTs"][0]) if "toTs" in query else self.times[-1]
+        hi = int(np.searchsorted(self.times, to_ts, side="right"))
+        time.sleep(LATENCY)
+
+        body = json.dumps(
+            {"Response": "Success", "Data": self.bars[max(0, hi - limit - 1) : hi]}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server(num_minutes: int) -> str:
+    df = generate_random_walk(0, num_minutes)
+    end_ts = int(time.time()) // 60 * 60
+    StubHandler.times = end_ts - 60 * np.arange(num_minutes)[::-1]
+    StubHandler.bars = [
+        {
+            "time": int(t),
+            "open": row.open,
+            "high": row.high,
+            "low": row.low,
+            "close": row.close,
+            "volumefrom": row.volume,
+            "volumeto": row.volume * row.close,
+        }
+        for t, row in zip(StubHandler.times, df.itertuples())
+    ]
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/data/histo"
+
+
+def get_expected_df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "timestamp": [datetime.fromtimestamp(b["time"]) for b in StubHandler.bars],
+            "open": [b["open"] for b in StubHandler.bars],
+            "high": [b["high"] for b in StubHandler.bars],
+            "low": [b["low"] for b in StubHandler.bars],
+            "close": [b["close"] for b in StubHandler.bars],
+            "volume": [b["volumefrom"] for b in StubHandler.bars],
+        }
+    )
+
+
+def create_broker(
+    hist_base_url: str, max_concurrency: int, max_requests_per_second: float
+) -> CryptoCompareBroker:
+    broker = CryptoCompareBroker(
+        bar_store=SegmentedBarStore(tempfile.mkdtemp()),
+        max_concurrency=max_concurrency,
+        max_requests_per_second=max_requests_per_second,
+    )
+    broker.hist_base_url = hist_base_url
+    return broker
+
+
+def fetch(broker: CryptoCompareBroker) -> float:
+    # Pages per second of a full backtest pull
+    StubHandler.client_ports.clear()
+    StubHandler.num_requests = 0
+    start = time.perf_counter()
+    df = broker.get_crypto_historical(
+        "DOGE", "minute", pull_from_api=True, is_backtest=True
+    )
+    pages_per_sec = StubHandler.num_requests / (time.perf_counter() - start)
+
+    expected_df = get_expected_df()
+    assert (df.timestamp.to_numpy() == expected_df.timestamp.to_numpy()).all()
+    assert np.array_equal(
+        df[BAR_COLUMNS].to_numpy(), expected_df[BAR_COLUMNS].to_numpy()
+    )
+    return pages_per_sec
+
+
+def test_crypto_compare_fetch():
+    os.chdir(tempfile.mkdtemp())
+    hist_base_url = start_stub_server(NUM_PAGES * PAGE_SIZE + 1)
+
+    sequential = fetch(create_broker(hist_base_url, 1, 1_000))
+    assert len(StubHandler.client_ports) == 1, "Connections were not kept alive"
+
+    concurrent = fetch(create_broker(hist_base_url, MAX_CONCURRENCY, 1_000))
+    assert len(StubHandler.client_ports) <= MAX_CONCURRENCY
+    assert concurrent > sequential
+
+    rate_limited = fetch(create_broker(hist_base_url, MAX_CONCURRENCY, RATE_LIMIT))
+    assert rate_limited <= RATE_LIMIT * 1.1
+
+    # Only the gaps around already stored bars are fetched
+    broker = create_broker(hist_base_url, MAX_CONCURRENCY, 1_000)
+    expected_df = get_expected_df()
+    num_stored = len(expected_df) // 2
+    broker.bar_store.append(
+        "DOGE", "minute", expected_df.iloc[num_stored // 2 : num_stored // 2 * 3]
+    )
+    fetch(broker)
+    assert (
+        StubHandler.num_requests
+        < NUM_PAGES - num_stored // PAGE_SIZE + 2 * MAX_CONCURRENCY
+    )
+
+    print(
+        f"Fetched {NUM_PAGES * PAGE_SIZE} bars at {sequential:.1f} pages/s sequentially, "
+        f"{concurrent:.1f} pages/s with {MAX_CONCURRENCY} workers and "
+        f"{rate_limited:.1f} pages/s limited to {RATE_LIMIT} requests/s"
+    )
+
+
+if __name__ == "__main__":
+    test_crypto_compare_fetch()
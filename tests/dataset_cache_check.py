@@ -0,0 +1,59 @@
+from StratDaemon.utils.dataset_cache import DatasetCache, DatasetKey
+from tests.vectorized_parity import generate_random_walk
+
+SOURCE = "alpaca"
+
+
+def test_dataset_cache():
+    dfs = [generate_random_walk(seed, 1_000) for seed in range(3)]
+    num_bytes = int(dfs[0].memory_usage(deep=True).sum())
+    cache = DatasetCache(max_bytes=2 * num_bytes)
+    keys = [
+        DatasetKey(currency_codes=(code,), source=SOURCE, timeframe="hour")
+        for code in ["DOGE", "SHIB", "BTC"]
+    ]
+    num_loads = [0] * len(keys)
+
+    def get(i: int):
+        def load():
+            num_loads[i] += 1
+            return [dfs[i]]
+
+        return cache.get_or_load(keys[i], load)
+
+    assert get(0)[0] is dfs[0] and get(0)[0] is dfs[0]
+    assert num_loads == [1, 0, 0]
+
+    # The least recently used entry is evicted once the budget is exceeded
+    get(1)
+    get(0)
+    get(2)
+    assert cache.num_bytes <= cache.max_bytes
+    get(0)
+    get(1)
+    assert num_loads == [1, 2, 1]
+
+    # New bars for a currency drop its entries and bump its data version
+    cache.invalidate("SHIB", SOURCE)
+    cache.invalidate("DOGE", "crypto_compare")
+    get(0)
+    get(1)
+    assert num_loads == [1, 3, 1]
+    assert cache.get_stats()["hits"] == 4
+
+    # Frames larger than the budget are returned without being cached
+    small_cache = DatasetCache(max_bytes=num_bytes // 2)
+    for _ in range(2):
+        small_cache.get_or_load(keys[0], lambda: [dfs[0]])
+    assert small_cache.get_stats() == {
+        "entries": 0,
+        "bytes": 0,
+        "hits": 0,
+        "misses": 2,
+    }
+
+    print("Dataset cache evicts and invalidates entries as expected")
+
+
+if __name__ == "__main__":
+    test_dataset_cache()
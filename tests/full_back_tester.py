@@ -8,8 +8,8 @@ from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
 from datetime import datetime, timedelta
 
 from StratDaemon.utils.funcs import Parameters, load_best_study_parameters
-from ml.tuning.test import test_optuna
-from tests.back_tester import conduct_back_test
+from ml.tuning.test import FidelityConfig, test_optuna
+from tests.back_tester import conduct_cached_back_test
 from sys import argv
 
 START_DT = datetime(2024, 1, 1)
@@ -18,6 +18,10 @@ END_DT = datetime(2024, 12, 19)
 OPTUNA_DATA_SPAN = 1  # in weeks
 OPTUNA_RUN_FREQ = 24 * 60  # in minutes
 OPTUNA_TRIALS = 5
+OPTUNA_WORKERS = 1
+OPTUNA_FIDELITY: FidelityConfig | None = (
+    None  # e.g. FidelityConfig() for successive halving
+)
 
 BUY_POWER = 10_000
 MAX_AMOUNT_PER_ORDER = 10_000
@@ -59,6 +63,8 @@ class FullBackTester:
                     MAX_HOLDING_PER_CURRENCY,
                     trials=OPTUNA_TRIALS,
                     debug=False,
+                    n_workers=OPTUNA_WORKERS,
+                    fidelity=OPTUNA_FIDELITY,
                 )
 
             optuna_start_dt = start_dt
@@ -97,31 +103,26 @@ class FullBackTester:
         start_dt: datetime,
         end_dt: datetime,
     ) -> int:
-        port_hist, buy_trades, sell_trades = conduct_back_test(
+        result = conduct_cached_back_test(
             self.strat,
             MAX_AMOUNT_PER_ORDER,
             MAX_HOLDING_PER_CURRENCY,
-            params.p_diff,
-            params.vol_window,
-            params.indicator_length,
-            params.rsi_buy_threshold,
-            params.rsi_sell_threshold,
-            params.rsi_percent_incr_threshold,
-            params.rsi_trend_span,
-            params.trailing_stop_loss,
-            params.trailing_take_profit,
+            params,
             self.currency_codes,
             self.buy_power,
-            params.span,
-            params.wait_time,
             start_dt=start_dt,
             end_dt=end_dt,
             prev_holdings=self.holdings,
         )
-        final_port = port_hist[-1]
-        self.buy_power = final_port.buy_power
-        self.holdings = final_port.holdings
-        self.save_result(start_dt, end_dt, final_port.value, buy_trades, sell_trades)
+        self.buy_power = result.buy_power
+        self.holdings = result.holdings
+        self.save_result(
+            start_dt,
+            end_dt,
+            result.value,
+            result.num_buy_trades,
+            result.num_sell_trades,
+        )
         return params.wait_time
 
     def save_result(
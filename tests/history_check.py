@@ -0,0 +1,174 @@
+import os
+import tempfile
+import time
+from datetime import datetime
+from math import isclose
+from typing import Dict, List
+import numpy as np
+from StratDaemon.models.crypto import CryptoOrder, Portfolio
+from StratDaemon.portfolio.history import HISTORY_DTYPE, HISTORY_TAIL
+from StratDaemon.portfolio.ledger import ZERO_AMOUNT
+from StratDaemon.portfolio.portfolio_manager import PortfolioManager
+from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
+from tests.ledger_check import (
+    BUY_POWER,
+    CURRENCY_CODES,
+    START_DT,
+    generate_ticks,
+    replay,
+)
+
+TAIL_SIZE = 1_000
+SPILL_HEADER = b"older history\n"
+
+
+class SnapshotPortfolioManager(PortfolioManager):
+    # Keeps a full snapshot per order, as the history used to, with the
+    # quantity held of each currency
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.snapshots = [
+            Portfolio(value=BUY_POWER, buy_power=BUY_POWER, timestamp=START_DT)
+        ]
+        self.quantities: List[Dict[str, float]] = [{}]
+        self.prices: List[Dict[str, float]] = [{}]
+
+    def process_order_at(
+        self, cur_prices_dt: Dict[str, float], timestamp: datetime, order: CryptoOrder
+    ) -> List[CryptoOrder]:
+        executed_orders = super().process_order_at(cur_prices_dt, timestamp, order)
+        self.snapshots.append(
+            Portfolio(
+                value=self.calculate_portfolio_value(cur_prices_dt),
+                buy_power=self.buy_power,
+                timestamp=timestamp,
+            )
+        )
+        self.quantities.append(
+            dict(zip(self.ledger.currency_codes, self.ledger.quantities.tolist()))
+        )
+        self.prices.append(cur_prices_dt)
+        return executed_orders
+
+
+def assert_same_snapshot(
+    portfolio_mgr: SnapshotPortfolioManager, snapshot: Portfolio, idx: int
+) -> None:
+    expected = portfolio_mgr.snapshots[idx]
+    assert snapshot.timestamp == expected.timestamp
+    assert isclose(snapshot.value, expected.value, rel_tol=1e-9)
+    assert isclose(snapshot.buy_power, expected.buy_power, rel_tol=1e-9)
+    quantities = portfolio_mgr.quantities[idx].copy()
+    for holding in snapshot.holdings:
+        quantities[holding.currency_code] -= holding.quantity
+    # Lots closed as worth nothing by trades of other currencies are left out
+    for currency_code, quantity in quantities.items():
+        price = portfolio_mgr.prices[idx][currency_code]
+        assert abs(quantity * price) <= 2 * ZERO_AMOUNT
+
+
+def measure_records(num_events: int) -> float:
+    portfolio_mgr = PortfolioManager(CURRENCY_CODES, BUY_POWER)
+    start = time.perf_counter()
+    for _ in range(num_events):
+        portfolio_mgr.portfolio_hist.record(START_DT, BUY_POWER, BUY_POWER, "BTC", 1, 1)
+    return time.perf_counter() - start
+
+
+def measure_snapshots(num_events: int) -> float:
+    snapshots = []
+    start = time.perf_counter()
+    for _ in range(num_events):
+        snapshots.append(
+            Portfolio(value=BUY_POWER, buy_power=BUY_POWER, timestamp=START_DT)
+        )
+    return time.perf_counter() - start
+
+
+def test_history():
+    ticks = generate_ticks()
+    spill_path = os.path.join(tempfile.mkdtemp(), "history.bin")
+    with open(spill_path, "wb") as f:
+        f.write(SPILL_HEADER)
+
+    portfolio_mgr = SnapshotPortfolioManager(
+        CURRENCY_CODES,
+        BUY_POWER,
+        initial_timestamp=START_DT,
+        history_tail=TAIL_SIZE,
+        history_path=spill_path,
+    )
+    replay(portfolio_mgr, ticks)
+    history = portfolio_mgr.portfolio_hist
+    snapshots = portfolio_mgr.snapshots
+    assert len(history) == len(snapshots)
+    assert history.tail_len <= TAIL_SIZE and history.num_spilled > 0
+
+    # Spilled events are appended after what the file held
+    with open(spill_path, "rb") as f:
+        assert f.read(len(SPILL_HEADER)) == SPILL_HEADER
+    assert (
+        os.path.getsize(spill_path)
+        == len(SPILL_HEADER) + history.num_spilled * HISTORY_DTYPE.itemsize
+    )
+
+    for idx, snapshot in enumerate(history):
+        assert_same_snapshot(portfolio_mgr, snapshot, idx)
+
+    # Any snapshot can be rebuilt on its own, spilled or not
+    rng = np.random.default_rng(0)
+    for idx in rng.integers(0, len(history), 50).tolist() + [0, -1]:
+        assert_same_snapshot(portfolio_mgr, history[idx], idx)
+    middle = len(history) // 2
+    for snapshot, expected in zip(
+        history[middle - 10 : middle + 10], snapshots[middle - 10 : middle + 10]
+    ):
+        assert snapshot.timestamp == expected.timestamp
+
+    # A snapshot appended whole keeps its holdings
+    final = Portfolio(
+        value=0.0,
+        buy_power=0.0,
+        timestamp=datetime.now(),
+        holdings=portfolio_mgr.get_holdings(),
+    )
+    history.append(final)
+    assert history[-1] is final
+
+    # A strategy spills its history to the path it is given, and closes it
+    strat_path = os.path.join(tempfile.mkdtemp(), "strat_history.bin")
+    strat = FibVolRsiStrategy(
+        None, None, CURRENCY_CODES, buy_power=BUY_POWER, history_path=strat_path
+    )
+    strat_hist = strat.portfolio_mgr.portfolio_hist
+    for _ in range(HISTORY_TAIL):
+        strat_hist.record(START_DT, BUY_POWER, BUY_POWER)
+    strat.close()
+    assert strat_hist.spill_file is None
+    assert (
+        os.path.getsize(strat_path) == strat_hist.num_spilled * HISTORY_DTYPE.itemsize
+    )
+    assert strat_hist.num_spilled > 0
+    os.remove(strat_path)
+
+    num_events = len(snapshots)
+    record_time, snapshot_time = measure_records(num_events), measure_snapshots(
+        num_events
+    )
+    tail_bytes = history.tail.nbytes
+    # Snapshots with their holdings, as they used to be kept
+    snapshot_bytes = sum(
+        len(snapshot.model_dump_json()) for snapshot in history[-TAIL_SIZE:]
+    ) * (num_events / TAIL_SIZE)
+    history.close()
+    assert tail_bytes < snapshot_bytes / 10
+    print(
+        f"Kept {num_events} events in a {tail_bytes / 2**10:.0f}KiB tail and "
+        f"{history.num_spilled * HISTORY_DTYPE.itemsize / 2**10:.0f}KiB on disk "
+        f"(snapshots: ~{snapshot_bytes / 2**20:.0f}MiB as JSON), recording them "
+        f"in {record_time:.2f}s vs {snapshot_time:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    test_history()
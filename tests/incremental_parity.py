@@ -0,0 +1,77 @@
+import numpy as np
+import pandas_ta as ta
+from StratDaemon.strats.fib_vol_rsi import FibVolRsiIndicators, FibVolRsiStrategy
+from StratDaemon.utils.incremental import IncrementalSuperTrend
+from tests.vectorized_parity import (
+    PARAMS,
+    assert_same_results,
+    generate_random_walk,
+    run_back_test,
+)
+
+SPAN = 60
+INDICATOR_LENGTH = 20
+RSI_TREND_SPAN = 5
+EXACT_COLS = ["upper_bb", "lower_bb", "boll_diff", "trends_upwards"]
+
+
+def test_indicator_equivalence():
+    df = generate_random_walk(seed=7, num_minutes=2_000)
+    strat = FibVolRsiStrategy(
+        None,
+        None,
+        ["DOGE"],
+        indicator_length=INDICATOR_LENGTH,
+        rsi_trend_span=RSI_TREND_SPAN,
+    )
+    state = FibVolRsiIndicators(SPAN, INDICATOR_LENGTH, RSI_TREND_SPAN)
+    rsi_rows = [state.rsi_prev_pos, SPAN - 1]
+    fib_cols = [f"fib_{i}" for i in range(6)]
+
+    for i, bar in enumerate(df.itertuples(index=False)):
+        state.update(bar.high, bar.low, bar.close)
+        if i < SPAN - 1:
+            continue
+
+        window = df.iloc[i - SPAN + 1 : i + 1]
+        expected = strat.transform_df(window.copy()).reset_index(drop=True)
+        actual = state.apply(window.copy()).reset_index(drop=True)
+
+        for col in EXACT_COLS:
+            assert np.allclose(
+                actual[col].astype(float), expected[col].astype(float), equal_nan=True
+            ), f"{col} differs for window ending at {i}"
+        assert np.allclose(actual[fib_cols].iloc[-1], expected[fib_cols].iloc[-1])
+        assert np.allclose(actual["rsi"].iloc[rsi_rows], expected["rsi"].iloc[rsi_rows])
+        assert np.isclose(actual["atr"].iloc[-1], expected["atr"].iloc[-1])
+
+    super_trend = IncrementalSuperTrend(14, 3)
+    streamed = np.array(
+        [
+            super_trend.update(bar.high, bar.low, bar.close)
+            for bar in df.itertuples(index=False)
+        ]
+    )
+    expected = ta.supertrend(df["high"], df["low"], df["close"], 14, 3).to_numpy()
+    # pandas_ta leaves a placeholder 0 in the first trend row
+    assert np.allclose(streamed[1:], expected[1:], equal_nan=True)
+
+    print("Incremental indicators match the batch indicators")
+
+
+def test_incremental_parity():
+    currency_codes = ["DOGE", "SHIB"]
+    all_data_dfs = [generate_random_walk(seed) for seed in range(len(currency_codes))]
+
+    for params in PARAMS:
+        assert_same_results(
+            run_back_test(params, currency_codes, all_data_dfs),
+            run_back_test(params, currency_codes, all_data_dfs, incremental=True),
+        )
+
+    print("Incremental backtest matches the per-window backtest")
+
+
+if __name__ == "__main__":
+    test_indicator_equivalence()
+    test_incremental_parity()
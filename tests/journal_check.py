@@ -0,0 +1,270 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from math import isclose
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from StratDaemon.integration.broker.base import BaseBroker
+from StratDaemon.models.crypto import CryptoOrder
+from StratDaemon.portfolio.journal import OrderJournal, read_journal, replay_orders
+from StratDaemon.portfolio.portfolio_manager import PortfolioManager
+from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
+from tests.ledger_check import (
+    BUY_POWER,
+    CURRENCY_CODES,
+    START_DT,
+    generate_ticks,
+    replay,
+)
+
+SYNC_EVERY = 64
+NUM_REWRITTEN = 2_000
+NUM_RECENT_BARS = 60  # Bars served when no start is asked for, as Robinhood does
+
+
+class JournalingPortfolioManager(PortfolioManager):
+    # Journals every order that was executed, as the strategies do, raising
+    # the lots' highs by the bars up to each order first
+    def __init__(
+        self, journal: OrderJournal, dt_dfs: Dict[str, pd.DataFrame], *args, **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.journal = journal
+        self.dt_dfs = dt_dfs
+        self.orders: List[CryptoOrder] = []
+
+    def process_order_at(
+        self, cur_prices_dt: Dict[str, float], timestamp: datetime, order: CryptoOrder
+    ) -> List[CryptoOrder]:
+        tick = int((timestamp - START_DT) / timedelta(minutes=1))
+        for currency_code, df in self.dt_dfs.items():
+            self.observe_bars(
+                currency_code,
+                df["close"].to_numpy()[: tick + 1],
+                df["timestamp"].to_numpy()[: tick + 1],
+            )
+        executed_orders = super().process_order_at(cur_prices_dt, timestamp, order)
+        if executed_orders:
+            self.journal.append(executed_orders[0], cur_prices_dt)
+            self.orders.append(executed_orders[0].model_copy())
+        return executed_orders
+
+
+class RecentBarsBroker(BaseBroker):
+    # Serves the last hour of bars, or the bars since `start_dt`
+    def __init__(self, dt_dfs: Dict[str, pd.DataFrame]) -> None:
+        super().__init__()
+        self.dt_dfs = dt_dfs
+
+    def authenticate(self) -> None:
+        pass
+
+    def get_crypto_historical(
+        self,
+        currency_code: str,
+        interval: str,
+        span: str,
+        start_dt: datetime | None = None,
+    ) -> pd.DataFrame:
+        df = self.dt_dfs[currency_code]
+        if start_dt is None:
+            return df.iloc[-NUM_RECENT_BARS:]
+        return df[df["timestamp"] >= start_dt]
+
+
+def write_order_to_file(path: Path, order: CryptoOrder) -> None:
+    # How orders used to be saved, rewriting every order before on each one
+    positions = []
+    if path.exists():
+        with open(path, "r") as f:
+            positions = json.load(f)
+
+    positions.append(order.model_dump_json())
+
+    with open(path, "w") as f:
+        json.dump(positions, f)
+
+
+def to_dt_dfs(prices: np.ndarray) -> Dict[str, pd.DataFrame]:
+    timestamps = pd.date_range(START_DT, periods=len(prices), freq="1min")
+    return {
+        currency_code: pd.DataFrame({"close": prices[:, idx], "timestamp": timestamps})
+        for idx, currency_code in enumerate(CURRENCY_CODES)
+    }
+
+
+def assert_same_state(portfolio_mgr: PortfolioManager, expected: PortfolioManager):
+    assert isclose(portfolio_mgr.buy_power, expected.buy_power, rel_tol=1e-9)
+    assert portfolio_mgr.num_buy_trades == expected.num_buy_trades
+    assert portfolio_mgr.num_sell_trades == expected.num_sell_trades
+    holdings, expected_holdings = (
+        portfolio_mgr.get_holdings(),
+        expected.get_holdings(),
+    )
+    assert len(holdings) == len(expected_holdings)
+    for holding, expected_holding in zip(holdings, expected_holdings):
+        assert holding.currency_code == expected_holding.currency_code
+        assert holding.timestamp == expected_holding.timestamp
+        assert isclose(holding.quantity, expected_holding.quantity, rel_tol=1e-9)
+        assert isclose(holding.amount, expected_holding.amount, rel_tol=1e-9)
+    ledger, expected_ledger = portfolio_mgr.ledger, expected.ledger
+    assert np.allclose(
+        ledger.lot_highs[ledger.get_lot_idxs()],
+        expected_ledger.lot_highs[expected_ledger.get_lot_idxs()],
+        rtol=1e-12,
+    )
+    metrics, expected_metrics = (
+        portfolio_mgr.metrics.get_results(),
+        expected.metrics.get_results(),
+    )
+    for field in ("turnover", "fees", "win_rate", "realized_pnl"):
+        assert isclose(
+            getattr(metrics, field), getattr(expected_metrics, field), rel_tol=1e-9
+        ), field
+
+
+def test_journal():
+    ticks = generate_ticks()
+    dt_dfs = to_dt_dfs(ticks[0])
+    tmp_dir = Path(tempfile.mkdtemp())
+    path = tmp_dir / "orders.jsonl"
+    journal = OrderJournal(path, SYNC_EVERY)
+    portfolio_mgr = JournalingPortfolioManager(
+        journal, dt_dfs, CURRENCY_CODES, BUY_POWER, initial_timestamp=START_DT
+    )
+    replay(portfolio_mgr, ticks)
+    journal.close()
+    for currency_code, df in dt_dfs.items():
+        portfolio_mgr.observe_bars(
+            currency_code, df["close"].to_numpy(), df["timestamp"].to_numpy()
+        )
+    orders = portfolio_mgr.orders
+
+    # Every executed order is read back as it was
+    records = list(read_journal(path))
+    assert [record.order for record in records] == orders
+
+    # A restart rebuilds the same positions, trades and trailing highs, each
+    # lot's being the highest close since it was bought
+    restored_mgr = PortfolioManager(
+        CURRENCY_CODES, BUY_POWER, initial_timestamp=START_DT
+    )
+    start = time.perf_counter()
+    replay_orders(restored_mgr, read_journal(path), dt_dfs)
+    restore_time = time.perf_counter() - start
+    assert_same_state(restored_mgr, portfolio_mgr)
+    ledger = restored_mgr.ledger
+    lot_idxs = ledger.get_lot_idxs()
+    assert len(lot_idxs) > 0
+    for lot_idx in lot_idxs:
+        closes = ticks[0][:, ledger.lot_currencies[lot_idx]]
+        tick = int((ledger.lot_timestamps[lot_idx] - START_DT) / timedelta(minutes=1))
+        assert isclose(ledger.lot_highs[lot_idx], closes[tick:].max(), rel_tol=1e-12)
+
+    # Filters by currency and time, with both ends included
+    start_dt, end_dt = START_DT + timedelta(days=3), START_DT + timedelta(days=6)
+    expected = [
+        order
+        for order in orders
+        if order.currency_code in ("ETH", "SOL")
+        and start_dt <= order.timestamp <= end_dt
+    ]
+    assert len(expected) > 0
+    assert [
+        record.order for record in read_journal(path, ["ETH", "SOL"], start_dt, end_dt)
+    ] == expected
+
+    # Orders appended after a restart follow the ones before, and an order
+    # cut short by a crash is left out
+    journal = OrderJournal(path)
+    journal.append(orders[0], records[0].prices)
+    journal.close()
+    with open(path, "a") as f:
+        f.write(records[1].model_dump_json()[:40])
+    records = list(read_journal(path))
+    assert len(records) == len(orders) + 1 and records[-1].order == orders[0]
+
+    # Restored after the crash, the journal drops the cut short order before
+    # appending, so the next one is read back and replayed again
+    restored_mgr = PortfolioManager(
+        CURRENCY_CODES, BUY_POWER, initial_timestamp=START_DT
+    )
+    replay_orders(restored_mgr, read_journal(path), dt_dfs)
+    journal = OrderJournal(path)
+    journal.append(orders[1], records[1].prices)
+    journal.close()
+    records = list(read_journal(path))
+    assert len(records) == len(orders) + 2 and records[-1].order == orders[1]
+    with open(path, "r") as f:
+        assert all(json.loads(line) for line in f)
+    restored_mgr = PortfolioManager(
+        CURRENCY_CODES, BUY_POWER, initial_timestamp=START_DT
+    )
+    replay_orders(restored_mgr, records, dt_dfs)
+
+    new_path = tmp_dir / "new_orders.jsonl"
+    journal = OrderJournal(new_path, SYNC_EVERY)
+    start = time.perf_counter()
+    for record in records[:NUM_REWRITTEN]:
+        journal.append(record.order, record.prices)
+    journal.close()
+    journal_time = time.perf_counter() - start
+
+    old_path = tmp_dir / "orders.json"
+    start = time.perf_counter()
+    for order in orders[:NUM_REWRITTEN]:
+        write_order_to_file(old_path, order)
+    rewrite_time = time.perf_counter() - start
+    with open(old_path, "r") as f:
+        assert [
+            CryptoOrder.model_validate_json(order) for order in json.load(f)
+        ] == orders[:NUM_REWRITTEN]
+    print(
+        f"Journaled {NUM_REWRITTEN} orders in {journal_time:.2f}s synced every "
+        f"{SYNC_EVERY} (rewriting the file: {rewrite_time:.2f}s), and restored "
+        f"{len(orders)} in {restore_time:.2f}s"
+    )
+    for file_path in (path, new_path, old_path):
+        os.remove(file_path)
+
+
+def test_restore_highs():
+    # A lot bought hours ago, whose high was long before the last hour of bars
+    prices = np.full((10 * NUM_RECENT_BARS, len(CURRENCY_CODES)), 100.0)
+    prices[NUM_RECENT_BARS, 0] = 120.0
+    prices[2 * NUM_RECENT_BARS :, 0] = 110.0
+    dt_dfs = to_dt_dfs(prices)
+    path = Path(tempfile.mkdtemp()) / "orders.jsonl"
+    journal = OrderJournal(path)
+    journal.append(
+        CryptoOrder(
+            side="buy",
+            currency_code=CURRENCY_CODES[0],
+            asset_price=100.0,
+            amount=990.0,
+            limit_price=-1,
+            quantity=9.9,
+            timestamp=START_DT,
+        ),
+        dict(zip(CURRENCY_CODES, prices[0])),
+    )
+    journal.close()
+
+    # A strategy fetches the bars since the oldest open lot of each currency
+    # was bought, rather than only the last hour
+    strat = FibVolRsiStrategy(
+        RecentBarsBroker(dt_dfs), None, CURRENCY_CODES, buy_power=BUY_POWER
+    )
+    strat.restore_positions(path)
+    ledger = strat.portfolio_mgr.ledger
+    assert ledger.lot_highs[ledger.get_lot_idxs()].tolist() == [120.0]
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    test_journal()
+    test_restore_highs()
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+from StratDaemon.utils import kernels
+
+SIZES = [5, 60, 1_000]
+LENGTHS = [2, 14, 20, 30]
+MULTIPLIERS = [1.5, 3]
+
+
+def generate_bars(seed: int, size: int):
+    rng = np.random.default_rng(seed)
+    close = 0.1 * np.exp(np.cumsum(rng.normal(0, 0.003, size)))
+    spread = np.abs(rng.normal(0, 0.001, size)) * close
+    # flat stretches exercise zero ranges and zero price changes
+    close[size // 3 : size // 3 + 25] = close[size // 3]
+    spread[size // 3 : size // 3 + 25] = 0
+    return close + spread, close - spread, close
+
+
+def assert_close(values: np.ndarray, expected) -> None:
+    expected = np.full(len(values), np.nan) if expected is None else expected
+    assert np.allclose(
+        values, np.asarray(expected, dtype=float), rtol=1e-9, atol=1e-12, equal_nan=True
+    )
+
+
+def test_kernel_equivalence():
+    for seed, size in enumerate(SIZES):
+        high, low, close = generate_bars(seed, size)
+        high_sr, low_sr, close_sr = pd.Series(high), pd.Series(low), pd.Series(close)
+
+        for length in LENGTHS:
+            assert_close(kernels.sma(close, length), ta.sma(close_sr, length=length))
+            assert_close(kernels.rsi(close, length), ta.rsi(close_sr, length=length))
+            assert_close(
+                kernels.atr(high, low, close, length),
+                ta.atr(high_sr, low_sr, close_sr, length=length),
+            )
+
+            boll = ta.bbands(close_sr, length=length)
+            for values, col in zip(
+                kernels.bbands(close, length), ["BBL", "BBM", "BBU"]
+            ):
+                assert_close(
+                    values, None if boll is None else boll[f"{col}_{length}_2.0"]
+                )
+
+            if size < length:
+                continue
+            for multiplier in MULTIPLIERS:
+                super_trend = ta.supertrend(
+                    high_sr, low_sr, close_sr, length, multiplier
+                )
+                props = f"_{length}_{float(multiplier)}"
+                for values, col in zip(
+                    kernels.supertrend(high, low, close, length, multiplier),
+                    ["SUPERT", "SUPERTd", "SUPERTl", "SUPERTs"],
+                ):
+                    assert_close(values, super_trend[f"{col}{props}"])
+
+    print("NumPy kernels match pandas_ta")
+
+
+if __name__ == "__main__":
+    test_kernel_equivalence()
@@ -0,0 +1,229 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from math import isclose
+from typing import Dict, List
+import numpy as np
+from StratDaemon.models.crypto import CryptoOrder, Portfolio
+from StratDaemon.portfolio.portfolio_manager import PortfolioManager
+
+CURRENCY_CODES = ["BTC", "ETH", "DOGE", "SHIB", "SOL"]
+BUY_POWER = 10_000_000
+NUM_TICKS = 20_000
+START_DT = datetime(2024, 1, 8)
+
+
+class ListPortfolioManager:
+    # How PortfolioManager used to keep holdings, as lists of orders in every
+    # snapshot walked on every order
+    def __init__(self, buy_power: float) -> None:
+        self.transaction_fee = 0.01
+        self.num_buy_trades = self.num_sell_trades = 0
+        self.portfolio_hist = [
+            Portfolio(value=buy_power, buy_power=buy_power, timestamp=START_DT)
+        ]
+
+    def create_stop_loss_orders(
+        self,
+        exit_signals: Dict[str, bool],
+        cur_prices_dt: Dict[str, float],
+        timestamp: datetime,
+    ) -> List[CryptoOrder]:
+        new_sell_orders = []
+        for holding in self.portfolio_hist[-1].holdings:
+            currency_code = holding.currency_code
+            if exit_signals[currency_code]:
+                cur_price = cur_prices_dt[currency_code]
+                new_sell_orders.append(
+                    CryptoOrder(
+                        currency_code=currency_code,
+                        side="sell",
+                        amount=cur_price * holding.quantity,
+                        asset_price=cur_price,
+                        quantity=holding.quantity,
+                        timestamp=timestamp,
+                        limit_price=-1,
+                    )
+                )
+        return new_sell_orders
+
+    def process_order_at(
+        self, cur_prices_dt: Dict[str, float], timestamp: datetime, order: CryptoOrder
+    ) -> List[CryptoOrder]:
+        prev_portfolio = self.portfolio_hist[-1]
+        cur_portfolio = Portfolio(
+            value=prev_portfolio.value,
+            buy_power=prev_portfolio.buy_power,
+            timestamp=timestamp,
+        )
+        cur_holdings, executed_orders = getattr(self, f"handle_{order.side}_order")(
+            cur_prices_dt, order, prev_portfolio, cur_portfolio
+        )
+        cur_portfolio.holdings = cur_holdings
+        cur_portfolio.value = self.calculate_portfolio_value(
+            cur_portfolio, cur_prices_dt
+        )
+        self.portfolio_hist.append(cur_portfolio)
+        return executed_orders
+
+    def calculate_portfolio_value(
+        self, portfolio: Portfolio, cur_prices_dt: Dict[str, float]
+    ) -> float:
+        return portfolio.buy_power + sum(
+            holding.quantity * cur_prices_dt[holding.currency_code]
+            for holding in portfolio.holdings
+        )
+
+    def handle_buy_order(self, _, order, prev_portfolio, cur_portfolio):
+        cur_holdings = prev_portfolio.holdings
+        executed_orders = []
+        if not self.is_zero(cur_portfolio.buy_power):
+            order.amount = min(order.amount, cur_portfolio.buy_power)
+            cur_portfolio.buy_power -= order.amount
+            order.amount = order.amount * (1 - self.transaction_fee)
+            order.quantity = order.amount / order.asset_price
+            executed_orders.append(order)
+            cur_holdings.append(order)
+            self.num_buy_trades += 1
+        return cur_holdings, executed_orders
+
+    def handle_sell_order(self, cur_prices_dt, order, prev_portfolio, cur_portfolio):
+        cur_holdings = prev_portfolio.holdings
+        currency_code = order.currency_code
+        executed_orders = []
+
+        total_holdings_amt = defaultdict(list)
+        for holding in cur_holdings:
+            holding.amount = holding.quantity * cur_prices_dt[holding.currency_code]
+            total_holdings_amt[holding.currency_code].append(holding.amount)
+        order.amount = min(order.amount, sum(total_holdings_amt[currency_code]))
+        original_order_amount = order.amount
+
+        for holding in cur_holdings:
+            if holding.currency_code != order.currency_code:
+                continue
+            sell_amount = min(holding.amount, order.amount)
+            holding.amount -= sell_amount
+            order.amount -= sell_amount
+            holding.quantity -= sell_amount / cur_prices_dt[currency_code]
+            cur_portfolio.buy_power += sell_amount * (1 - self.transaction_fee)
+            executed_orders.append(order)
+            self.num_sell_trades += 1
+            if self.is_zero(order.amount):
+                break
+
+        order.amount = original_order_amount
+        return [
+            holding for holding in cur_holdings if not self.is_zero(holding.amount)
+        ], executed_orders
+
+    def is_zero(self, num: float) -> bool:
+        return isclose(num, 0, abs_tol=1)
+
+
+def generate_ticks(seed: int = 0):
+    # Prices, and per tick a currency to trade, the side and the amount, or a
+    # stop loss of the currency
+    rng = np.random.default_rng(seed)
+    prices = np.exp(
+        np.cumsum(rng.normal(0, 0.01, (NUM_TICKS, len(CURRENCY_CODES))), axis=0)
+    )
+    currencies = rng.integers(0, len(CURRENCY_CODES), NUM_TICKS)
+    sides = rng.choice(["buy", "sell", "stop"], NUM_TICKS, p=[0.8, 0.17, 0.03])
+    amounts = rng.uniform(0.5, 3_000, NUM_TICKS)
+    return prices, currencies, sides, amounts
+
+
+def replay(portfolio_mgr, ticks) -> List[CryptoOrder]:
+    executed = []
+    for tick, (prices, currency, side, amount) in enumerate(zip(*ticks)):
+        cur_prices_dt = dict(zip(CURRENCY_CODES, prices))
+        timestamp = START_DT + timedelta(minutes=tick)
+        currency_code = CURRENCY_CODES[currency]
+        if side == "stop" and isinstance(portfolio_mgr, PortfolioManager):
+            orders = portfolio_mgr.create_stop_loss_orders(
+                portfolio_mgr.ledger.get_lot_idxs([currency_code]),
+                cur_prices_dt,
+                timestamp,
+            )
+        elif side == "stop":
+            orders = portfolio_mgr.create_stop_loss_orders(
+                {code: code == currency_code for code in CURRENCY_CODES},
+                cur_prices_dt,
+                timestamp,
+            )
+        else:
+            price = cur_prices_dt[currency_code]
+            orders = [
+                CryptoOrder(
+                    side=side,
+                    currency_code=currency_code,
+                    asset_price=price,
+                    amount=amount,
+                    limit_price=price,
+                    quantity=amount / price,
+                    timestamp=timestamp,
+                )
+            ]
+        for order in orders:
+            executed.extend(
+                portfolio_mgr.process_order_at(cur_prices_dt, timestamp, order)
+            )
+    return executed
+
+
+def test_ledger():
+    ticks = generate_ticks()
+    list_mgr = ListPortfolioManager(BUY_POWER)
+    start = time.perf_counter()
+    list_executed = replay(list_mgr, ticks)
+    list_time = time.perf_counter() - start
+
+    portfolio_mgr = PortfolioManager(
+        CURRENCY_CODES, BUY_POWER, initial_timestamp=START_DT
+    )
+    start = time.perf_counter()
+    executed = replay(portfolio_mgr, ticks)
+    ledger_time = time.perf_counter() - start
+
+    assert len(executed) == len(list_executed)
+    assert (portfolio_mgr.num_buy_trades, portfolio_mgr.num_sell_trades) == (
+        list_mgr.num_buy_trades,
+        list_mgr.num_sell_trades,
+    )
+    assert len(portfolio_mgr.portfolio_hist) == len(list_mgr.portfolio_hist)
+    for port, list_port in zip(portfolio_mgr.portfolio_hist, list_mgr.portfolio_hist):
+        assert port.timestamp == list_port.timestamp
+        assert isclose(port.value, list_port.value, rel_tol=1e-9)
+        assert isclose(port.buy_power, list_port.buy_power, rel_tol=1e-9)
+
+    holdings = portfolio_mgr.get_holdings()
+    list_holdings = list_mgr.portfolio_hist[-1].holdings
+    assert len(holdings) > 0
+    assert [h.currency_code for h in holdings] == [
+        h.currency_code for h in list_holdings
+    ]
+    for holding, list_holding in zip(holdings, list_holdings):
+        assert holding.timestamp == list_holding.timestamp
+        assert isclose(holding.quantity, list_holding.quantity, rel_tol=1e-9)
+
+    # Holdings carried into another portfolio value the same
+    cur_prices_dt = dict(zip(CURRENCY_CODES, ticks[0][-1]))
+    next_mgr = PortfolioManager(CURRENCY_CODES, 0)
+    next_mgr.add_holdings(holdings)
+    assert isclose(
+        next_mgr.calculate_portfolio_value(cur_prices_dt) + portfolio_mgr.buy_power,
+        portfolio_mgr.calculate_portfolio_value(cur_prices_dt),
+        rel_tol=1e-9,
+    )
+
+    assert ledger_time < list_time
+    print(
+        f"Replayed {portfolio_mgr.num_buy_trades + portfolio_mgr.num_sell_trades} "
+        f"trades in {ledger_time:.2f}s on the ledger vs {list_time:.2f}s on "
+        f"lists of holdings"
+    )
+
+
+if __name__ == "__main__":
+    test_ledger()
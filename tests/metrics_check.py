@@ -0,0 +1,137 @@
+import time
+from math import isclose
+from typing import List
+import numpy as np
+import pandas as pd
+from StratDaemon.portfolio.metrics import MetricsAccumulator
+from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
+from tests.back_tester import BackTester, create_strat
+from tests.vectorized_parity import (
+    BUY_POWER,
+    MAX_AMOUNT_PER_ORDER,
+    PARAMS,
+    generate_random_walk,
+)
+
+CURRENCY_CODES = ["DOGE", "SHIB"]
+NUM_VALUES = 200_000
+
+
+def compute_from_history(values: np.ndarray) -> dict:
+    # How the metrics would be computed from the whole value history
+    returns = pd.Series(values).pct_change().dropna()
+    peaks = np.maximum.accumulate(values)
+    return {
+        "total_return": values[-1] / values[0] - 1,
+        "max_drawdown": float((1 - values / peaks).max()),
+        "mean_return": returns.mean(),
+        "return_std": returns.std(),
+        "sharpe_ratio": returns.mean() / returns.std(),
+        "sortino_ratio": returns.mean() / np.sqrt((returns.clip(upper=0) ** 2).mean()),
+    }
+
+
+def assert_metrics(metrics, expected: dict) -> None:
+    for name, value in expected.items():
+        assert isclose(
+            getattr(metrics, name), value, rel_tol=1e-6, abs_tol=1e-12
+        ), f"{name} differs: {getattr(metrics, name)} vs {value}"
+
+
+def test_accumulator():
+    rng = np.random.default_rng(0)
+    values = 1_000 * np.exp(np.cumsum(rng.normal(0, 0.01, NUM_VALUES)))
+    positions_values = values * rng.uniform(0, 1, NUM_VALUES)
+    positions_values[rng.uniform(0, 1, NUM_VALUES) < 0.3] = 0.0
+
+    start = time.perf_counter()
+    accumulator = MetricsAccumulator()
+    for value, positions_value in zip(values.tolist(), positions_values.tolist()):
+        accumulator.update(value, positions_value)
+    update_time = time.perf_counter() - start
+    metrics = accumulator.get_results()
+    expected = compute_from_history(values)
+    assert_metrics(metrics, expected)
+    assert metrics.time_in_market == np.mean(positions_values > 0)
+    assert isclose(metrics.mean_exposure, np.mean(positions_values / values))
+
+    # Batches of ticks of any size give the same metrics
+    batched = MetricsAccumulator()
+    bounds = np.sort(rng.choice(np.arange(1, NUM_VALUES), 500, replace=False))
+    for batch, positions_batch in zip(
+        np.split(values, bounds), np.split(positions_values, bounds)
+    ):
+        if len(batch) == 1:
+            batched.update(float(batch[0]), float(positions_batch[0]))
+        else:
+            batched.update_many(batch, positions_batch)
+    assert_metrics(batched.get_results(), metrics.model_dump())
+    print(
+        f"Accumulated metrics of {NUM_VALUES} ticks in {update_time:.2f}s, "
+        "matching the metrics of the whole history"
+    )
+
+
+def test_zero_values():
+    # Returns, drawdowns and exposure to a zero value count as none, one tick
+    # at a time or in a batch
+    values = np.array([100.0, 0.0, 0.0, 50.0, 100.0])
+    positions_values = np.array([50.0, 0.0, 0.0, 25.0, 0.0])
+    accumulator, batched = MetricsAccumulator(), MetricsAccumulator()
+    with np.errstate(divide="raise", invalid="raise"):
+        for value, positions_value in zip(values.tolist(), positions_values.tolist()):
+            accumulator.update(value, positions_value)
+        batched.update_many(values, positions_values)
+    metrics = accumulator.get_results()
+    assert metrics.mean_return == 0.0 and metrics.max_drawdown == 1.0
+    assert isclose(metrics.mean_exposure, 0.2)
+    assert_metrics(batched.get_results(), metrics.model_dump())
+    print("Metrics of a portfolio worth nothing at times stay finite")
+
+
+def test_back_test_metrics():
+    # The metrics of a backtest match those of the value after every tick
+    all_data_dfs = [generate_random_walk(seed) for seed in range(len(CURRENCY_CODES))]
+    params = PARAMS[0]
+    for vectorized in (False, True):
+        strat = create_strat(
+            FibVolRsiStrategy,
+            CURRENCY_CODES,
+            BUY_POWER,
+            MAX_AMOUNT_PER_ORDER,
+            BUY_POWER / len(CURRENCY_CODES),
+            params.p_diff,
+            params.vol_window,
+            params.indicator_length,
+            params.rsi_buy_threshold,
+            params.rsi_sell_threshold,
+            params.rsi_percent_incr_threshold,
+            params.rsi_trend_span,
+            params.trailing_stop_loss,
+            params.trailing_take_profit,
+        )
+        back_tester = BackTester(
+            strat,
+            CURRENCY_CODES,
+            BUY_POWER,
+            span=params.span,
+            wait_time=params.wait_time,
+            all_data_dfs=[df.copy() for df in all_data_dfs],
+        )
+        values: List[float] = []
+        _, num_buy_trades, num_sell_trades, metrics = back_tester.run(
+            vectorized=vectorized,
+            progress_callback=lambda tick, total, value: values.append(value),
+            progress_freq=1,
+        )
+        assert metrics.num_ticks == len(values)
+        assert_metrics(metrics, compute_from_history(np.array(values)))
+        assert metrics.max_drawdown > 0 and 0 < metrics.time_in_market < 1
+        assert num_buy_trades > 0 and num_sell_trades > 0 and metrics.turnover > 0
+    print("Backtest metrics match the metrics of the value after every tick")
+
+
+if __name__ == "__main__":
+    test_accumulator()
+    test_zero_values()
+    test_back_test_metrics()
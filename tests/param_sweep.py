@@ -0,0 +1,152 @@
+from collections import defaultdict
+from datetime import datetime
+from itertools import product
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from StratDaemon.strats.base import BaseStrategy
+from StratDaemon.strats.batch import execute_batch
+from StratDaemon.utils.funcs import DEFAULT_PARAMS, Parameters
+from StratDaemon.utils.result_cache import RESULT_CACHE, BacktestResult, hash_data_dfs
+from tests.back_tester import BackTester, create_strat, get_result_key, load_data_dfs
+
+# Parameters that change the indicators or the ticks they are sampled at, as
+# opposed to the thresholds the decision rules compare them against
+INDICATOR_PARAMS = [
+    "span",
+    "wait_time",
+    "indicator_length",
+    "vol_window",
+    "rsi_trend_span",
+]
+
+
+def create_param_grid(
+    base: Parameters = DEFAULT_PARAMS, **values: List[Any]
+) -> List[Parameters]:
+    return [
+        base.model_copy(update=dict(zip(values, combo)))
+        for combo in product(*values.values())
+    ]
+
+
+def group_by_indicator_params(
+    params_list: List[Parameters],
+) -> Dict[Tuple[Any, ...], List[int]]:
+    groups = defaultdict(list)
+    for i, params in enumerate(params_list):
+        groups[tuple(getattr(params, name) for name in INDICATOR_PARAMS)].append(i)
+    return groups
+
+
+def sweep(
+    strat_def: BaseStrategy,
+    params_list: List[Parameters],
+    crypto_currency_codes: List[str],
+    buy_power: float,
+    max_amount_per_order: float,
+    max_holding_per_currency: float,
+    start_dt: datetime | None = None,
+    end_dt: datetime | None = None,
+) -> pd.DataFrame:
+    # Vectorized backtests of every parameter set, where the indicators are
+    # computed once per group of sets sharing `INDICATOR_PARAMS` and the
+    # group's portfolios are replayed together by `execute_batch`
+    for params in params_list:
+        assert (
+            params.span - (params.indicator_length - 1) > params.vol_window
+        ), "Interval inputs are invalid"
+
+    data_hash = hash_data_dfs(
+        load_data_dfs(crypto_currency_codes, start_dt, end_dt), start_dt, end_dt
+    )
+    keys = [
+        get_result_key(
+            strat_def,
+            max_amount_per_order,
+            max_holding_per_currency,
+            params,
+            crypto_currency_codes,
+            buy_power,
+            start_dt,
+            end_dt,
+            data_hash=data_hash,
+        )
+        for params in params_list
+    ]
+    results: List[BacktestResult | None] = [RESULT_CACHE.get(key) for key in keys]
+
+    for idxs in group_by_indicator_params(params_list).values():
+        idxs = [i for i in idxs if results[i] is None]
+        if not idxs:
+            continue
+
+        strats = [
+            create_strat(
+                strat_def,
+                crypto_currency_codes,
+                buy_power,
+                max_amount_per_order,
+                max_holding_per_currency,
+                params_list[i].p_diff,
+                params_list[i].vol_window,
+                params_list[i].indicator_length,
+                params_list[i].rsi_buy_threshold,
+                params_list[i].rsi_sell_threshold,
+                params_list[i].rsi_percent_incr_threshold,
+                params_list[i].rsi_trend_span,
+                params_list[i].trailing_stop_loss,
+                params_list[i].trailing_take_profit,
+            )
+            for i in idxs
+        ]
+        params = params_list[idxs[0]]
+        back_tester = BackTester(
+            strats[0],
+            crypto_currency_codes,
+            buy_power,
+            span=params.span,
+            wait_time=params.wait_time,
+            start_dt=start_dt,
+            end_dt=end_dt,
+        )
+        dt_closes, timestamps, ends = back_tester.get_vectorized_inputs(
+            *back_tester.get_time_range(start_dt, end_dt)
+        )
+        dt_features = {
+            currency_code: strats[0].compute_features(close, ends, params.span)
+            for currency_code, close in dt_closes.items()
+        }
+        batch = execute_batch(
+            strats, dt_closes, timestamps, ends, params.span, dt_features
+        )
+
+        last_closes = back_tester.get_last_closes()
+        values = batch.get_values(
+            np.array([last_closes[code] for code in crypto_currency_codes])
+        )
+        for row, i in enumerate(idxs):
+            results[i] = BacktestResult(
+                value=values[row],
+                buy_power=batch.buy_power[row],
+                holdings=batch.get_holdings(row, timestamps),
+                num_buy_trades=batch.num_buy_trades[row],
+                num_sell_trades=batch.num_sell_trades[row],
+                metrics=batch.get_metrics(row),
+            )
+            RESULT_CACHE.put(keys[i], results[i])
+
+    return pd.DataFrame(
+        [
+            {
+                **params.model_dump(),
+                "value": result.value,
+                "buy_power": result.buy_power,
+                "num_buy_trades": result.num_buy_trades,
+                "num_sell_trades": result.num_sell_trades,
+                "num_trades": result.num_trades,
+                **result.metrics.model_dump(),
+            }
+            for params, result in zip(params_list, results)
+        ]
+    )
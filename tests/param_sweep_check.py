@@ -0,0 +1,102 @@
+import os
+import tempfile
+import time
+from math import isclose
+from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
+from StratDaemon.utils.dataset_cache import DATASET_CACHE
+from StratDaemon.utils.result_cache import RESULT_CACHE
+from tests.back_tester import get_dataset_key
+from tests.param_sweep import create_param_grid, group_by_indicator_params, sweep
+from tests.vectorized_parity import (
+    BUY_POWER,
+    MAX_AMOUNT_PER_ORDER,
+    PARAMS,
+    generate_random_walk,
+    run_back_test,
+)
+
+CURRENCY_CODES = ["DOGE", "SHIB"]
+
+
+def count_feature_calls() -> list:
+    num_calls = [0]
+    compute_features = FibVolRsiStrategy.compute_features
+
+    def counted(self, *args, **kwargs):
+        num_calls[0] += 1
+        return compute_features(self, *args, **kwargs)
+
+    FibVolRsiStrategy.compute_features = counted
+    return num_calls
+
+
+def test_param_sweep():
+    all_data_dfs = [generate_random_walk(seed) for seed in range(len(CURRENCY_CODES))]
+    DATASET_CACHE.get_or_load(get_dataset_key(CURRENCY_CODES), lambda: all_data_dfs)
+    RESULT_CACHE.path = os.path.join(tempfile.mkdtemp(), "results.db")
+
+    params_list = create_param_grid(
+        PARAMS[0],
+        span=[PARAMS[0].span, PARAMS[0].span - 10],
+        p_diff=[0.02, 0.05],
+        rsi_buy_threshold=[45, 55],
+        rsi_percent_incr_threshold=[0.1, 0.2],
+        trailing_stop_loss=[0.05, 0.1],
+    )
+    num_groups = len(group_by_indicator_params(params_list))
+    assert num_groups == 2
+
+    num_calls = count_feature_calls()
+    start = time.perf_counter()
+    results_df = sweep(
+        FibVolRsiStrategy,
+        params_list,
+        CURRENCY_CODES,
+        BUY_POWER,
+        MAX_AMOUNT_PER_ORDER,
+        BUY_POWER / len(CURRENCY_CODES),
+    )
+    sweep_time = time.perf_counter() - start
+    # Indicators are computed once per group and currency
+    assert num_calls[0] == num_groups * len(CURRENCY_CODES)
+    assert len(results_df) == len(params_list)
+
+    start = time.perf_counter()
+    for params, row in zip(params_list, results_df.itertuples()):
+        port_hist, num_buy_trades, num_sell_trades, metrics = run_back_test(
+            params, CURRENCY_CODES, all_data_dfs, vectorized=True
+        )
+        assert isclose(row.value, port_hist[-1].value, rel_tol=1e-9)
+        assert isclose(row.buy_power, port_hist[-1].buy_power, rel_tol=1e-9)
+        assert isclose(row.max_drawdown, metrics.max_drawdown, rel_tol=1e-9)
+        assert isclose(row.sharpe_ratio, metrics.sharpe_ratio, rel_tol=1e-9)
+        assert (row.num_buy_trades, row.num_sell_trades) == (
+            num_buy_trades,
+            num_sell_trades,
+        )
+    single_time = time.perf_counter() - start
+    assert results_df.num_trades.nunique() > 1, "Parameter sets did not differ"
+    # A group's portfolios are replayed together rather than one by one
+    assert sweep_time < single_time / 2, f"{sweep_time:.2f}s vs {single_time:.2f}s"
+
+    # A repeated sweep is served from the result cache
+    num_calls[0] = 0
+    assert sweep(
+        FibVolRsiStrategy,
+        params_list,
+        CURRENCY_CODES,
+        BUY_POWER,
+        MAX_AMOUNT_PER_ORDER,
+        BUY_POWER / len(CURRENCY_CODES),
+    ).equals(results_df)
+    assert num_calls[0] == 0
+
+    print(
+        f"Sweep of {len(params_list)} parameter sets in {num_groups} groups matches "
+        f"single backtests ({sweep_time:.2f}s vs {single_time:.2f}s, "
+        f"{single_time / sweep_time:.1f}x faster)"
+    )
+
+
+if __name__ == "__main__":
+    test_param_sweep()
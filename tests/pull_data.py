@@ -1,8 +1,17 @@
+import os
 from StratDaemon.integration.broker.alpaca import AlpacaBroker
-from StratDaemon.utils.constants import CRYPTO_CURRENCY_CODES
+from StratDaemon.integration.db.bar_store import ColumnarBarStore
+from StratDaemon.utils.constants import (
+    ALPACA_DATA_SOURCE,
+    BAR_STORE_PATH,
+    CRYPTO_CURRENCY_CODES,
+)
 
 
-broker = AlpacaBroker()
+# The backtester's bar store, so pulled bars are mirrored into it
+broker = AlpacaBroker(
+    bar_store=ColumnarBarStore(os.path.join(BAR_STORE_PATH, ALPACA_DATA_SOURCE))
+)
 
 for crypto in CRYPTO_CURRENCY_CODES:
     print(f"Pulling historical data for {crypto}...")
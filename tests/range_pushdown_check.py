@@ -0,0 +1,176 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+import numpy as np
+import pandas as pd
+import tests.back_tester as back_tester
+from StratDaemon.integration.broker.alpaca import AlpacaBroker
+from StratDaemon.integration.db.alpaca import RECORD_COLUMNS, AlpacaMarketstoreDB
+from StratDaemon.integration.db.bar_store import ColumnarBarStore
+from StratDaemon.integration.db.coverage import CoverageIndex
+from StratDaemon.utils.constants import BAR_COLUMNS
+from StratDaemon.utils.dataset_cache import DATASET_CACHE
+from StratDaemon.utils.result_cache import hash_data_dfs
+
+START_DT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+NUM_DAYS = 365
+WEEK_START_DT = datetime(2024, 6, 3, 9, 30)
+WEEK_END_DT = WEEK_START_DT + timedelta(days=7)
+WARMUP_BARS = 60
+
+
+class FakeResult:
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.data = df
+
+    def first(self) -> "FakeResult":
+        return self
+
+    def df(self) -> pd.DataFrame:
+        return self.data
+
+
+class FakeMarketstoreClient:
+    # Keeps every written record, like a variable-length bucket, and answers
+    # range queries in time order
+    def __init__(self) -> None:
+        self.writes: List[np.ndarray] = []
+
+    def list_symbols(self) -> List[str]:
+        return []
+
+    def write(self, data: np.ndarray, tbk: str, isvariablelength: bool) -> dict:
+        self.writes.append(data)
+        return {"responses": None}
+
+    def get_records(self) -> np.ndarray:
+        data = np.concatenate(self.writes)
+        return data[np.argsort(data["Epoch"], kind="stable")]
+
+    def query(self, params) -> FakeResult:
+        data = self.get_records()
+        start = pd.Timestamp(params.start).timestamp()
+        end = pd.Timestamp(params.end).timestamp()
+        data = data[(data["Epoch"] >= start) & (data["Epoch"] <= end)]
+        df = pd.DataFrame(data)
+        df.index = pd.to_datetime(df.pop("Epoch"), unit="s", utc=True)
+        df.index.name = "Epoch"
+        return FakeResult(df)
+
+
+def generate_records(start_dt: datetime, num_minutes: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    records = np.empty(
+        num_minutes,
+        dtype=[("Epoch", np.int64)] + [(col, np.float64) for col in RECORD_COLUMNS],
+    )
+    records["Epoch"] = int(start_dt.timestamp()) + 60 * np.arange(num_minutes)
+    close = 0.1 * np.exp(np.cumsum(rng.normal(0, 1e-3, num_minutes)))
+    for col in RECORD_COLUMNS:
+        records[col] = close
+    records["volume"] = 100.0
+    return records
+
+
+def create_broker(**kwargs) -> AlpacaBroker:
+    db = AlpacaMarketstoreDB(
+        coverage_index=CoverageIndex(os.path.join(tempfile.mkdtemp(), "coverage.json")),
+        pym_cli=FakeMarketstoreClient(),
+    )
+    records = generate_records(START_DT, NUM_DAYS * 24 * 60)
+    db.write_ticker_data(
+        "DOGE", records, [(int(records["Epoch"][0]), int(records["Epoch"][-1]))]
+    )
+    return AlpacaBroker(db=db, **kwargs)
+
+
+def test_range_pushdown():
+    broker = create_broker()
+
+    # Re-ingesting covered minutes writes only the new ones
+    end_dt = START_DT + timedelta(days=NUM_DAYS)
+    records = generate_records(end_dt - timedelta(days=2), 3 * 24 * 60)
+    broker.db.write_ticker_data(
+        "DOGE",
+        np.concatenate([records, records[::-1]]),
+        [(int(records["Epoch"][0]), int(records["Epoch"][-1]))],
+    )
+    epochs = broker.db.pym_cli.get_records()["Epoch"]
+    assert (np.diff(epochs) > 0).all(), "Duplicate bars were written"
+    assert len(epochs) == (NUM_DAYS + 1) * 24 * 60
+
+    start = time.perf_counter()
+    full_df = broker.get_crypto_historical("DOGE", "minute", end_dt=end_dt)
+    full_df = full_df[
+        (full_df.timestamp >= WEEK_START_DT - timedelta(minutes=WARMUP_BARS))
+        & (full_df.timestamp <= WEEK_END_DT)
+    ]
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    week_df = broker.get_crypto_historical(
+        "DOGE",
+        "minute",
+        start_dt=WEEK_START_DT,
+        end_dt=WEEK_END_DT,
+        warmup_bars=WARMUP_BARS,
+    )
+    week_time = time.perf_counter() - start
+    assert week_time < full_time
+    assert len(week_df) == 7 * 24 * 60 + 1 + WARMUP_BARS
+    assert week_df.timestamp.iloc[0] == WEEK_START_DT - timedelta(minutes=WARMUP_BARS)
+    assert week_df.reset_index(drop=True).equals(full_df.reset_index(drop=True))
+
+    # Buckets written with duplicates before are still read sorted and unique
+    broker.db.pym_cli.writes.append(records[::-1])
+    legacy_df = broker.get_crypto_historical(
+        "DOGE", "minute", end_dt=end_dt + timedelta(days=1)
+    )
+    assert (np.diff(legacy_df.timestamp.to_numpy()) > np.timedelta64(0)).all()
+    assert len(legacy_df) == len(epochs)
+
+    # The bar store takes the whole history on the first read, and serves
+    # ranges afterwards
+    store_broker = create_broker(bar_store=ColumnarBarStore(tempfile.mkdtemp()))
+    store_df = store_broker.get_crypto_historical(
+        "DOGE",
+        "minute",
+        start_dt=WEEK_START_DT,
+        end_dt=WEEK_END_DT,
+        warmup_bars=WARMUP_BARS,
+    )
+    columns = ["timestamp"] + BAR_COLUMNS
+    assert store_df[columns].equals(week_df[columns].reset_index(drop=True))
+    assert store_broker.bar_store.get_time_range("DOGE", "minute") == (
+        START_DT.replace(tzinfo=None),
+        end_dt.replace(tzinfo=None) - timedelta(minutes=1),
+    )
+
+    # Backtest windows load only their bars, matching the full history's
+    back_tester.DEFAULT_BROKER = broker
+    DATASET_CACHE.clear()
+    window_dfs = back_tester.load_data_dfs(["DOGE"], WEEK_START_DT, WEEK_END_DT)
+    all_data_dfs = back_tester.load_data_dfs(["DOGE"])
+    assert hash_data_dfs(window_dfs, WEEK_START_DT, WEEK_END_DT) == hash_data_dfs(
+        all_data_dfs, WEEK_START_DT, WEEK_END_DT
+    )
+    # and are sliced from the full history once it is loaded
+    next_start_dt, next_end_dt = WEEK_END_DT, WEEK_END_DT + timedelta(days=7)
+    sliced_dfs = back_tester.load_data_dfs(["DOGE"], next_start_dt, next_end_dt)
+    DATASET_CACHE.clear()
+    loaded_dfs = back_tester.load_data_dfs(["DOGE"], next_start_dt, next_end_dt)
+    assert all(
+        sliced.reset_index(drop=True).equals(loaded.reset_index(drop=True))
+        for sliced, loaded in zip(sliced_dfs, loaded_dfs)
+    )
+
+    print(
+        f"Loaded a week of minute bars in {week_time * 1_000:.1f}ms "
+        f"(full history and slice: {full_time * 1_000:.1f}ms)"
+    )
+
+
+if __name__ == "__main__":
+    test_range_pushdown()
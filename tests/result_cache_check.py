@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import tempfile
+from StratDaemon.utils.funcs import DEFAULT_PARAMS
+from StratDaemon.utils.result_cache import (
+    BacktestResult,
+    ResultCache,
+    ResultKey,
+    hash_data_dfs,
+)
+from tests.vectorized_parity import generate_random_walk
+
+NUM_PROCESSES = 4
+NUM_KEYS = 50
+
+
+def create_key(data_hash: str, span: int = DEFAULT_PARAMS.span) -> ResultKey:
+    return ResultKey(
+        strategy="FibVolRsiStrategy",
+        params=DEFAULT_PARAMS.model_copy(update={"span": span}),
+        currency_codes=("DOGE", "SHIB"),
+        buy_power=1_000,
+        max_amount_per_order=100,
+        max_holding_per_currency=500,
+        data_hash=data_hash,
+    )
+
+
+def create_result(value: float) -> BacktestResult:
+    return BacktestResult(
+        value=value, buy_power=value, holdings=[], num_buy_trades=1, num_sell_trades=2
+    )
+
+
+def fill_cache(path: str) -> int:
+    cache = ResultCache(path)
+    for span in range(NUM_KEYS):
+        cache.get_or_run(create_key("shared", span), lambda: create_result(span))
+    return cache.num_misses
+
+
+def test_result_cache():
+    path = os.path.join(tempfile.mkdtemp(), "results.db")
+    dfs = [generate_random_walk(seed, 1_000) for seed in range(2)]
+    data_hash = hash_data_dfs(dfs)
+    num_runs = [0]
+
+    def run():
+        num_runs[0] += 1
+        return create_result(123.0)
+
+    cache = ResultCache(path)
+    assert cache.get_or_run(create_key(data_hash), run).num_trades == 3
+    assert cache.get_or_run(create_key(data_hash), run).value == 123.0
+    assert num_runs == [1]
+
+    # Results persist across processes through the database file
+    assert ResultCache(path).get(create_key(data_hash)) == create_result(123.0)
+
+    # Changed bars give a different data hash, so the backtest runs again
+    dfs[1].loc[500, "close"] *= 1.01
+    assert hash_data_dfs(dfs) != data_hash
+    assert hash_data_dfs(dfs, end_dt=dfs[1].timestamp[499]) == hash_data_dfs(
+        [generate_random_walk(seed, 1_000) for seed in range(2)],
+        end_dt=dfs[1].timestamp[499],
+    )
+    cache.get_or_run(create_key(hash_data_dfs(dfs)), run)
+    assert num_runs == [2]
+
+    # Concurrent processes can fill the same cache without losing results
+    with multiprocessing.get_context("spawn").Pool(NUM_PROCESSES) as pool:
+        num_misses = pool.map(fill_cache, [path] * NUM_PROCESSES)
+    assert NUM_KEYS <= sum(num_misses) <= NUM_KEYS * NUM_PROCESSES
+    assert all(
+        cache.get(create_key("shared", span)) == create_result(span)
+        for span in range(NUM_KEYS)
+    )
+    assert fill_cache(path) == 0
+
+    print("Result cache reuses and persists backtest results as expected")
+
+
+if __name__ == "__main__":
+    test_result_cache()
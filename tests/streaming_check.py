@@ -0,0 +1,205 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Tuple
+import numpy as np
+import pandas as pd
+import tests.back_tester as back_tester
+from StratDaemon.integration.broker.alpaca import AlpacaBroker
+from StratDaemon.integration.db.alpaca import AlpacaMarketstoreDB
+from StratDaemon.integration.db.bar_store import ColumnarBarStore
+from StratDaemon.integration.db.coverage import CoverageIndex
+from StratDaemon.portfolio.history import PortfolioHistory
+from StratDaemon.portfolio.metrics import PerformanceMetrics
+from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
+from StratDaemon.utils.dataset_cache import DATASET_CACHE
+from StratDaemon.utils.funcs import Parameters
+from StratDaemon.utils.minute_grid import (
+    MinuteGridStream,
+    slice_minute_grid,
+    to_minute_grid,
+)
+from tests.back_tester import BackTester, create_strat
+from tests.range_pushdown_check import FakeMarketstoreClient
+from tests.vectorized_parity import (
+    BUY_POWER,
+    MAX_AMOUNT_PER_ORDER,
+    PARAMS,
+    START_DT,
+    assert_same_results,
+    generate_random_walk,
+    run_back_test,
+)
+
+CURRENCY_CODES = ["DOGE", "SHIB"]
+CHUNK_SIZES = [timedelta(hours=5), timedelta(days=1, minutes=7)]
+NUM_STORED_DAYS = 120
+STORED_CHUNK_SIZE = timedelta(days=7)
+
+ALL_DATA_DFS = [generate_random_walk(seed) for seed in range(len(CURRENCY_CODES))]
+
+
+def stream_minute_grid(
+    df: pd.DataFrame, start_dt: datetime, end_dt: datetime, chunk_size: timedelta
+) -> pd.DataFrame:
+    stream = MinuteGridStream(start_dt, end_dt)
+    chunk_start_dt = df.timestamp.iloc[0]
+    grid_dfs = []
+    while chunk_start_dt <= df.timestamp.iloc[-1]:
+        chunk_end_dt = chunk_start_dt + chunk_size
+        grid_df = stream.push(
+            df[(df.timestamp >= chunk_start_dt) & (df.timestamp < chunk_end_dt)]
+        )
+        if grid_df is not None:
+            grid_dfs.append(grid_df)
+        chunk_start_dt = chunk_end_dt
+    grid_dfs.append(stream.close())
+    return pd.concat(grid_dfs, ignore_index=True)
+
+
+def test_minute_grid_stream():
+    # Hourly bars with missing hours, some of them at chunk boundaries
+    df = generate_random_walk(0, 30 * 24 * 60).iloc[::60]
+    df = df.drop(index=df.index[[5, 6, 7, 24, 300, 301]]).reset_index(drop=True)
+    grid = to_minute_grid(df)
+
+    first, last = df.timestamp.iloc[0], df.timestamp.iloc[-1]
+    windows = [
+        (first, last),
+        (first - timedelta(minutes=90), last + timedelta(minutes=90)),
+        (first + timedelta(hours=5, minutes=30), last - timedelta(days=3, minutes=1)),
+    ]
+    for start_dt, end_dt in windows:
+        expected_df = slice_minute_grid(grid, start_dt, end_dt)
+        for chunk_size in CHUNK_SIZES:
+            streamed_df = stream_minute_grid(df, start_dt, end_dt, chunk_size)
+            assert streamed_df.equals(
+                expected_df
+            ), f"Streamed minutes from {start_dt} to {end_dt} differ"
+
+
+def run_chunked_back_test(
+    params: Parameters,
+    chunk_size: timedelta,
+    vectorized: bool = False,
+    incremental: bool = False,
+) -> Tuple[PortfolioHistory, int, int, PerformanceMetrics]:
+    strat = create_strat(
+        FibVolRsiStrategy,
+        CURRENCY_CODES,
+        BUY_POWER,
+        MAX_AMOUNT_PER_ORDER,
+        BUY_POWER / len(CURRENCY_CODES),
+        params.p_diff,
+        params.vol_window,
+        params.indicator_length,
+        params.rsi_buy_threshold,
+        params.rsi_sell_threshold,
+        params.rsi_percent_incr_threshold,
+        params.rsi_trend_span,
+        params.trailing_stop_loss,
+        params.trailing_take_profit,
+        incremental,
+    )
+    back_tester = BackTester(
+        strat,
+        CURRENCY_CODES,
+        BUY_POWER,
+        span=params.span,
+        wait_time=params.wait_time,
+        all_data_dfs=ALL_DATA_DFS,
+        chunk_size=chunk_size,
+    )
+    return back_tester.run(vectorized=vectorized)
+
+
+def test_chunked_parity():
+    for params in PARAMS:
+        results = run_back_test(params, CURRENCY_CODES, ALL_DATA_DFS)
+        vectorized_results = run_back_test(
+            params, CURRENCY_CODES, ALL_DATA_DFS, vectorized=True
+        )
+        for chunk_size in CHUNK_SIZES:
+            assert_same_results(results, run_chunked_back_test(params, chunk_size))
+            assert_same_results(
+                results, run_chunked_back_test(params, chunk_size, incremental=True)
+            )
+            assert_same_results(
+                vectorized_results,
+                run_chunked_back_test(params, chunk_size, vectorized=True),
+            )
+
+
+def create_store_broker() -> AlpacaBroker:
+    store = ColumnarBarStore(tempfile.mkdtemp())
+    for seed, currency_code in enumerate(CURRENCY_CODES):
+        store.append(
+            currency_code,
+            "minute",
+            generate_random_walk(seed, NUM_STORED_DAYS * 24 * 60),
+        )
+    db = AlpacaMarketstoreDB(
+        coverage_index=CoverageIndex(os.path.join(tempfile.mkdtemp(), "coverage.json")),
+        pym_cli=FakeMarketstoreClient(),
+    )
+    return AlpacaBroker(bar_store=store, db=db)
+
+
+def run_stored_back_test(chunk_size: timedelta | None):
+    # Hourly bars, as backtests load them, turned into minute windows
+    params = PARAMS[0].model_copy(update={"wait_time": 60})
+    start_dt = START_DT + timedelta(days=1, minutes=30)
+    end_dt = START_DT + timedelta(days=NUM_STORED_DAYS - 1)
+    progress = []
+    DATASET_CACHE.clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = back_tester.conduct_back_test(
+        FibVolRsiStrategy,
+        MAX_AMOUNT_PER_ORDER,
+        BUY_POWER / len(CURRENCY_CODES),
+        crypto_currency_codes=CURRENCY_CODES,
+        buy_power=BUY_POWER,
+        start_dt=start_dt,
+        end_dt=end_dt,
+        vectorized=True,
+        progress_callback=lambda *args: progress.append(args),
+        chunk_size=chunk_size,
+        **params.model_dump(),
+    )
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    DATASET_CACHE.clear()
+    return results, progress, elapsed, peak
+
+
+def test_stored_streaming():
+    back_tester.DEFAULT_BROKER = create_store_broker()
+    results, progress, in_memory_time, in_memory_peak = run_stored_back_test(None)
+    chunked_results, chunked_progress, chunked_time, chunked_peak = (
+        run_stored_back_test(STORED_CHUNK_SIZE)
+    )
+    assert_same_results(results, chunked_results)
+    # Progress is reported at the same ticks across chunk boundaries
+    assert [args[:2] for args in progress] == [args[:2] for args in chunked_progress]
+    assert np.allclose(
+        [args[2] for args in progress], [args[2] for args in chunked_progress]
+    )
+    assert chunked_peak < in_memory_peak / 4
+
+    print(
+        f"Streamed {NUM_STORED_DAYS} days of {len(CURRENCY_CODES)} currencies in "
+        f"{STORED_CHUNK_SIZE.days} day chunks peaking at "
+        f"{chunked_peak / 2**20:.0f}MiB in {chunked_time:.1f}s "
+        f"(in memory: {in_memory_peak / 2**20:.0f}MiB in {in_memory_time:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    test_minute_grid_stream()
+    test_chunked_parity()
+    print("Chunked backtest matches the in-memory backtest")
+    test_stored_streaming()
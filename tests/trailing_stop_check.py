@@ -0,0 +1,124 @@
+import time
+from typing import Dict
+import numpy as np
+import pandas as pd
+from StratDaemon.models.crypto import CryptoOrder
+from StratDaemon.portfolio.portfolio_manager import PortfolioManager
+from tests.vectorized_parity import (
+    PARAMS,
+    START_DT,
+    assert_same_results,
+    generate_random_walk,
+    run_back_test,
+)
+
+CURRENCY_CODES = ["DOGE", "SHIB"]
+SPAN = 60
+WAIT_TIME = 5
+NUM_MINUTES = 5 * 24 * 60
+BUY_POWER = 1_000_000
+
+
+def compute_exit_signal(portfolio_mgr: PortfolioManager, df: pd.DataFrame) -> bool:
+    # How stops used to be checked, against the high since the window start,
+    # adding columns to the window on every tick
+    df["highest"] = df["close"].cummax()
+    df["trailingstop"] = df["highest"] * (1 - portfolio_mgr.trailing_stop_loss)
+    df["trailingtakeprofit"] = df["highest"] * (1 + portfolio_mgr.trailing_take_profit)
+    df["exit_signal"] = df["close"] < df["trailingstop"]
+    df["exit_signal"] |= df["close"] > df["trailingtakeprofit"]
+    return df["exit_signal"].iloc[-1]
+
+
+def test_lot_highs():
+    # Random buys while checking stops window by window: each lot's high is
+    # the highest close from its fill on, whatever the window holds
+    dfs = [
+        generate_random_walk(seed, NUM_MINUTES) for seed in range(len(CURRENCY_CODES))
+    ]
+    rng = np.random.default_rng(0)
+    portfolio_mgr = PortfolioManager(
+        CURRENCY_CODES, BUY_POWER, 0.01, 0.05, initial_timestamp=START_DT
+    )
+    fill_idxs: Dict[pd.Timestamp, int] = {}
+    check_time = old_check_time = 0.0
+    num_stopped = 0
+    for end in range(SPAN - 1, NUM_MINUTES, WAIT_TIME):
+        dt_dfs = {
+            currency_code: df.iloc[end - SPAN + 1 : end + 1].reset_index(drop=True)
+            for currency_code, df in zip(CURRENCY_CODES, dfs)
+        }
+        start = time.perf_counter()
+        orders = portfolio_mgr.check_stop_loss(dt_dfs)
+        check_time += time.perf_counter() - start
+        assert all(list(df.columns) == list(dfs[0].columns) for df in dt_dfs.values())
+
+        start = time.perf_counter()
+        for currency_code in portfolio_mgr.ledger.get_held_currency_codes():
+            compute_exit_signal(portfolio_mgr, dt_dfs[currency_code].copy())
+        old_check_time += time.perf_counter() - start
+
+        num_stopped += len(orders)
+        timestamp = dt_dfs[CURRENCY_CODES[0]].timestamp.iloc[-1]
+        if rng.random() < 0.2:
+            currency_code = CURRENCY_CODES[rng.integers(len(CURRENCY_CODES))]
+            price = dt_dfs[currency_code].close.iloc[-1]
+            orders.append(
+                CryptoOrder(
+                    side="buy",
+                    currency_code=currency_code,
+                    asset_price=price,
+                    amount=1_000,
+                    limit_price=price,
+                    quantity=1_000 / price,
+                    timestamp=timestamp,
+                )
+            )
+            fill_idxs[timestamp] = end
+        for order in orders:
+            portfolio_mgr.process_order(dt_dfs, order)
+
+        ledger = portfolio_mgr.ledger
+        for lot_idx in ledger.get_lot_idxs():
+            df = dfs[ledger.lot_currencies[lot_idx]]
+            fill_idx = fill_idxs[ledger.lot_timestamps[lot_idx]]
+            assert ledger.lot_highs[lot_idx] == df.close[fill_idx : end + 1].max()
+
+    assert num_stopped > 0
+    print(
+        f"Checked stops of {portfolio_mgr.num_buy_trades} lots with {num_stopped} "
+        f"stopped out in {check_time:.2f}s (window highs: {old_check_time:.2f}s)"
+    )
+
+
+def test_stop_parity():
+    all_data_dfs = [
+        generate_random_walk(seed, NUM_MINUTES) for seed in range(len(CURRENCY_CODES))
+    ]
+    params_list = [
+        PARAMS[0].model_copy(update={"trailing_stop_loss": 0.004}),
+        # Windows that leave gaps between them
+        PARAMS[1].model_copy(update={"trailing_stop_loss": 0.005, "wait_time": 50}),
+    ]
+    for params in params_list:
+        results = run_back_test(params, CURRENCY_CODES, all_data_dfs)
+        assert_same_results(
+            results,
+            run_back_test(params, CURRENCY_CODES, all_data_dfs, vectorized=True),
+        )
+        assert_same_results(
+            results,
+            run_back_test(params, CURRENCY_CODES, all_data_dfs, incremental=True),
+        )
+        # Stops fire, as without them there are fewer sells
+        no_stop_params = params.model_copy(update={"trailing_stop_loss": 1.0})
+        assert (
+            run_back_test(no_stop_params, CURRENCY_CODES, all_data_dfs, True)[2]
+            < results[2]
+        )
+    print("Vectorized stops match the per-window stops")
+
+
+if __name__ == "__main__":
+    test_lot_highs()
+    test_stop_parity()
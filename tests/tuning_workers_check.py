@@ -0,0 +1,93 @@
+import os
+import tempfile
+import time
+from datetime import timedelta
+import optuna
+from StratDaemon.utils.dataset_cache import DATASET_CACHE
+from StratDaemon.utils.result_cache import RESULT_CACHE
+from ml.tuning.test import Objective, test_optuna
+from tests.back_tester import get_dataset_key
+from tests.vectorized_parity import (
+    BUY_POWER,
+    MAX_AMOUNT_PER_ORDER,
+    START_DT,
+    generate_random_walk,
+)
+
+# Codes no market data exists for, so cached results never mix with real ones
+CURRENCY_CODES = ["WALK0", "WALK1"]
+# Enough trials for the workers to make up for starting up
+NUM_TRIALS = 64
+WORKER_COUNTS = [1, 2, 4]
+
+
+def create_random_sampler(
+    objective: Objective, seed: int
+) -> optuna.samplers.BaseSampler:
+    # Built into Optuna, unlike the default sampler fetched from OptunaHub, and
+    # cheap enough that the trials' backtests make up the time
+    return optuna.samplers.RandomSampler(seed=seed)
+
+
+def run_trials(n_workers: int) -> float:
+    # Runs the trial budget on a fresh study and result cache, so no worker
+    # count is served results an earlier one computed
+    tmp_dir = tempfile.mkdtemp()
+    RESULT_CACHE.path = os.path.join(tmp_dir, "results.db")
+    storage = f"sqlite:///{os.path.join(tmp_dir, 'optuna.db')}"
+
+    # Trials split over worker processes, which get the bars through shared
+    # memory rather than loading them
+    start = time.perf_counter()
+    test_optuna(
+        START_DT,
+        START_DT + timedelta(days=2),
+        CURRENCY_CODES,
+        BUY_POWER,
+        MAX_AMOUNT_PER_ORDER,
+        BUY_POWER / len(CURRENCY_CODES),
+        trials=NUM_TRIALS,
+        n_workers=n_workers,
+        storage=storage,
+        single_objective=True,
+        sampler_factory=create_random_sampler,
+    )
+    elapsed = time.perf_counter() - start
+
+    (summary,) = optuna.get_all_study_summaries(storage)
+    study = optuna.load_study(study_name=summary.study_name, storage=storage)
+    finished = study.get_trials(
+        states=[optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED]
+    )
+    assert len(finished) == NUM_TRIALS
+    return elapsed
+
+
+def test_tuning_workers():
+    all_data_dfs = [generate_random_walk(seed) for seed in range(len(CURRENCY_CODES))]
+    DATASET_CACHE.get_or_load(get_dataset_key(CURRENCY_CODES), lambda: all_data_dfs)
+
+    times = {n_workers: run_trials(n_workers) for n_workers in WORKER_COUNTS}
+    for n_workers, elapsed in times.items():
+        print(
+            f"Ran {NUM_TRIALS} trials in {n_workers} worker processes in "
+            f"{elapsed:.2f}s ({times[1] / elapsed:.2f}x)"
+        )
+
+    # More workers only finish sooner while each gets a core of its own
+    num_cores = os.cpu_count() or 1
+    parallel_counts = [n for n in WORKER_COUNTS if n <= num_cores]
+    for fewer, more in zip(parallel_counts, parallel_counts[1:]):
+        assert times[more] < times[fewer], (
+            f"{more} workers took {times[more]:.2f}s, "
+            f"{fewer} workers {times[fewer]:.2f}s"
+        )
+    if len(parallel_counts) < len(WORKER_COUNTS):
+        print(
+            f"Only {num_cores} cores, so the speedup was checked up to "
+            f"{parallel_counts[-1]} workers"
+        )
+
+
+if __name__ == "__main__":
+    test_tuning_workers()
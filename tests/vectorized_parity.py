@@ -0,0 +1,162 @@
+from datetime import datetime
+from math import isclose
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+from pandera.typing import DataFrame
+from StratDaemon.models.crypto import CryptoHistorical
+from StratDaemon.portfolio.history import PortfolioHistory
+from StratDaemon.portfolio.metrics import PerformanceMetrics
+from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
+from StratDaemon.utils.funcs import Parameters
+from tests.back_tester import BackTester, create_strat
+
+START_DT = datetime(2024, 1, 8)
+NUM_MINUTES = 3 * 24 * 60
+
+BUY_POWER = 10_000
+MAX_AMOUNT_PER_ORDER = 2_500
+
+PARAMS = [
+    Parameters(
+        p_diff=0.02,
+        vol_window=18,
+        indicator_length=20,
+        rsi_buy_threshold=55,
+        rsi_sell_threshold=80,
+        rsi_percent_incr_threshold=0.1,
+        rsi_trend_span=5,
+        trailing_stop_loss=0.05,
+        trailing_take_profit=0.1,
+        span=60,
+        wait_time=5,
+    ),
+    Parameters(
+        p_diff=0.08,
+        vol_window=10,
+        indicator_length=12,
+        rsi_buy_threshold=40,
+        rsi_sell_threshold=60,
+        rsi_percent_incr_threshold=0.05,
+        rsi_trend_span=30,
+        trailing_stop_loss=0.01,
+        trailing_take_profit=0.05,
+        span=35,
+        wait_time=15,
+    ),
+]
+
+
+def generate_random_walk(
+    seed: int, num_minutes: int = NUM_MINUTES
+) -> DataFrame[CryptoHistorical]:
+    rng = np.random.default_rng(seed)
+    close = 0.1 * np.exp(np.cumsum(rng.normal(0, 0.003, num_minutes)))
+    open_ = np.concatenate([close[:1], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.001, num_minutes)) * close
+    df = pd.DataFrame(
+        {
+            "open": open_,
+            "close": close,
+            "high": np.maximum(open_, close) + spread,
+            "low": np.minimum(open_, close) - spread,
+            "volume": rng.uniform(1e3, 1e5, num_minutes),
+            "timestamp": pd.date_range(START_DT, periods=num_minutes, freq="1 min"),
+        }
+    )
+    return CryptoHistorical.validate(df)
+
+
+def run_back_test(
+    params: Parameters,
+    currency_codes: List[str],
+    all_data_dfs: List[DataFrame[CryptoHistorical]],
+    vectorized: bool = False,
+    incremental: bool = False,
+) -> Tuple[PortfolioHistory, int, int, PerformanceMetrics]:
+    strat = create_strat(
+        FibVolRsiStrategy,
+        currency_codes,
+        BUY_POWER,
+        MAX_AMOUNT_PER_ORDER,
+        BUY_POWER / len(currency_codes),
+        params.p_diff,
+        params.vol_window,
+        params.indicator_length,
+        params.rsi_buy_threshold,
+        params.rsi_sell_threshold,
+        params.rsi_percent_incr_threshold,
+        params.rsi_trend_span,
+        params.trailing_stop_loss,
+        params.trailing_take_profit,
+        incremental,
+    )
+    back_tester = BackTester(
+        strat,
+        currency_codes,
+        BUY_POWER,
+        span=params.span,
+        wait_time=params.wait_time,
+        all_data_dfs=[df.copy() for df in all_data_dfs],
+    )
+    return back_tester.run(vectorized=vectorized)
+
+
+def assert_same_results(
+    results: Tuple[PortfolioHistory, int, int, PerformanceMetrics],
+    other_results: Tuple[PortfolioHistory, int, int, PerformanceMetrics],
+) -> None:
+    port_hist, buy_trades, sell_trades, metrics = results
+    other_port_hist, other_buy_trades, other_sell_trades, other_metrics = other_results
+
+    assert buy_trades > 0 and sell_trades > 0, "Parameters did not trade"
+    assert (buy_trades, sell_trades) == (other_buy_trades, other_sell_trades)
+    assert len(port_hist) == len(other_port_hist)
+    for port, other_port in zip(port_hist[1:-1], other_port_hist[1:-1]):
+        assert port.timestamp == other_port.timestamp
+    for port, other_port in zip(port_hist, other_port_hist):
+        assert isclose(port.value, other_port.value, rel_tol=1e-9)
+        assert isclose(port.buy_power, other_port.buy_power, rel_tol=1e-9)
+
+    holdings = port_hist[-1].holdings
+    other_holdings = other_port_hist[-1].holdings
+    assert [h.currency_code for h in holdings] == [
+        h.currency_code for h in other_holdings
+    ]
+    for holding, other_holding in zip(holdings, other_holdings):
+        assert isclose(holding.quantity, other_holding.quantity, rel_tol=1e-9)
+
+    assert metrics.num_ticks > 0
+    for name, value in metrics.model_dump().items():
+        assert isclose(
+            value, getattr(other_metrics, name), rel_tol=1e-6, abs_tol=1e-12
+        ), f"{name} differs: {value} vs {getattr(other_metrics, name)}"
+
+
+def test_vectorized_parity():
+    currency_codes = ["DOGE", "SHIB"]
+    all_data_dfs = [generate_random_walk(seed) for seed in range(len(currency_codes))]
+
+    for params in PARAMS:
+        assert_same_results(
+            run_back_test(params, currency_codes, all_data_dfs),
+            run_back_test(params, currency_codes, all_data_dfs, vectorized=True),
+        )
+
+    # Windows one row too short for the volatility window are rejected
+    params = PARAMS[0]
+    short_params = params.model_copy(
+        update={"span": params.indicator_length - 1 + params.vol_window}
+    )
+    try:
+        run_back_test(short_params, currency_codes, all_data_dfs, vectorized=True)
+    except AssertionError as e:
+        assert str(e) == "Interval inputs are invalid"
+    else:
+        raise AssertionError("Short windows were not rejected")
+
+    print("Vectorized backtest matches the per-window backtest")
+
+
+if __name__ == "__main__":
+    test_vectorized_parity()
@@ -0,0 +1,127 @@
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, Generator, List
+from pandera.typing import DataFrame
+from StratDaemon.models.crypto import CryptoHistorical
+from StratDaemon.strats.fib_vol_rsi import FibVolRsiStrategy
+from StratDaemon.utils.windows import SlidingWindows, WindowFrame, to_frame
+from tests.back_tester import create_strat
+from tests.vectorized_parity import (
+    BUY_POWER,
+    MAX_AMOUNT_PER_ORDER,
+    PARAMS,
+    generate_random_walk,
+)
+
+NUM_TICKS = 100_000
+CURRENCY_CODES = ["DOGE", "SHIB"]
+MODES = ["slice", "frame", "view"]
+
+
+def slice_windows(
+    dfs: List[DataFrame[CryptoHistorical]], span: int
+) -> Generator[List[DataFrame[CryptoHistorical]], None, None]:
+    # How `BackTester.get_data_by_interval` used to hand out windows
+    for i in range(span, len(dfs[0])):
+        yield [df[i - span + 1 : i + 1] for df in dfs]
+
+
+class FrameStrategy(FibVolRsiStrategy):
+    # How windows used to be read, materialized as one frame per tick
+    def construct_dt_dfs(self, dt_dfs_input):
+        return {
+            currency_code: to_frame(df)
+            for currency_code, df in super().construct_dt_dfs(dt_dfs_input).items()
+        }
+
+
+def view_windows(
+    windows: List[SlidingWindows], span: int
+) -> Generator[List[WindowFrame], None, None]:
+    for i in range(span, len(windows[0])):
+        yield [window.get_window(i) for window in windows]
+
+
+def measure(mode: str, num_ticks: int) -> Dict[str, float]:
+    params = PARAMS[0]
+    dfs = [
+        generate_random_walk(seed, num_ticks + params.span)
+        for seed in range(len(CURRENCY_CODES))
+    ]
+    dfs_gen = (
+        slice_windows(dfs, params.span)
+        if mode == "slice"
+        else view_windows([SlidingWindows(df, params.span) for df in dfs], params.span)
+    )
+
+    strat = create_strat(
+        FrameStrategy if mode == "frame" else FibVolRsiStrategy,
+        CURRENCY_CODES,
+        BUY_POWER,
+        MAX_AMOUNT_PER_ORDER,
+        BUY_POWER / len(CURRENCY_CODES),
+        params.p_diff,
+        params.vol_window,
+        params.indicator_length,
+        params.rsi_buy_threshold,
+        params.rsi_sell_threshold,
+        params.rsi_percent_incr_threshold,
+        params.rsi_trend_span,
+        params.trailing_stop_loss,
+        params.trailing_take_profit,
+        incremental=True,
+    )
+
+    # CPython has no cheap allocation counter, so bytes are traced instead: the
+    # growth of the traced peak over each stage bounds what the stage allocated.
+    # The strategy stage runs one tick of the strategy on the windows.
+    window_bytes = strat_bytes = 0
+    strat_time = 0.0
+    tracemalloc.start()
+    for _ in range(num_ticks):
+        start_mem, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        dfs = next(dfs_gen)
+        window_bytes += tracemalloc.get_traced_memory()[1] - start_mem
+
+        start_mem, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        strat.execute(
+            dict(zip(CURRENCY_CODES, dfs)), print_orders=False, save_positions=False
+        )
+        strat_time += time.perf_counter() - start
+        strat_bytes += tracemalloc.get_traced_memory()[1] - start_mem
+    tracemalloc.stop()
+
+    scale = 100_000 / num_ticks
+    return {
+        "window MB per 100k ticks": window_bytes * scale / 1e6,
+        "strategy MB per 100k ticks": strat_bytes * scale / 1e6,
+        "strategy ms per tick": strat_time * 1e3 / num_ticks,
+        "peak RSS MB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3,
+    }
+
+
+def report(num_ticks: int = NUM_TICKS) -> None:
+    # Each mode runs in its own process so peak RSS is not shared between them
+    for mode in MODES:
+        result = subprocess.run(
+            [sys.executable, __file__, mode, str(num_ticks)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        print(f"{mode} windows over {num_ticks} ticks:")
+        print(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in MODES:
+        stats = measure(sys.argv[1], int(sys.argv[2]))
+        print(", ".join(f"{key}: {val:.1f}" for key, val in stats.items()))
+    else:
+        report(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_TICKS)